@@ -0,0 +1,368 @@
+'''
+Disjunctive graph of a schedule, to evaluate makespan moves without
+rescheduling.
+Nodes are the operations (dense index), with two kinds of arcs:
+the job precedence arcs (Operation.predecessors / successors) and the
+machine sequence arcs (order of Machine.scheduled_operations).
+The head of an operation is its earliest start time:
+    head = max(end of its job predecessor, end of its machine predecessor)
+the first operation of a machine being released at the set up time of the
+machine. The tail is the length of the longest path from its end to the sink.
+For a schedule built with Solution.schedule, heads are the start times of
+the operations and the makespan is Solution.cmax.
+
+@author: Vassilissa Lehoux
+'''
+from collections import deque
+from typing import Dict, List
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.machine import Machine
+from src.scheduling.instance.operation import Operation
+
+
+class DisjunctiveGraph(object):
+    '''
+    Disjunctive graph with the heads and tails of the operations,
+    updated incrementally when a move (swap of two consecutive operations
+    of a machine, insertion of an operation in the sequence of a machine)
+    is applied. The makespan of a move can be estimated in O(1) from the
+    heads and tails before applying it.
+    '''
+
+    def __init__(self, instance: Instance, sequences: Dict[int, List[Operation]]):
+        '''
+        Constructor
+        @param sequences: machine_id -> operations of the machine in processing order,
+               every operation of the instance must be in one sequence
+        @raise ValueError: if an operation is missing or if the arcs form a cycle
+        '''
+        self._instance = instance
+        self._operations = instance.operations
+        nb_operations = len(self._operations)
+        arrays = instance.arrays
+        self._job_pred: List[int] = arrays.predecessors.tolist()
+        self._job_succ: List[int] = arrays.successors.tolist()
+        self._machine_pred = [-1] * nb_operations
+        self._machine_succ = [-1] * nb_operations
+        self._machine_of = [-1] * nb_operations
+        self._durations = [0] * nb_operations
+        self._set_up_times = {machine.machine_id: machine.set_up_time for machine in instance.machines}
+        self._sequences: Dict[int, List[int]] = {machine.machine_id: [] for machine in instance.machines}
+        for machine_id, operations in sequences.items():
+            sequence = self._sequences[machine_id]
+            for operation in operations:
+                index = operation.index
+                if self._machine_of[index] != -1:
+                    raise ValueError(f"Operation {operation.operation_id} is sequenced twice")
+                self._machine_of[index] = machine_id
+                self._durations[index] = operation.get_duration_for_machine(machine_id)
+                if sequence:
+                    self._machine_pred[index] = sequence[-1]
+                    self._machine_succ[sequence[-1]] = index
+                sequence.append(index)
+        missing = [op.operation_id for op in self._operations if self._machine_of[op.index] == -1]
+        if missing:
+            raise ValueError(f"Operations {missing} are not sequenced on a machine")
+        self.heads = [0] * nb_operations
+        self.tails = [0] * nb_operations
+        # Tête du puits (voir _sink_head), maintenue par _compute et _update
+        self._makespan = 0
+        self._compute()
+
+    @classmethod
+    def from_solution(cls, sol) -> 'DisjunctiveGraph':
+        '''
+        Builds the graph of the machine sequences of a complete solution.
+        '''
+        sequences = {machine.machine_id: [] for machine in sol.inst.machines}
+        for operation, machine in sol.dispatch:
+            sequences[machine.machine_id].append(operation)
+        return cls(sol.inst, sequences)
+
+    def sequences(self) -> Dict[int, List[Operation]]:
+        '''
+        Returns the operations of each machine in processing order.
+        '''
+        return {machine_id: [self._operations[i] for i in sequence]
+                for machine_id, sequence in self._sequences.items()}
+
+    def sequence(self, machine: Machine) -> List[Operation]:
+        return [self._operations[i] for i in self._sequences[machine.machine_id]]
+
+    def machine_of(self, operation: Operation) -> int:
+        return self._machine_of[operation.index]
+
+    def duration(self, operation: Operation) -> int:
+        return self._durations[operation.index]
+
+    def head(self, operation: Operation) -> int:
+        return self.heads[operation.index]
+
+    def tail(self, operation: Operation) -> int:
+        return self.tails[operation.index]
+
+    @property
+    def makespan(self) -> int:
+        '''
+        Returns the length of the longest path (max end time of the operations), in O(1).
+        '''
+        return self._makespan
+
+    def is_critical(self, operation: Operation) -> bool:
+        i = operation.index
+        return self.heads[i] + self._durations[i] + self.tails[i] == self._makespan
+
+    def critical_path(self) -> List[Operation]:
+        '''
+        Returns the operations of a longest path, in processing order.
+        '''
+        makespan = self._makespan
+        critical = [i for i in range(len(self._operations))
+                    if self.heads[i] + self._durations[i] + self.tails[i] == makespan]
+        if not critical:
+            return []
+        current = min(critical, key=lambda i: (self.heads[i], i))
+        path = [current]
+        while True:
+            end = self.heads[current] + self._durations[current]
+            following = [j for j in (self._job_succ[current], self._machine_succ[current])
+                         if j != -1 and self.heads[j] == end
+                         and end + self._durations[j] + self.tails[j] == makespan]
+            if not following:
+                break
+            current = following[0]
+            path.append(current)
+        return [self._operations[i] for i in path]
+
+    def _head(self, i: int) -> int:
+        machine_pred = self._machine_pred[i]
+        if machine_pred == -1:
+            head = self._set_up_times[self._machine_of[i]]
+        else:
+            head = self.heads[machine_pred] + self._durations[machine_pred]
+        job_pred = self._job_pred[i]
+        if job_pred != -1:
+            head = max(head, self.heads[job_pred] + self._durations[job_pred])
+        return head
+
+    def _sink_head(self) -> int:
+        '''
+        Returns the head of the sink in O(number of machines): an operation without
+        successor is the last one of its machine, and the other operations end before
+        one of their successors.
+        '''
+        heads, durations = self.heads, self._durations
+        return max((heads[sequence[-1]] + durations[sequence[-1]]
+                    for sequence in self._sequences.values() if sequence), default=0)
+
+    def _tail(self, i: int) -> int:
+        tail = 0
+        for j in (self._job_succ[i], self._machine_succ[i]):
+            if j != -1:
+                tail = max(tail, self._durations[j] + self.tails[j])
+        return tail
+
+    def _compute(self):
+        '''
+        Computes all the heads and tails in topological order.
+        '''
+        nb_operations = len(self._operations)
+        indegree = [(self._job_pred[i] != -1) + (self._machine_pred[i] != -1) for i in range(nb_operations)]
+        queue = deque(i for i in range(nb_operations) if indegree[i] == 0)
+        order = []
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            for j in (self._job_succ[i], self._machine_succ[i]):
+                if j != -1:
+                    indegree[j] -= 1
+                    if indegree[j] == 0:
+                        queue.append(j)
+        if len(order) < nb_operations:
+            raise ValueError("The machine sequences and the jobs form a cycle")
+        for i in order:
+            self.heads[i] = self._head(i)
+        for i in reversed(order):
+            self.tails[i] = self._tail(i)
+        self._makespan = self._sink_head()
+
+    def _update(self, heads_from: List[int], tails_from: List[int]):
+        '''
+        Propagates the heads forward from the operations whose predecessors changed,
+        and the tails backward from the operations whose successors changed:
+        only the operations whose head or tail changes are visited again.
+        '''
+        queue = deque(i for i in heads_from if i != -1)
+        forced = set(queue)
+        while queue:
+            i = queue.popleft()
+            head = self._head(i)
+            if head != self.heads[i] or i in forced:
+                forced.discard(i)
+                self.heads[i] = head
+                queue.extend(j for j in (self._job_succ[i], self._machine_succ[i]) if j != -1)
+        # Les fins des séquences des machines ont pu changer, même sans changement de tête
+        self._makespan = self._sink_head()
+        queue = deque(i for i in tails_from if i != -1)
+        forced = set(queue)
+        while queue:
+            i = queue.popleft()
+            tail = self._tail(i)
+            if tail != self.tails[i] or i in forced:
+                forced.discard(i)
+                self.tails[i] = tail
+                queue.extend(j for j in (self._job_pred[i], self._machine_pred[i]) if j != -1)
+
+    def _reaches(self, source: int, target: int) -> bool:
+        '''
+        Returns True if there is a path from source to target.
+        Only operations with a head not greater than the head of the target can be on it.
+        '''
+        limit = self.heads[target]
+        stack = [source]
+        seen = {source}
+        while stack:
+            i = stack.pop()
+            if i == target:
+                return True
+            for j in (self._job_succ[i], self._machine_succ[i]):
+                if j != -1 and j not in seen and self.heads[j] <= limit:
+                    seen.add(j)
+                    stack.append(j)
+        return False
+
+    def _has_cycle_through(self, source: int) -> bool:
+        stack = [j for j in (self._job_succ[source], self._machine_succ[source]) if j != -1]
+        seen = set(stack)
+        while stack:
+            i = stack.pop()
+            if i == source:
+                return True
+            for j in (self._job_succ[i], self._machine_succ[i]):
+                if j != -1 and j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        return False
+
+    def swap_estimate(self, machine: Machine, position: int) -> int:
+        '''
+        Returns the length of the longest path through the operations at position
+        and position + 1 on the machine once swapped, in O(1).
+        If the swap is feasible, the new makespan is the maximum of this value
+        and of the paths through neither of them (hence exact when it is not
+        lower than the current makespan).
+        '''
+        sequence = self._sequences[machine.machine_id]
+        u, v = sequence[position], sequence[position + 1]
+        heads, tails, durations = self.heads, self.tails, self._durations
+        before, after = self._machine_pred[u], self._machine_succ[v]
+        head_v = self._set_up_times[machine.machine_id] if before == -1 else heads[before] + durations[before]
+        if self._job_pred[v] != -1:
+            head_v = max(head_v, heads[self._job_pred[v]] + durations[self._job_pred[v]])
+        head_u = head_v + durations[v]
+        if self._job_pred[u] != -1:
+            head_u = max(head_u, heads[self._job_pred[u]] + durations[self._job_pred[u]])
+        tail_u = 0 if after == -1 else durations[after] + tails[after]
+        if self._job_succ[u] != -1:
+            tail_u = max(tail_u, durations[self._job_succ[u]] + tails[self._job_succ[u]])
+        tail_v = tail_u + durations[u]
+        if self._job_succ[v] != -1:
+            tail_v = max(tail_v, durations[self._job_succ[v]] + tails[self._job_succ[v]])
+        return max(head_v + durations[v] + tail_v, head_u + durations[u] + tail_u)
+
+    def _neighbors_at(self, i: int, machine_id: int, position: int):
+        '''
+        Returns the operations between which the operation is inserted
+        (position in the sequence of the machine without the operation).
+        '''
+        sequence = self._sequences[machine_id]
+        if self._machine_of[i] == machine_id:
+            sequence = [j for j in sequence if j != i]
+        before = sequence[position - 1] if position > 0 else -1
+        after = sequence[position] if position < len(sequence) else -1
+        return before, after
+
+    def insertion_estimate(self, operation: Operation, machine: Machine, position: int) -> int:
+        '''
+        Returns an estimate of the length of the longest path through the operation
+        if it is moved at the position in the sequence of the machine (position
+        in the sequence without the operation), from the current heads and tails of
+        its new neighbors (exact when they do not depend on the operation).
+        O(1) when the operation changes machine.
+        '''
+        i = operation.index
+        before, after = self._neighbors_at(i, machine.machine_id, position)
+        heads, tails, durations = self.heads, self.tails, self._durations
+        head = self._set_up_times[machine.machine_id] if before == -1 else heads[before] + durations[before]
+        if self._job_pred[i] != -1:
+            head = max(head, heads[self._job_pred[i]] + durations[self._job_pred[i]])
+        tail = 0 if after == -1 else durations[after] + tails[after]
+        if self._job_succ[i] != -1:
+            tail = max(tail, durations[self._job_succ[i]] + tails[self._job_succ[i]])
+        return head + operation.get_duration_for_machine(machine.machine_id) + tail
+
+    def swap(self, machine: Machine, position: int):
+        '''
+        Swaps the operations at position and position + 1 on the machine
+        and updates the heads and tails.
+        @raise ValueError: if the swap creates a cycle (the graph is unchanged)
+        '''
+        sequence = self._sequences[machine.machine_id]
+        u, v = sequence[position], sequence[position + 1]
+        job_pred = self._job_pred[v]
+        # Un autre chemin de u vers v passe forcément par le prédécesseur de v dans son job
+        if job_pred == u or (job_pred != -1 and self._reaches(u, job_pred)):
+            raise ValueError(f"Swapping operations {self._operations[u].operation_id} and "
+                             f"{self._operations[v].operation_id} creates a cycle")
+        before, after = self._machine_pred[u], self._machine_succ[v]
+        sequence[position], sequence[position + 1] = v, u
+        self._link(before, v)
+        self._link(v, u)
+        self._link(u, after)
+        self._update([v, u, after], [u, v, before])
+
+    def move(self, operation: Operation, machine: Machine, position: int):
+        '''
+        Moves the operation at the position in the sequence of the machine
+        (position in the sequence without the operation) and updates the heads and tails.
+        @raise ValueError: if the move creates a cycle or if the operation cannot
+               be executed on the machine (the graph is unchanged)
+        '''
+        if not operation.can_be_executed_on_machine(machine.machine_id):
+            raise ValueError(f"Operation {operation.operation_id} cannot be executed "
+                             f"on machine {machine.machine_id}")
+        i = operation.index
+        old_machine = self._machine_of[i]
+        old_position = self._sequences[old_machine].index(i)
+        old_before, old_after = self._unlink(i)
+        before, after = self._insert(i, machine.machine_id, position)
+        if self._has_cycle_through(i):
+            self._unlink(i)
+            self._insert(i, old_machine, old_position)
+            raise ValueError(f"Moving operation {operation.operation_id} to position {position} "
+                             f"of machine {machine.machine_id} creates a cycle")
+        self._update([i, old_after, after], [i, old_before, before])
+
+    def _link(self, before: int, after: int):
+        if before != -1:
+            self._machine_succ[before] = after
+        if after != -1:
+            self._machine_pred[after] = before
+
+    def _unlink(self, i: int):
+        before, after = self._machine_pred[i], self._machine_succ[i]
+        self._sequences[self._machine_of[i]].remove(i)
+        self._link(before, after)
+        return before, after
+
+    def _insert(self, i: int, machine_id: int, position: int):
+        sequence = self._sequences[machine_id]
+        before = sequence[position - 1] if position > 0 else -1
+        after = sequence[position] if position < len(sequence) else -1
+        sequence.insert(position, i)
+        self._machine_of[i] = machine_id
+        self._durations[i] = self._operations[i].get_duration_for_machine(machine_id)
+        self._link(before, i)
+        self._link(i, after)
+        return before, after
@@ -0,0 +1,202 @@
+'''
+Compact encoding of a solution, independent of the objects of the instance.
+It can be stored, compared, hashed and sent to another process
+(see Solution.encode and Solution.decode), and archived in a compact
+binary file (see save_codes and load_codes).
+
+@author: Vassilissa Lehoux
+'''
+from typing import List
+import hashlib
+import struct
+import zlib
+
+import numpy as np
+
+
+class SolutionCode(object):
+    '''
+    Typed arrays describing a solution of an instance:
+    - machines: dense index of the machine of each operation (-1 if not planned)
+    - starts: start time of each operation (-1 if not planned)
+    - sequences / sequence_offsets: dense indices of the operations of each
+      machine in processing order, those of machine m being
+      sequences[sequence_offsets[m]:sequence_offsets[m + 1]]
+    - on_times / off_times / interval_offsets: start and stop times of the
+      machines (off time -1 for a machine still running), same layout
+    Codes are immutable: equality and the 64-bit hash (stable between runs
+    and processes) are computed from the instance name and the arrays.
+    '''
+
+    # Types fixes pour que le hash ne dépende pas de la plateforme
+    _INDEX_TYPE = np.dtype('<i4')
+    _TIME_TYPE = np.dtype('<i8')
+    _FIELDS = ('machines', 'starts', 'sequences', 'sequence_offsets',
+               'on_times', 'off_times', 'interval_offsets')
+
+    def __init__(self, instance_name: str, machines, starts, sequences, sequence_offsets,
+                 on_times, off_times, interval_offsets):
+        '''
+        Constructor
+        '''
+        self.instance_name = instance_name
+        self.machines = self._freeze(machines, self._INDEX_TYPE)
+        self.starts = self._freeze(starts, self._time_type(starts))
+        self.sequences = self._freeze(sequences, self._INDEX_TYPE)
+        self.sequence_offsets = self._freeze(sequence_offsets, self._INDEX_TYPE)
+        self.on_times = self._freeze(on_times, self._time_type(on_times))
+        self.off_times = self._freeze(off_times, self._time_type(off_times))
+        self.interval_offsets = self._freeze(interval_offsets, self._INDEX_TYPE)
+        self._hash = None
+
+    @classmethod
+    def _time_type(cls, values) -> np.dtype:
+        values = np.asarray(values)
+        if values.size and values.dtype.kind == 'f' and not np.all(values == np.floor(values)):
+            return np.dtype('<f8')
+        return cls._TIME_TYPE
+
+    @staticmethod
+    def _freeze(values, dtype: np.dtype) -> np.ndarray:
+        array = np.array(values, dtype=dtype).reshape(-1)
+        array.flags.writeable = False
+        return array
+
+    @property
+    def nb_operations(self) -> int:
+        return len(self.machines)
+
+    @property
+    def nb_machines(self) -> int:
+        return len(self.sequence_offsets) - 1
+
+    def sequence(self, machine_index: int) -> np.ndarray:
+        return self.sequences[self.sequence_offsets[machine_index]:self.sequence_offsets[machine_index + 1]]
+
+    def intervals(self, machine_index: int) -> List[tuple]:
+        '''
+        Returns the (start, stop) times of the machine, stop being -1 if it is still running.
+        '''
+        window = slice(self.interval_offsets[machine_index], self.interval_offsets[machine_index + 1])
+        return list(zip(self.on_times[window].tolist(), self.off_times[window].tolist()))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SolutionCode):
+            return NotImplemented
+        return (self.instance_name == other.instance_name
+                and all(np.array_equal(getattr(self, name), getattr(other, name)) for name in self._FIELDS))
+
+    def __hash__(self) -> int:
+        return self.hash64
+
+    @property
+    def hash64(self) -> int:
+        '''
+        64-bit hash of the code, identical in every process.
+        '''
+        if self._hash is None:
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(self.instance_name.encode())
+            for name in self._FIELDS:
+                array = getattr(self, name)
+                digest.update(array.dtype.str.encode())
+                digest.update(len(array).to_bytes(8, 'little'))
+                digest.update(array.tobytes())
+            self._hash = int.from_bytes(digest.digest(), 'little')
+        return self._hash
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self._FIELDS)
+
+    def __repr__(self) -> str:
+        return f"SolutionCode({self.instance_name}, {self.nb_operations} operations, hash={self.hash64:016x})"
+
+    def to_bytes(self) -> bytes:
+        '''
+        Returns the binary form of the code: the instance name, then each array
+        with the smallest integer type holding its values (see from_bytes).
+        '''
+        name = self.instance_name.encode()
+        parts = [struct.pack('<H', len(name)), name]
+        for field in self._FIELDS:
+            array = _narrow(getattr(self, field))
+            parts.append(struct.pack('<3sI', array.dtype.str.encode(), len(array)))
+            parts.append(array.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, offset: int = 0) -> tuple:
+        '''
+        Reads a code written by to_bytes at the offset of data.
+        Returns the code and the offset of its end.
+        '''
+        length, = struct.unpack_from('<H', data, offset)
+        offset += 2
+        instance_name = bytes(data[offset:offset + length]).decode()
+        offset += length
+        arrays = []
+        for _ in cls._FIELDS:
+            type_name, size = struct.unpack_from('<3sI', data, offset)
+            offset += 7
+            dtype = np.dtype(type_name.decode())
+            arrays.append(np.frombuffer(data, dtype=dtype, count=size, offset=offset))
+            offset += size * dtype.itemsize
+        return cls(instance_name, *arrays), offset
+
+
+# Types entiers du format binaire, du plus petit au plus grand
+_NARROW_TYPES = [np.dtype(t) for t in ('<i1', '<i2', '<i4', '<i8')]
+
+
+def _narrow(array: np.ndarray) -> np.ndarray:
+    if array.dtype.kind != 'i' or not array.size:
+        return array.astype(array.dtype.newbyteorder('<'))
+    low, high = array.min(), array.max()
+    for dtype in _NARROW_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return array.astype(dtype)
+    return array
+
+
+_MAGIC = b'JSPSOL'
+_VERSION = 1
+_COMPRESSED = 1
+
+
+def save_codes(path: str, codes: List[SolutionCode], compress: bool = False):
+    '''
+    Writes the codes to a binary file in one write: a header (magic, version,
+    flags, number of codes), then the codes (see SolutionCode.to_bytes),
+    compressed with zlib if compress.
+    '''
+    body = b''.join(code.to_bytes() for code in codes)
+    if compress:
+        body = zlib.compress(body)
+    header = _MAGIC + struct.pack('<BBI', _VERSION, _COMPRESSED if compress else 0, len(codes))
+    with open(path, 'wb') as file:
+        file.write(header + body)
+
+
+def load_codes(path: str) -> List[SolutionCode]:
+    '''
+    Reads the codes of a file written by save_codes.
+    @raise ValueError: if the file is not a file of codes
+    '''
+    with open(path, 'rb') as file:
+        data = file.read()
+    header = len(_MAGIC) + struct.calcsize('<BBI')
+    if not data.startswith(_MAGIC):
+        raise ValueError(f"{path} is not a file of solution codes")
+    version, flags, count = struct.unpack_from('<BBI', data, len(_MAGIC))
+    if version != _VERSION:
+        raise ValueError(f"Unsupported version {version} of {path}")
+    body = memoryview(data)[header:]
+    if flags & _COMPRESSED:
+        body = zlib.decompress(body)
+    codes, offset = [], 0
+    for _ in range(count):
+        code, offset = SolutionCode.from_bytes(body, offset)
+        codes.append(code)
+    return codes
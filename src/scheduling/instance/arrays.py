@@ -0,0 +1,215 @@
+'''
+Columnar (array-backed) view of an instance.
+Operations and machines are indexed densely (0..n-1) in the order of
+Instance.operations and Instance.machines.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, Optional
+import hashlib
+
+import numpy as np
+
+
+# Champs par opération, par job et par machine
+OPERATION_FIELDS = ('operation_ids', 'operation_jobs', 'predecessors', 'successors')
+JOB_FIELDS = ('job_ids',)
+MACHINE_FIELDS = ('machine_ids', 'set_up_times', 'set_up_energies', 'tear_down_times',
+                  'tear_down_energies', 'min_consumptions', 'end_times')
+MATRIX_FIELDS = ('durations', 'energies', 'eligible')
+ALL_FIELDS = OPERATION_FIELDS + JOB_FIELDS + MACHINE_FIELDS + MATRIX_FIELDS
+
+
+def compact(values) -> np.ndarray:
+    '''
+    Converts a sequence of numbers to an int64 array if all values are integral,
+    to a float64 array otherwise.
+    '''
+    array = np.asarray(values, dtype=np.float64)
+    if array.size == 0 or np.all(np.isfinite(array) & (array == np.floor(array))):
+        return array.astype(np.int64)
+    return array
+
+
+class InstanceArrays(object):
+    '''
+    Dense NumPy representation of an instance.
+
+    Per operation (dense operation index):
+        operation_ids, operation_jobs (dense job index),
+        predecessors / successors (dense index of the previous / next
+        operation of the job, -1 if none)
+    Per job: job_ids
+    Per machine (dense machine index):
+        machine_ids, set_up_times, set_up_energies, tear_down_times,
+        tear_down_energies, min_consumptions, end_times
+    Operation x machine matrices:
+        durations, energies (0 where not eligible), eligible (bool mask)
+    '''
+
+    def __init__(self, **fields):
+        '''
+        Constructor
+        @param fields: one array per name of ALL_FIELDS
+        '''
+        missing = [name for name in ALL_FIELDS if name not in fields]
+        if missing:
+            raise ValueError(f"Missing instance arrays: {', '.join(missing)}")
+        for name in ALL_FIELDS:
+            setattr(self, name, np.asarray(fields[name]))
+        self.eligible = self.eligible.astype(bool, copy=False)
+        # Vues en lecture seule : les données ne changent plus (voir digest)
+        for name in ALL_FIELDS:
+            view = getattr(self, name).view()
+            view.setflags(write=False)
+            setattr(self, name, view)
+        self._digest: Optional[bytes] = None
+        self._machine_index = {mid: i for i, mid in enumerate(self.machine_ids.tolist())}
+        self._operation_index = {oid: i for i, oid in enumerate(self.operation_ids.tolist())}
+
+    @property
+    def nb_operations(self) -> int:
+        return len(self.operation_ids)
+
+    @property
+    def nb_jobs(self) -> int:
+        return len(self.job_ids)
+
+    @property
+    def nb_machines(self) -> int:
+        return len(self.machine_ids)
+
+    @property
+    def machine_index(self) -> Dict[int, int]:
+        '''
+        Dictionary machine_id -> dense machine index.
+        '''
+        return self._machine_index
+
+    @property
+    def operation_index(self) -> Dict[int, int]:
+        '''
+        Dictionary operation_id -> dense operation index.
+        '''
+        return self._operation_index
+
+    @property
+    def digest(self) -> bytes:
+        '''
+        Digest of the content of the arrays (computed once, the arrays being
+        read-only): two instances with the same digest have the same data.
+        '''
+        if self._digest is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for name in ALL_FIELDS:
+                array = np.ascontiguousarray(getattr(self, name))
+                digest.update(f"{name}:{array.dtype.str}:{array.shape};".encode())
+                digest.update(array.tobytes())
+            self._digest = digest.digest()
+        return self._digest
+
+    def __reduce__(self):
+        # Reconstruit par le constructeur dans un autre processus (tableaux en lecture seule)
+        return _rebuild, (self.as_dict(),)
+
+    def as_dict(self) -> Dict[str, np.ndarray]:
+        '''
+        Returns the arrays as a dictionary name -> array.
+        '''
+        return {name: getattr(self, name) for name in ALL_FIELDS}
+
+    @classmethod
+    def build(cls, operations, machines) -> 'InstanceArrays':
+        '''
+        Builds the arrays from parsed rows.
+        @param operations: list of (job_id, operation_id, machine_ids, durations, energies)
+        @param machines: list of (machine_id, set_up_time, set_up_energy, tear_down_time,
+               tear_down_energy, min_consumption, end_time), end_time may be None
+        '''
+        machines = sorted(machines, key=lambda m: m[0])
+        operations = sorted(operations, key=lambda o: o[1])
+        machine_index = {m[0]: i for i, m in enumerate(machines)}
+        nb_ops, nb_machines = len(operations), len(machines)
+
+        durations = np.zeros((nb_ops, nb_machines), dtype=np.float64)
+        energies = np.zeros((nb_ops, nb_machines), dtype=np.float64)
+        eligible = np.zeros((nb_ops, nb_machines), dtype=bool)
+        for i, (_, _, machine_ids, op_durations, op_energies) in enumerate(operations):
+            for machine_id, duration, energy in zip(machine_ids, op_durations, op_energies):
+                if machine_id not in machine_index:
+                    raise KeyError(f"Operation {operations[i][1]} references non-existent machine {machine_id}")
+                column = machine_index[machine_id]
+                durations[i, column] = duration
+                energies[i, column] = energy
+                eligible[i, column] = True
+
+        return cls.from_dense([o[1] for o in operations], [o[0] for o in operations],
+                              compact(durations), compact(energies), eligible, machines)
+
+    @classmethod
+    def from_dense(cls, operation_ids, operation_job_ids, durations: np.ndarray,
+                   energies: np.ndarray, eligible: np.ndarray, machines) -> 'InstanceArrays':
+        '''
+        Builds the arrays from the operation x machine matrices.
+        Operations are reordered by increasing id if needed.
+        @param operation_ids: id of the operation of each row
+        @param operation_job_ids: job id of the operation of each row
+        @param machines: list of (machine_id, set_up_time, set_up_energy, tear_down_time,
+               tear_down_energy, min_consumption, end_time) sorted as the matrix columns,
+               end_time may be None
+        '''
+        operation_ids = np.asarray(operation_ids, dtype=np.int64)
+        operation_job_ids = np.asarray(operation_job_ids, dtype=np.int64)
+        if np.any(operation_ids[1:] < operation_ids[:-1]):
+            order = np.argsort(operation_ids, kind='stable')
+            operation_ids, operation_job_ids = operation_ids[order], operation_job_ids[order]
+            durations, energies, eligible = durations[order], energies[order], eligible[order]
+
+        job_ids, operation_jobs = np.unique(operation_job_ids, return_inverse=True)
+        operation_jobs = operation_jobs.astype(np.int64).reshape(-1)
+        predecessors, successors = chain_jobs(operation_jobs)
+
+        # Sans date de fin, on borne par un horizon dans lequel tout planning tient
+        end_times = [m[6] for m in machines]
+        if any(end_time is None for end_time in end_times):
+            horizon = (durations.max(axis=1).sum().item() if durations.size else 0) \
+                + sum(m[1] + m[3] for m in machines)
+            end_times = [horizon if end_time is None else end_time for end_time in end_times]
+
+        return cls(operation_ids=operation_ids,
+                   operation_jobs=operation_jobs,
+                   predecessors=predecessors,
+                   successors=successors,
+                   job_ids=job_ids.astype(np.int64),
+                   machine_ids=np.array([m[0] for m in machines], dtype=np.int64),
+                   set_up_times=compact([m[1] for m in machines]),
+                   set_up_energies=compact([m[2] for m in machines]),
+                   tear_down_times=compact([m[3] for m in machines]),
+                   tear_down_energies=compact([m[4] for m in machines]),
+                   min_consumptions=compact([m[5] for m in machines]),
+                   end_times=compact(end_times),
+                   durations=durations,
+                   energies=energies,
+                   eligible=eligible)
+
+
+def _rebuild(fields: Dict[str, np.ndarray]) -> InstanceArrays:
+    return InstanceArrays(**fields)
+
+
+def chain_jobs(operation_jobs: np.ndarray):
+    '''
+    Computes the predecessor and successor arrays of the operations:
+    operations of a job are chained in increasing dense index.
+    '''
+    nb_ops = len(operation_jobs)
+    predecessors = np.full(nb_ops, -1, dtype=np.int64)
+    successors = np.full(nb_ops, -1, dtype=np.int64)
+    last_of_job = {}
+    for i, job in enumerate(operation_jobs.tolist()):
+        previous = last_of_job.get(job)
+        if previous is not None:
+            predecessors[i] = previous
+            successors[previous] = i
+        last_of_job[job] = i
+    return predecessors, successors
@@ -0,0 +1,172 @@
+'''
+On-disk cache of the instance arrays.
+The arrays parsed from the csv files are saved in a binary file, with the size,
+modification time and content hash of the csv files they come from.
+File format: magic, length of a JSON header (stamp of the sources and
+dtype/shape/offset of each array) and the raw bytes of the arrays, so that
+loading is a single read without any parsing.
+The cache is fresh when the files have the same size and modification time,
+or the same size and content (the file has only been touched).
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.scheduling.instance.arrays import InstanceArrays, ALL_FIELDS
+
+
+# À incrémenter quand le format des fichiers de cache ou le parsing change
+CACHE_VERSION = 2
+CACHE_SUFFIX = '_cache.bin'
+_MAGIC = b'JSPCACHE'
+_ALIGNMENT = 8
+
+
+def cache_file(folderpath: str, instance_name: str, cache_dir: Optional[str] = None) -> str:
+    '''
+    Returns the path of the cache file of an instance:
+    next to the csv files, or in cache_dir if given.
+    '''
+    directory = folderpath if cache_dir is None else cache_dir
+    return os.path.join(directory, instance_name + CACHE_SUFFIX)
+
+
+def file_hash(path: str) -> str:
+    '''
+    Returns the content hash of a file.
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stamp(path: str, with_hash: bool = True) -> dict:
+    stat = os.stat(path)
+    stamp = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        stamp['hash'] = file_hash(path)
+    return stamp
+
+
+def _is_fresh(stored: List[dict], sources: List[str]) -> bool:
+    if len(stored) != len(sources):
+        return False
+    for stamp, path in zip(stored, sources):
+        current = _stamp(path, with_hash=False)
+        if current['size'] != stamp['size']:
+            return False
+        if current['mtime_ns'] != stamp['mtime_ns'] and file_hash(path) != stamp['hash']:
+            return False
+    return True
+
+
+def _read_header(content: bytes, sources: List[str]) -> Optional[dict]:
+    if content[:len(_MAGIC)] != _MAGIC:
+        return None
+    start = len(_MAGIC) + 4
+    header_size = int.from_bytes(content[len(_MAGIC):start], 'little')
+    header = json.loads(content[start:start + header_size])
+    if header['version'] != CACHE_VERSION or not _is_fresh(header['sources'], sources):
+        return None
+    return header
+
+
+def load(path: str, sources: List[str]) -> Optional[InstanceArrays]:
+    '''
+    Loads the arrays from the cache file if it is fresh with respect to the sources.
+    Returns None if the cache file does not exist, is stale or unreadable.
+    '''
+    try:
+        with open(path, 'rb') as file:
+            content = file.read()
+    except OSError:
+        return None
+    try:
+        header = _read_header(content, sources)
+        if header is None:
+            return None
+        fields = {}
+        for name, dtype, shape, offset in header['fields']:
+            count = int(np.prod(shape))
+            fields[name] = np.frombuffer(content, dtype=dtype, count=count, offset=offset).reshape(shape)
+        return InstanceArrays(**fields)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def load_shapes(path: str, sources: List[str]) -> Optional[Dict[str, tuple]]:
+    '''
+    Returns the shapes of the cached arrays (name -> shape) without reading
+    the arrays, None if the cache is missing, stale or unreadable.
+    '''
+    try:
+        with open(path, 'rb') as file:
+            start = file.read(len(_MAGIC) + 4)
+            header_size = int.from_bytes(start[len(_MAGIC):], 'little')
+            header = _read_header(start + file.read(header_size), sources)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if header is None:
+        return None
+    return {name: tuple(shape) for name, _, shape, _ in header['fields']}
+
+
+def stamp_sources(sources: List[str]) -> dict:
+    '''
+    Returns the stamp (size, modification time, hash) of the source files.
+    To be taken before parsing them so that a file modified during parsing
+    makes the cache stale.
+    '''
+    return {'version': CACHE_VERSION, 'sources': [_stamp(source) for source in sources]}
+
+
+def save(path: str, stamp: dict, arrays: InstanceArrays):
+    '''
+    Saves the arrays in the cache file (atomically) with the stamp of their sources.
+    The cache is only an optimization: failing to write it is not an error.
+    '''
+    directory = os.path.dirname(path) or '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(_serialize(stamp, arrays))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+
+def _serialize(stamp: dict, arrays: InstanceArrays) -> bytes:
+    data = [np.ascontiguousarray(array) for array in arrays.as_dict().values()]
+    # Les décalages dépendent de la taille de l'en-tête : on la fixe avant de les calculer
+    header = dict(stamp, fields=[[name, array.dtype.str, list(array.shape), 0]
+                                 for name, array in zip(ALL_FIELDS, data)])
+    header_size = len(json.dumps(header)) + 20 * len(data)
+    offset = _aligned(len(_MAGIC) + 4 + header_size)
+    for field, array in zip(header['fields'], data):
+        field[3] = offset
+        offset = _aligned(offset + array.nbytes)
+    encoded = json.dumps(header).encode().ljust(header_size)
+    chunks = [_MAGIC, header_size.to_bytes(4, 'little'), encoded]
+    position = len(_MAGIC) + 4 + header_size
+    for field, array in zip(header['fields'], data):
+        chunks.append(bytes(field[3] - position))
+        chunks.append(array.tobytes())
+        position = field[3] + array.nbytes
+    return b''.join(chunks)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
@@ -0,0 +1,192 @@
+'''
+Catalog of the instances of a data folder (one sub-folder per instance,
+containing <name>_op.csv and <name>_mach.csv).
+Instances are loaded lazily on first access, and a whole corpus
+can be parsed in parallel with a process pool.
+
+@author: Vassilissa Lehoux
+'''
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+import os
+import re
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.arrays import InstanceArrays
+from src.scheduling.instance import cache
+
+
+class InstanceInfo(object):
+    '''
+    Metadata of an instance, obtained without parsing it.
+    '''
+
+    def __init__(self, name: str, folder: str, nb_jobs: int, nb_operations: int, nb_machines: int):
+        self.name = name
+        self.folder = folder
+        self.nb_jobs = nb_jobs
+        self.nb_operations = nb_operations
+        self.nb_machines = nb_machines
+
+    def __str__(self) -> str:
+        return f"{self.name}_M{self.nb_machines}_J{self.nb_jobs}_O{self.nb_operations}"
+
+    def __repr__(self) -> str:
+        return (f"InstanceInfo(name={self.name}, nb_jobs={self.nb_jobs}, "
+                f"nb_operations={self.nb_operations}, nb_machines={self.nb_machines})")
+
+
+def natural_key(name: str):
+    '''
+    Sort key such that jsp2 comes before jsp10.
+    '''
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+def _load_arrays(args) -> InstanceArrays:
+    folder, use_cache, cache_dir = args
+    return Instance.load_arrays(folder, use_cache, cache_dir)
+
+
+class InstanceCatalog(object):
+    '''
+    Instances found in the sub-folders of a root folder.
+    '''
+
+    def __init__(self, root: str, use_cache: bool = True, cache_dir: Optional[str] = None):
+        '''
+        Constructor. Only lists the instance folders, nothing is parsed.
+        @param root: folder containing one folder per instance
+        @param use_cache: use the binary cache of the instance arrays (see Instance.from_file)
+        @param cache_dir: folder of the cache files, next to the csv files if None
+        '''
+        self._root = root
+        self._use_cache = use_cache
+        self._cache_dir = cache_dir
+        self._folders: Dict[str, str] = {}
+        for name in sorted(os.listdir(root), key=natural_key):
+            folder = os.path.join(root, name)
+            if all(os.path.isfile(path) for path in Instance.instance_files(folder)):
+                self._folders[name] = folder
+        self._arrays: Dict[str, InstanceArrays] = {}
+        self._instances: Dict[str, Instance] = {}
+        self._infos: Dict[str, InstanceInfo] = {}
+
+    @property
+    def names(self) -> List[str]:
+        '''
+        Names of the instances, in natural order.
+        '''
+        return list(self._folders)
+
+    def __len__(self) -> int:
+        return len(self._folders)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._folders
+
+    def __iter__(self) -> Iterator[Instance]:
+        '''
+        Iterates over the instances, loading them when needed.
+        '''
+        for name in self._folders:
+            yield self[name]
+
+    def __getitem__(self, name: str) -> Instance:
+        '''
+        Returns the instance, loaded on first access.
+        @raise KeyError: if there is no such instance
+        '''
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = Instance.from_arrays(name, self.arrays(name))
+            self._instances[name] = instance
+        return instance
+
+    def arrays(self, name: str) -> InstanceArrays:
+        '''
+        Returns the arrays of the instance, loaded on first access.
+        @raise KeyError: if there is no such instance
+        '''
+        arrays = self._arrays.get(name)
+        if arrays is None:
+            arrays = _load_arrays((self.folder(name), self._use_cache, self._cache_dir))
+            self._arrays[name] = arrays
+        return arrays
+
+    def folder(self, name: str) -> str:
+        '''
+        Returns the folder of the instance.
+        @raise KeyError: if there is no such instance
+        '''
+        if name not in self._folders:
+            raise KeyError(f"Instance {name} not found in {self._root}")
+        return self._folders[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._arrays
+
+    def info(self, name: str) -> InstanceInfo:
+        '''
+        Returns the metadata of the instance without parsing it:
+        from the loaded arrays, from the header of a fresh cache file
+        or by counting the rows of the csv files.
+        '''
+        info = self._infos.get(name)
+        if info is None:
+            info = self._read_info(name)
+            self._infos[name] = info
+        return info
+
+    def infos(self) -> List[InstanceInfo]:
+        return [self.info(name) for name in self._folders]
+
+    def _read_info(self, name: str) -> InstanceInfo:
+        folder = self.folder(name)
+        arrays = self._arrays.get(name)
+        if arrays is not None:
+            return InstanceInfo(name, folder, arrays.nb_jobs, arrays.nb_operations, arrays.nb_machines)
+
+        sources = list(Instance.instance_files(folder))
+        if self._use_cache:
+            shapes = cache.load_shapes(cache.cache_file(folder, name, self._cache_dir), sources)
+            if shapes is not None:
+                return InstanceInfo(name, folder, shapes['job_ids'][0],
+                                    shapes['operation_ids'][0], shapes['machine_ids'][0])
+
+        operations_file, machines_file = sources
+        with open(machines_file, 'r') as file:
+            next(file, None)
+            nb_machines = sum(1 for line in file if line.strip())
+        operations = set()
+        jobs = set()
+        with open(operations_file, 'r') as file:
+            next(file, None)
+            # Dans les deux formats, les deux premières colonnes sont le job et l'opération
+            for line in file:
+                fields = line.split(',', 2)
+                if len(fields) < 3:
+                    continue
+                jobs.add(int(fields[0]))
+                operations.add(int(fields[1]))
+        return InstanceInfo(name, folder, len(jobs), len(operations), nb_machines)
+
+    def prefetch(self, names: Optional[List[str]] = None, workers: Optional[int] = None):
+        '''
+        Parses the instances in parallel with a process pool
+        (the cache files are written by the workers).
+        @param names: instances to load, all of them if None
+        @param workers: number of processes, os.cpu_count() if None, 1 to load serially
+        '''
+        names = [name for name in (self.names if names is None else names)
+                 if name not in self._arrays]
+        args = [(self.folder(name), self._use_cache, self._cache_dir) for name in names]
+        if workers == 1 or len(names) <= 1:
+            loaded = map(_load_arrays, args)
+            for name, arrays in zip(names, loaded):
+                self._arrays[name] = arrays
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(names) // (4 * (workers or os.cpu_count() or 1)))
+            for name, arrays in zip(names, executor.map(_load_arrays, args, chunksize=chunksize)):
+                self._arrays[name] = arrays
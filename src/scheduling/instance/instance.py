@@ -3,13 +3,18 @@ Information for the instance of the optimization problem.
 
 @author: Vassilissa Lehoux
 '''
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
 import csv
 
+import numpy as np
+
 from src.scheduling.instance.job import Job
 from src.scheduling.instance.operation import Operation
 from src.scheduling.instance.machine import Machine
+from src.scheduling.instance.arrays import InstanceArrays
+from src.scheduling.instance.streaming import is_long_format, read_long_format
+from src.scheduling.instance import cache
 
 
 class Instance(object):
@@ -35,24 +40,114 @@ class Instance(object):
         self._jobs_dict: Dict[int, Job] = {}
         self._operations_dict: Dict[int, Operation] = {}
 
+        # Vue en colonnes de l'instance (voir from_arrays)
+        self._arrays: Optional[InstanceArrays] = None
+
+        # Solution dont le planning est actuellement stocké dans les objets (voir Solution)
+        self._active_solution = None
+
     @classmethod
-    def from_file(cls, folderpath: str):
+    def from_file(cls, folderpath: str, use_cache: bool = True, cache_dir: Optional[str] = None):
         """
         Crée une instance à partir des fichiers CSV dans le dossier spécifié.
+        Les fichiers sont lus une seule fois pour construire les tableaux
+        de l'instance (voir InstanceArrays), puis les objets sont construits
+        comme des vues sur ces tableaux.
+        Les tableaux sont mis en cache dans un fichier binaire (voir le module cache),
+        rechargé directement tant que les fichiers CSV ne changent pas.
         
         Args:
             folderpath (str): Chemin vers le dossier contenant les fichiers CSV
+            use_cache (bool): Utiliser (et mettre à jour) le cache des tableaux
+            cache_dir (str): Dossier du cache, à côté des fichiers CSV par défaut
             
         Returns:
             Instance: L'instance créée à partir des fichiers
         """
-        inst = cls(os.path.basename(folderpath))
-        
+        instance_name = os.path.basename(os.path.normpath(folderpath))
+        return cls.from_arrays(instance_name, cls.load_arrays(folderpath, use_cache, cache_dir))
+
+    @staticmethod
+    def load_arrays(folderpath: str, use_cache: bool = True,
+                    cache_dir: Optional[str] = None) -> InstanceArrays:
+        """
+        Charge les tableaux de l'instance du dossier spécifié,
+        depuis le cache s'il est à jour, depuis les fichiers CSV sinon.
+
+        Args:
+            folderpath (str): Chemin vers le dossier contenant les fichiers CSV
+            use_cache (bool): Utiliser (et mettre à jour) le cache des tableaux
+            cache_dir (str): Dossier du cache, à côté des fichiers CSV par défaut
+
+        Returns:
+            InstanceArrays: Les tableaux de l'instance
+        """
+        instance_name = os.path.basename(os.path.normpath(folderpath))
+        operations_file, machines_file = Instance.instance_files(folderpath)
+        if not use_cache:
+            return Instance.read_arrays(operations_file, machines_file)
+
+        sources = [operations_file, machines_file]
+        cache_path = cache.cache_file(folderpath, instance_name, cache_dir)
+        arrays = cache.load(cache_path, sources)
+        if arrays is None:
+            stamp = cache.stamp_sources(sources)
+            arrays = Instance.read_arrays(operations_file, machines_file)
+            cache.save(cache_path, stamp, arrays)
+        return arrays
+
+    @staticmethod
+    def instance_files(folderpath: str):
+        """
+        Retourne les chemins des fichiers des opérations et des machines
+        de l'instance du dossier spécifié.
+        """
+        instance_name = os.path.basename(os.path.normpath(folderpath))
+        return (os.path.join(folderpath, instance_name + '_op.csv'),
+                os.path.join(folderpath, instance_name + '_mach.csv'))
+
+    @staticmethod
+    def read_arrays(operations_file: str, machines_file: str) -> InstanceArrays:
+        """
+        Lit les fichiers CSV de l'instance et construit ses tableaux.
+
+        Args:
+            operations_file (str): Fichier des opérations
+            machines_file (str): Fichier des machines
+
+        Returns:
+            InstanceArrays: Les tableaux de l'instance
+        """
+        operations = []
+        machines = []
+
+        # Lecture des informations sur les machines
+        with open(machines_file, 'r') as csv_file:
+            csv_reader = csv.reader(csv_file)
+            header = next(csv_reader)  
+            
+            # Supposons que le header est: machine_id, startup_time, startup_energy, shutdown_time,
+            # shutdown_energy, idle_energy[, end_time]
+            for row in csv_reader:
+                if len(row) >= 6: 
+                    machine_id = int(row[0])
+                    startup_time = float(row[1])
+                    startup_energy = float(row[2])
+                    shutdown_time = float(row[3])
+                    shutdown_energy = float(row[4])
+                    idle_energy_per_time = float(row[5])
+                    end_time = float(row[6]) if len(row) >= 7 else None
+                    machines.append((machine_id, startup_time, startup_energy, shutdown_time,
+                                     shutdown_energy, idle_energy_per_time, end_time))
+
         # Lecture des informations sur les opérations
-        operations_file = os.path.join(folderpath, inst._instance_name + '_op.csv')
         with open(operations_file, 'r') as csv_file:
+            header = next(csv.reader([csv_file.readline()]), [])
+            if is_long_format(header):
+                # Format long : une ligne par couple (opération, machine éligible)
+                return read_long_format(csv_file, machines)
+
             csv_reader = csv.reader(csv_file)
-            header = next(csv_reader)  
             
             # Supposons que le header est: job_id, operation_id, machine_ids, durations, energies
             for row in csv_reader:
@@ -81,54 +176,52 @@ class Instance(object):
                     else:
                         energies = []
                     
-                    # Créer l'opération
-                    operation = Operation(operation_id, job_id, machine_ids, durations, energies)
-                    inst._operations.append(operation)
-                    inst._operations_dict[operation_id] = operation
+                    operations.append((job_id, operation_id, machine_ids, durations, energies))
 
-        # Lecture des informations sur les machines
-        machines_file = os.path.join(folderpath, inst._instance_name + '_mach.csv')
-        with open(machines_file, 'r') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            header = next(csv_reader)  
-            
-            # Supposons que le header est: machine_id, startup_time, startup_energy, shutdown_time, shutdown_energy, idle_energy
-            for row in csv_reader:
-                if len(row) >= 6: 
-                    machine_id = int(row[0])
-                    startup_time = float(row[1])
-                    startup_energy = float(row[2])
-                    shutdown_time = float(row[3])
-                    shutdown_energy = float(row[4])
-                    idle_energy_per_time = float(row[5])
-                    
-                    # Créer la machine
-                    machine = Machine(machine_id, startup_time, startup_energy, 
-                                    shutdown_time, shutdown_energy, idle_energy_per_time)
-                    inst._machines.append(machine)
-                    inst._machines_dict[machine_id] = machine
-
-        # Création des jobs à partir des opérations
-        jobs_dict = {}
-        for operation in inst._operations:
-            job_id = operation.job_id
-            if job_id not in jobs_dict:
-                jobs_dict[job_id] = []
-            jobs_dict[job_id].append(operation)
-        
-        # Créer les objets Job et les trier par ordre des opérations
-        for job_id, operations_list in jobs_dict.items():
-            # Trier les opérations par ID (supposant que l'ID reflète l'ordre)
-            operations_list.sort(key=lambda op: op.operation_id)
+        return InstanceArrays.build(operations, machines)
+
+    @classmethod
+    def from_arrays(cls, instance_name: str, arrays: InstanceArrays):
+        """
+        Crée une instance à partir de ses tableaux.
+        Les machines, opérations et jobs sont des vues sur ces tableaux.
+
+        Args:
+            instance_name (str): Nom de l'instance
+            arrays (InstanceArrays): Tableaux de l'instance
+
+        Returns:
+            Instance: L'instance correspondante
+        """
+        inst = cls(instance_name)
+        inst._arrays = arrays
+
+        machine_params = zip(arrays.machine_ids.tolist(), arrays.set_up_times.tolist(),
+                             arrays.set_up_energies.tolist(), arrays.tear_down_times.tolist(),
+                             arrays.tear_down_energies.tolist(), arrays.min_consumptions.tolist(),
+                             arrays.end_times.tolist())
+        for index, params in enumerate(machine_params):
+            machine = Machine(*params)
+            machine.bind(index)
+            inst._machines.append(machine)
+            inst._machines_dict[machine.machine_id] = machine
+
+        job_ids = arrays.job_ids.tolist()
+        operations_of_job = [[] for _ in job_ids]
+        for index, (operation_id, job) in enumerate(zip(arrays.operation_ids.tolist(),
+                                                        arrays.operation_jobs.tolist())):
+            operation = Operation(job_ids[job], operation_id)
+            operation.bind(index, arrays)
+            inst._operations.append(operation)
+            inst._operations_dict[operation_id] = operation
+            operations_of_job[job].append(operation)
+
+        # Les opérations d'un job sont dans l'ordre des indices (voir InstanceArrays)
+        for job_id, operations_list in zip(job_ids, operations_of_job):
             job = Job(job_id, operations_list)
             inst._jobs.append(job)
             inst._jobs_dict[job_id] = job
-        
-        # Trier les listes pour une cohérence
-        inst._jobs.sort(key=lambda j: j.job_id)
-        inst._machines.sort(key=lambda m: m.machine_id)
-        inst._operations.sort(key=lambda op: op.operation_id)
-        
+
         return inst
 
     @property
@@ -136,6 +229,15 @@ class Instance(object):
         """Retourne le nom de l'instance."""
         return self._instance_name
 
+    @property
+    def arrays(self) -> InstanceArrays:
+        """
+        Retourne la vue en colonnes de l'instance : matrices opération x machine
+        des durées et énergies, masque d'éligibilité et vecteurs des paramètres
+        des machines, indexés comme operations et machines.
+        """
+        return self._arrays
+
     @property
     def machines(self) -> List[Machine]:
         """Retourne la liste des machines."""
@@ -264,8 +366,7 @@ class Instance(object):
         Returns:
             List[Operation]: Liste des opérations compatibles avec cette machine
         """
-        compatible_operations = []
-        for operation in self._operations:
-            if machine_id in operation.available_machines:
-                compatible_operations.append(operation)
-        return compatible_operations
\ No newline at end of file
+        column = self._arrays.machine_index.get(machine_id)
+        if column is None:
+            return []
+        return [self._operations[i] for i in np.flatnonzero(self._arrays.eligible[:, column])]
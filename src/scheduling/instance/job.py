@@ -25,6 +25,8 @@ class Job(object):
         self._job_id = job_id
         self._operations: List[Operation] = operations if operations is not None else []
         self._next_operation_index = 0 
+        # Journal d'annulation de la solution en cours (voir Solution.checkpoint)
+        self._journal: Optional[list] = None
         
         # Assurer l'ordre des opérations et les contraintes de précédence
         if self._operations:
@@ -37,6 +39,19 @@ class Job(object):
         '''
         return self._job_id
 
+    def set_journal(self, journal: Optional[list]):
+        '''
+        Sets the undo journal in which schedule_operation records the
+        previous next operation (None: no journal).
+        '''
+        self._journal = journal
+
+    def save_state(self) -> int:
+        return self._next_operation_index
+
+    def restore_state(self, state: int):
+        self._next_operation_index = state
+
     def reset(self):
         '''
         Resets the planned operations
@@ -44,7 +59,7 @@ class Job(object):
         self._next_operation_index = 0
         # Reset également l'état de planification de chaque opération
         for operation in self._operations:
-            operation.reset_scheduling()
+            operation.reset()
 
     @property
     def operations(self) -> List[Operation]:
@@ -67,8 +82,8 @@ class Job(object):
         Updates the next_operation to schedule
         '''
         if self._next_operation_index < len(self._operations):
-            current_operation = self._operations[self._next_operation_index]
-            current_operation.mark_as_scheduled()
+            if self._journal is not None:
+                self._journal.append((self, self._next_operation_index, 'schedule_operation', ()))
             self._next_operation_index += 1
 
     @property
@@ -176,7 +191,7 @@ class Job(object):
         
         for i in range(operation_index):
             prev_operation = self._operations[i]
-            if not (hasattr(prev_operation, 'is_scheduled') and prev_operation.is_scheduled()):
+            if not prev_operation.assigned:
                 return False
         
         return True
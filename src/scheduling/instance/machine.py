@@ -5,18 +5,29 @@ Machine on which operation are executed.
 '''
 from typing import List, Tuple, Optional
 from src.scheduling.instance.operation import Operation
+from src.scheduling import instrumentation
 
 
 class ScheduledOperation:
     '''
     Classe auxiliaire pour représenter une opération planifiée sur une machine.
     '''
+    __slots__ = ('operation', 'start_time', 'duration', 'energy', 'end_time')
+
     def __init__(self, operation: Operation, start_time: int, duration: int, energy: int):
         self.operation = operation
         self.start_time = start_time
         self.duration = duration
         self.energy = energy
         self.end_time = start_time + duration
+
+    @property
+    def operation_id(self) -> int:
+        return self.operation.operation_id
+
+    @property
+    def job_id(self) -> int:
+        return self.operation.job_id
     
     def __str__(self):
         return f"Op{self.operation.operation_id}[{self.start_time}-{self.end_time}]"
@@ -45,6 +56,7 @@ class Machine(object):
         self._tear_down_energy = tear_down_energy
         self._min_consumption = min_consumption  # Consommation en mode veille
         self._end_time = end_time  # Temps de fin maximum du planning
+        self._index = -1  # Indice dense dans les tableaux de l'instance
         
         # État de la machine
         self._scheduled_operations: List[ScheduledOperation] = []
@@ -52,6 +64,16 @@ class Machine(object):
         self._stop_times: List[int] = []   # Temps d'arrêt
         self._is_running = False
         self._current_time = 0  # Temps courant de disponibilité
+
+        # Totaux maintenus par add_operation et stop (voir working_time
+        # et total_energy_consumption)
+        self._processing_energy = 0
+        self._closed_working_time = 0  # Durée des périodes d'allumage terminées
+        self._closed_idle_time = 0  # Temps de veille des périodes terminées
+        self._period_processing_time = 0  # Durée des opérations de la période en cours
+
+        # Journal d'annulation de la solution en cours (voir Solution.checkpoint)
+        self._journal: Optional[list] = None
         
     def reset(self):
         '''
@@ -62,6 +84,58 @@ class Machine(object):
         self._stop_times.clear()
         self._is_running = False
         self._current_time = 0
+        self._processing_energy = 0
+        self._closed_working_time = 0
+        self._closed_idle_time = 0
+        self._period_processing_time = 0
+
+    def bind(self, index: int):
+        '''
+        Records the dense index of the machine in the instance arrays.
+        '''
+        self._index = index
+
+    def set_journal(self, journal: Optional[list]):
+        '''
+        Sets the undo journal in which add_operation and stop record
+        the state they modify (None: no journal).
+        '''
+        self._journal = journal
+
+    def save_state(self, periods: bool = False) -> tuple:
+        '''
+        Returns the planning state of the machine, to be given to restore_state.
+        The lists are only appended to, their lengths are enough to restore them,
+        except the start and stop times replaced by set_periods (periods=True: copied).
+        '''
+        starts, stops = len(self._start_times), len(self._stop_times)
+        if periods:
+            starts, stops = list(self._start_times), list(self._stop_times)
+        return (self._is_running, self._current_time, self._processing_energy,
+                self._closed_working_time, self._closed_idle_time, self._period_processing_time,
+                starts, stops, len(self._scheduled_operations))
+
+    def restore_state(self, state: tuple):
+        '''
+        Restores a state returned by save_state.
+        '''
+        (self._is_running, self._current_time, self._processing_energy,
+         self._closed_working_time, self._closed_idle_time, self._period_processing_time,
+         starts, stops, nb_operations) = state
+        if isinstance(starts, list):
+            self._start_times[:] = starts
+            self._stop_times[:] = stops
+        else:
+            del self._start_times[starts:]
+            del self._stop_times[stops:]
+        del self._scheduled_operations[nb_operations:]
+
+    @property
+    def index(self) -> int:
+        '''
+        Dense index of the machine in the instance arrays (-1 if unbound).
+        '''
+        return self._index
 
     @property
     def set_up_time(self) -> int:
@@ -77,6 +151,34 @@ class Machine(object):
         '''
         return self._tear_down_time
 
+    @property
+    def set_up_energy(self) -> int:
+        '''
+        Énergie nécessaire pour démarrer la machine.
+        '''
+        return self._set_up_energy
+
+    @property
+    def tear_down_energy(self) -> int:
+        '''
+        Énergie nécessaire pour arrêter la machine.
+        '''
+        return self._tear_down_energy
+
+    @property
+    def min_consumption(self) -> int:
+        '''
+        Consommation par unité de temps de la machine allumée et inoccupée.
+        '''
+        return self._min_consumption
+
+    @property
+    def end_time(self) -> int:
+        '''
+        Date avant laquelle la machine doit être arrêtée.
+        '''
+        return self._end_time
+
     @property
     def machine_id(self) -> int:
         '''
@@ -99,10 +201,22 @@ class Machine(object):
         """
         return self._current_time
 
+    def operation_start_time(self, start_time: int) -> int:
+        '''
+        Returns the time at which an operation added now with add_operation
+        would start, without modifying the machine.
+        '''
+        if self._is_running:
+            return max(start_time, self._current_time)
+        # La machine est démarrée au plus tard pour être prête à start_time
+        return max(self._current_time, start_time - self._set_up_time) + self._set_up_time
+
     def add_operation(self, operation: Operation, start_time: int) -> int:
         '''
         Adds an operation on the machine, at the end of the schedule,
         as soon as possible after time start_time.
+        If the machine is stopped, it is started as late as possible
+        for the operation to start at start_time.
         Returns the actual start time.
         '''
         # Obtenir la durée et l'énergie pour cette opération sur cette machine
@@ -113,23 +227,26 @@ class Machine(object):
             raise ValueError(f"Operation {operation.operation_id} cannot be executed on machine {self._machine_id}")
         
         # Calculer le temps de début effectif
-        actual_start_time = max(start_time, self._current_time)
-        
-        # Si la machine n'est pas en marche, il faut la démarrer
-        if not self._is_running:
-            # Temps de démarrage nécessaire
-            startup_end_time = actual_start_time + self._set_up_time
-            self._start_times.append(actual_start_time)
-            self._is_running = True
-            actual_start_time = startup_end_time
+        actual_start_time = self.operation_start_time(start_time)
         
         # Vérifier qu'il y a assez de temps pour l'opération et l'arrêt
         operation_end_time = actual_start_time + duration
         if operation_end_time + self._tear_down_time > self._end_time:
             raise ValueError(f"Not enough time to schedule operation {operation.operation_id} and shutdown")
+
+        if self._journal is not None:
+            self._journal.append((self, self.save_state(), 'add_operation', (operation, start_time)))
+
+        # Si la machine n'est pas en marche, il faut la démarrer
+        if not self._is_running:
+            self._start_times.append(actual_start_time - self._set_up_time)
+            self._is_running = True
+            self._period_processing_time = 0
         
         scheduled_op = ScheduledOperation(operation, actual_start_time, duration, energy)
         self._scheduled_operations.append(scheduled_op)
+        self._processing_energy += energy
+        self._period_processing_time += duration
         
         self._current_time = operation_end_time
         
@@ -148,61 +265,46 @@ class Machine(object):
             
             if stop_end_time > self._end_time:
                 raise ValueError(f"Cannot shutdown machine before end time {self._end_time}")
+
+            if self._journal is not None:
+                self._journal.append((self, self.save_state(), 'stop', (at_time,)))
             
+            period_start = self._start_times[-1]
+            self._closed_working_time += stop_end_time - period_start
+            self._closed_idle_time += (stop_start_time - period_start - self._set_up_time
+                                       - self._period_processing_time)
             self._stop_times.append(stop_start_time)
             self._current_time = stop_end_time
             self._is_running = False
 
+    @property
+    def is_running(self) -> bool:
+        '''
+        True if the machine has been started and not stopped since.
+        A machine still running is considered on until its end_time.
+        '''
+        return self._is_running
+
     @property
     def working_time(self) -> int:
         '''
         Total time during which the machine is running
+        (from the beginning of each set up to the end of the following tear down,
+        or to end_time if the machine is still running).
         '''
-        total_time = 0
-        
-        total_time += len(self._start_times) * self._set_up_time
-        
-        for scheduled_op in self._scheduled_operations:
-            total_time += scheduled_op.duration
-        
-        total_time += len(self._stop_times) * self._tear_down_time
-        
-        idle_time = self._calculate_idle_time()
-        total_time += idle_time
-        
-        return total_time
+        if self._is_running:
+            return self._closed_working_time + self._end_time - self._start_times[-1]
+        return self._closed_working_time
 
     def _calculate_idle_time(self) -> int:
         '''
-        Calcule le temps de veille entre les opérations.
+        Calcule le temps de veille : temps pendant lequel la machine est allumée
+        sans être en train de démarrer, de s'arrêter ou d'exécuter une opération.
         '''
-        if not self._scheduled_operations:
-            return 0
-        
-        idle_time = 0
-        current_time = 0
-        
-        for i, start_time in enumerate(self._start_times):
-            machine_start = start_time + self._set_up_time
-            
-            ops_in_period = []
-            if i < len(self._stop_times):
-                period_end = self._stop_times[i]
-                ops_in_period = [op for op in self._scheduled_operations 
-                               if machine_start <= op.start_time < period_end]
-            else:
-                ops_in_period = [op for op in self._scheduled_operations 
-                               if op.start_time >= machine_start]
-            
-            ops_in_period.sort(key=lambda x: x.start_time)
-            period_time = machine_start
-            
-            for op in ops_in_period:
-                if op.start_time > period_time:
-                    idle_time += op.start_time - period_time
-                period_time = op.end_time
-        
-        return idle_time
+        if self._is_running:
+            return (self._closed_idle_time + self._end_time - self._start_times[-1]
+                    - self._set_up_time - self._period_processing_time)
+        return self._closed_idle_time
 
     @property
     def start_times(self) -> List[int]:
@@ -210,38 +312,27 @@ class Machine(object):
         Returns the list of the times at which the machine is started
         in increasing order
         """
-        return sorted(self._start_times)
+        return self._start_times.copy()
 
     @property
     def stop_times(self) -> List[int]:
         """
         Returns the list of the times at which the machine is stopped
-        in increasing order
+        in increasing order (end_time for a machine still running)
         """
-        return sorted(self._stop_times)
+        if self._is_running:
+            return self._stop_times + [self._end_time]
+        return self._stop_times.copy()
 
     @property
     def total_energy_consumption(self) -> int:
         """
         Total energy consumption of the machine during planning execution.
         """
-        total_energy = 0
-        
-        # Énergie de démarrage
-        total_energy += len(self._start_times) * self._set_up_energy
-        
-        # Énergie d'arrêt
-        total_energy += len(self._stop_times) * self._tear_down_energy
-        
-        # Énergie des opérations
-        for scheduled_op in self._scheduled_operations:
-            total_energy += scheduled_op.energy
-        
-        # Énergie de veille
-        idle_time = self._calculate_idle_time()
-        total_energy += idle_time * self._min_consumption
-        
-        return total_energy
+        return (len(self._start_times) * self._set_up_energy
+                + len(self._stop_times) * self._tear_down_energy
+                + self._processing_energy
+                + self._calculate_idle_time() * self._min_consumption)
 
     def __str__(self):
         return f"M{self.machine_id}"
@@ -307,6 +398,50 @@ class Machine(object):
             else:
                 raise ValueError(f"Cannot shutdown machine {self._machine_id} before end time")
     
+    def optimal_intervals(self) -> List[Tuple[int, int]]:
+        '''
+        Computes in one sweep over the scheduled operations (start times fixed)
+        the (start, stop) periods of the machine that minimize its energy consumption:
+        the machine is shut down during an idle gap when it has the time to be torn
+        down and set up again and when set_up_energy + tear_down_energy is lower than
+        min_consumption * gap. The gaps being independent, the choice is optimal.
+        The machine is started just before its first operation and stopped after the last one.
+        '''
+        operations = self._scheduled_operations
+        if not operations:
+            return []
+        shutdown_time = self._tear_down_time + self._set_up_time
+        shutdown_energy = self._set_up_energy + self._tear_down_energy
+        intervals = []
+        start = operations[0].start_time - self._set_up_time
+        for previous, operation in zip(operations, operations[1:]):
+            gap = operation.start_time - previous.end_time
+            if gap >= shutdown_time and shutdown_energy < self._min_consumption * gap:
+                intervals.append((start, previous.end_time))
+                start = operation.start_time - self._set_up_time
+        intervals.append((start, operations[-1].end_time))
+        return intervals
+
+    def set_periods(self, intervals: List[Tuple[int, int]]):
+        '''
+        Replaces the (start, stop) periods of the machine, the scheduled
+        operations keeping their start times (see optimal_intervals): the
+        machine is then stopped. In O(number of operations).
+        @param intervals: periods in increasing order, each operation being
+               processed in one of them and the last one ending with the last operation
+        '''
+        if self._journal is not None:
+            self._journal.append((self, self.save_state(periods=True), 'set_periods', (intervals,)))
+        processing_time = sum(operation.duration for operation in self._scheduled_operations)
+        self._start_times[:] = [start for start, _ in intervals]
+        self._stop_times[:] = [stop for _, stop in intervals]
+        self._closed_working_time = sum(stop + self._tear_down_time - start for start, stop in intervals)
+        self._closed_idle_time = (sum(stop - start - self._set_up_time for start, stop in intervals)
+                                  - processing_time)
+        if intervals:
+            self._current_time = intervals[-1][1] + self._tear_down_time
+        self._is_running = False
+
     def validate_schedule(self) -> bool:
         '''
         Valide la cohérence du planning de la machine.
@@ -328,4 +463,9 @@ class Machine(object):
             return True
             
         except Exception:
-            return False
\ No newline at end of file
+            return False
+
+
+instrumentation.add_hot_path('Machine.add_operation', Machine, 'add_operation')
+instrumentation.add_hot_path('Machine.stop', Machine, 'stop')
+instrumentation.add_hot_path('Machine.total_energy_consumption', Machine, 'total_energy_consumption')
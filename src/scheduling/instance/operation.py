@@ -5,13 +5,14 @@ When operation is scheduled, its schedule information is updated.
 
 @author: Vassilissa Lehoux
 '''
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
 
 class OperationScheduleInfo:
     '''
     Informations connues quand l'opération est planifiée
     '''
+    __slots__ = ('machine_id', 'schedule_time', 'duration', 'energy_consumption')
 
     def __init__(self, machine_id: int, schedule_time: int, duration: int, energy_consumption: int):
         self.machine_id = machine_id
@@ -28,13 +29,40 @@ class Operation:
     '''
     Opération d'un job
     '''
+    __slots__ = ('_job_id', '_operation_id', '_predecessors', '_successors', '_schedule_info',
+                 '_index', '_machine_index', '_durations', '_energies', '_eligible',
+                 '_available_machines', '_journal')
 
     def __init__(self, job_id: int, operation_id: int):
         self._job_id = job_id
         self._operation_id = operation_id
-        self._predecessors: List[Operation] = []
-        self._successors: List[Operation] = []
+        # Tuples : les opérations sans prédécesseur/successeur partagent le tuple vide
+        self._predecessors: Tuple[Operation, ...] = ()
+        self._successors: Tuple[Operation, ...] = ()
         self._schedule_info: Optional[OperationScheduleInfo] = None
+        # Vue sur les tableaux de l'instance (voir bind)
+        self._index = -1
+        self._machine_index = {}
+        self._durations = None
+        self._energies = None
+        self._eligible = None
+        self._available_machines: List[int] = []
+        # Journal d'annulation de la solution en cours (voir Solution.checkpoint)
+        self._journal: Optional[list] = None
+
+    def bind(self, index: int, arrays):
+        '''
+        Binds the operation to its row in the instance arrays.
+        Durations and energies are then read from the arrays.
+        @param index: dense index of the operation
+        @param arrays: InstanceArrays of the instance
+        '''
+        self._index = index
+        self._machine_index = arrays.machine_index
+        self._durations = arrays.durations[index]
+        self._energies = arrays.energies[index]
+        self._eligible = arrays.eligible[index]
+        self._available_machines = arrays.machine_ids[self._eligible].tolist()
 
     def __str__(self):
         base_str = f"O{self.operation_id}_J{self.job_id}"
@@ -57,7 +85,7 @@ class Operation:
         Ajoute un prédécesseur à l'opération
         '''
         if operation not in self._predecessors:
-            self._predecessors.append(operation)
+            self._predecessors += (operation,)
             operation.add_successor(self)
 
     def add_successor(self, operation):
@@ -65,7 +93,7 @@ class Operation:
         Ajoute un successeur à l'opération
         '''
         if operation not in self._successors:
-            self._successors.append(operation)
+            self._successors += (operation,)
 
     @property
     def operation_id(self) -> int:
@@ -75,12 +103,84 @@ class Operation:
     def job_id(self) -> int:
         return self._job_id
 
+    def set_journal(self, journal: Optional[list]):
+        '''
+        Sets the undo journal in which schedule records the previous schedule information
+        (None: no journal).
+        '''
+        self._journal = journal
+
+    def save_state(self) -> Optional[OperationScheduleInfo]:
+        return self._schedule_info
+
+    def restore_state(self, state: Optional[OperationScheduleInfo]):
+        self._schedule_info = state
+
+    @property
+    def index(self) -> int:
+        '''
+        Dense index of the operation in the instance arrays (-1 if unbound)
+        '''
+        return self._index
+
+    @property
+    def available_machines(self) -> List[int]:
+        '''
+        Ids of the machines on which the operation can be executed
+        '''
+        return self._available_machines
+
+    def _column(self, machine_id: int) -> Optional[int]:
+        column = self._machine_index.get(machine_id)
+        if column is None or not self._eligible.item(column):
+            return None
+        return column
+
+    def can_be_executed_on_machine(self, machine_id: int) -> bool:
+        return self._column(machine_id) is not None
+
+    def get_duration_for_machine(self, machine_id: int) -> Optional[int]:
+        '''
+        Durée de l'opération sur la machine, None si elle ne peut pas y être exécutée
+        '''
+        column = self._column(machine_id)
+        if column is None:
+            return None
+        return self._durations.item(column)
+
+    def get_energy_for_machine(self, machine_id: int) -> Optional[int]:
+        '''
+        Énergie de l'opération sur la machine, None si elle ne peut pas y être exécutée
+        '''
+        column = self._column(machine_id)
+        if column is None:
+            return None
+        return self._energies.item(column)
+
+    def min_duration(self) -> int:
+        '''
+        Plus petite durée de l'opération parmi les machines éligibles
+        '''
+        if not self._available_machines:
+            return 0
+        return self._durations[self._eligible].min().item()
+
+    def is_valid(self) -> bool:
+        '''
+        Retourne True si l'opération a au moins une machine éligible
+        et des durées/énergies positives sur ses machines éligibles
+        '''
+        if not self._available_machines:
+            return False
+        return bool((self._durations[self._eligible] > 0).all()
+                    and (self._energies[self._eligible] >= 0).all())
+
     @property
-    def predecessors(self) -> List:
+    def predecessors(self) -> Sequence:
         return self._predecessors
 
     @property
-    def successors(self) -> List:
+    def successors(self) -> Sequence:
         return self._successors
 
     @property
@@ -134,6 +234,9 @@ class Operation:
             if not self.is_ready(at_time):
                 return False
 
+        if self._journal is not None:
+            self._journal.append((self, self._schedule_info, 'schedule',
+                                  (machine_id, at_time, duration, energy_consumption, False)))
         self._schedule_info = OperationScheduleInfo(machine_id, at_time, duration, energy_consumption)
         return True
 
@@ -0,0 +1,104 @@
+'''
+Single-pass reader for the long-form operation files:
+    job,operation,machine,processing_time,energy_consumption
+with one row per (operation, eligible machine) and the rows of an
+operation on consecutive lines.
+Rows are written directly into flat typed buffers (array module) that
+become the operation x machine matrices without copy.
+
+@author: Vassilissa Lehoux
+'''
+from array import array
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from src.scheduling.instance.arrays import InstanceArrays
+
+
+LONG_FORMAT_COLUMNS = ('job', 'operation', 'machine', 'processing_time', 'energy_consumption')
+
+
+def is_long_format(header: List[str]) -> bool:
+    '''
+    Returns True if the header of the operation file is the long-form one.
+    '''
+    return tuple(column.strip() for column in header[:5]) == LONG_FORMAT_COLUMNS
+
+
+def read_long_format(lines: Iterable[str], machines: List[Tuple]) -> InstanceArrays:
+    '''
+    Reads the operations in one pass over the lines (header excluded).
+    @param lines: the lines of the operation file after the header
+    @param machines: list of (machine_id, set_up_time, set_up_energy, tear_down_time,
+           tear_down_energy, min_consumption, end_time) tuples
+    '''
+    machines = sorted(machines, key=lambda m: m[0])
+    machine_index = {m[0]: i for i, m in enumerate(machines)}
+    nb_machines = len(machines)
+    empty_row = bytes(8 * nb_machines)
+
+    operation_ids = array('q')
+    job_ids = array('q')
+    durations = array('q')
+    energies = array('q')
+    eligible = bytearray()
+    seen = set()
+    current_key = None
+    row_start = 0
+    for line_number, line in enumerate(lines, start=2):
+        fields = line.split(',')
+        if len(fields) < 5:
+            if line.strip():
+                raise ValueError(f"Line {line_number}: expected 5 columns, got {len(fields)}")
+            continue
+        job, operation, machine, duration, energy = fields[:5]
+        if (job, operation) != current_key:
+            current_key = (job, operation)
+            operation_id = int(operation)
+            if operation_id in seen:
+                raise ValueError(f"Line {line_number}: rows of operation {operation_id} are not consecutive")
+            seen.add(operation_id)
+            operation_ids.append(operation_id)
+            job_ids.append(int(job))
+            row_start = len(eligible)
+            durations.frombytes(empty_row)
+            energies.frombytes(empty_row)
+            eligible.extend(empty_row[:nb_machines])
+        try:
+            cell = row_start + machine_index[int(machine)]
+        except KeyError:
+            raise KeyError(f"Operation {operation_ids[-1]} references non-existent machine {int(machine)}")
+        try:
+            durations[cell] = int(duration)
+            energies[cell] = int(energy)
+        except (ValueError, TypeError):
+            durations = _store(durations, cell, duration)
+            energies = _store(energies, cell, energy)
+        eligible[cell] = 1
+
+    shape = (len(operation_ids), nb_machines)
+    return InstanceArrays.from_dense(np.frombuffer(operation_ids, dtype=np.int64),
+                                     np.frombuffer(job_ids, dtype=np.int64),
+                                     _matrix(durations, shape), _matrix(energies, shape),
+                                     np.frombuffer(eligible, dtype=bool).reshape(shape),
+                                     machines)
+
+
+def _store(buffer: array, cell: int, text: str) -> array:
+    '''
+    Stores the value in the buffer, which is converted to floats
+    the first time a non-integral value is read.
+    '''
+    try:
+        buffer[cell] = int(text)
+    except (ValueError, TypeError):
+        if buffer.typecode != 'd':
+            buffer = array('d', buffer)
+        buffer[cell] = float(text)
+    return buffer
+
+
+def _matrix(buffer: array, shape: Tuple[int, int]) -> np.ndarray:
+    dtype = np.float64 if buffer.typecode == 'd' else np.int64
+    return np.frombuffer(buffer, dtype=dtype).reshape(shape)
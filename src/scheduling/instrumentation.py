@@ -0,0 +1,143 @@
+'''
+Opt-in instrumentation of the hot paths of the scheduling code.
+
+Nothing is measured by default and the instrumented functions are the
+original ones. Inside collect(), the functions of HOT_PATHS are replaced
+by wrappers counting their calls and accumulating their time (inclusive:
+the time of Solution.schedule contains that of Machine.add_operation),
+and the events signaled by count() (e.g. the accepted moves of a local
+search) are counted. The originals are put back when collect() ends.
+Only the current process is measured (not the workers of a process pool).
+
+    with collect() as stats:
+        sol = heuristic.run(instance)
+    print(stats.report())
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import functools
+import time
+
+
+class Stats(object):
+    '''
+    Numbers of calls and times (in seconds) of the instrumented functions,
+    and numbers of events, of one collection.
+    '''
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.times: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.wall_time = 0.0
+
+    def __getitem__(self, name: str) -> int:
+        '''
+        Number of calls of an instrumented function or number of events.
+        '''
+        return self.calls.get(name, 0) + self.counters.get(name, 0)
+
+    def as_dict(self) -> Dict:
+        return {'wall_time': self.wall_time, 'calls': dict(self.calls),
+                'times': dict(self.times), 'counters': dict(self.counters)}
+
+    def report(self) -> str:
+        '''
+        Table of the instrumented functions by decreasing time, then the events.
+        '''
+        lines = [f"{'function':<32}{'calls':>10}{'time (s)':>12}{'share':>8}"]
+        for name in sorted(self.calls, key=lambda n: -self.times[n]):
+            if self.calls[name]:
+                share = self.times[name] / self.wall_time if self.wall_time else 0.0
+                lines.append(f"{name:<32}{self.calls[name]:>10}{self.times[name]:>12.4f}{share:>8.1%}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<32}{value:>10}")
+        lines.append(f"{'total':<32}{'':>10}{self.wall_time:>12.4f}")
+        return '\n'.join(lines)
+
+
+# (nom, module ou classe, attribut) des fonctions mesurées, voir add_hot_path
+HOT_PATHS: List[Tuple[str, object, str]] = []
+
+# Collecte en cours
+_active: Optional[Stats] = None
+
+
+def add_hot_path(name: str, owner, attribute: str):
+    '''
+    Adds a function (or property, or static method) of a module or class
+    to the functions measured by collect(). The attribute is replaced on its
+    owner: a module function is only measured when it is called through the
+    module, not through a name imported from it before the collection
+    (see neighborhoods.evaluate_neighbor).
+    '''
+    HOT_PATHS.append((name, owner, attribute))
+
+
+def count(name: str, value: int = 1):
+    '''
+    Counts an event (does nothing outside of collect()).
+    '''
+    if _active is not None:
+        _active.counters[name] = _active.counters.get(name, 0) + value
+
+
+def is_active() -> bool:
+    return _active is not None
+
+
+def _timed(name: str, function, stats: Stats):
+    calls = stats.calls
+    times = stats.times
+    calls[name] = 0
+    times[name] = 0.0
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            times[name] += time.perf_counter() - start
+            calls[name] += 1
+    return wrapper
+
+
+def _wrap(name: str, original, stats: Stats):
+    if isinstance(original, property):
+        return property(_timed(name, original.fget, stats), original.fset, original.fdel, original.__doc__)
+    if isinstance(original, staticmethod):
+        return staticmethod(_timed(name, original.__func__, stats))
+    if isinstance(original, classmethod):
+        return classmethod(_timed(name, original.__func__, stats))
+    return _timed(name, original, stats)
+
+
+@contextmanager
+def collect() -> Iterator[Stats]:
+    '''
+    Measures the hot paths during the with block.
+    @raise RuntimeError: if a collection is already in progress
+    '''
+    global _active
+    if _active is not None:
+        raise RuntimeError("Instrumentation is already collecting")
+    stats = Stats()
+    originals = []
+    try:
+        for name, owner, attribute in HOT_PATHS:
+            original = vars(owner)[attribute]
+            originals.append((owner, attribute, original))
+            setattr(owner, attribute, _wrap(name, original, stats))
+        _active = stats
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.wall_time = time.perf_counter() - start
+    finally:
+        _active = None
+        for owner, attribute, original in reversed(originals):
+            setattr(owner, attribute, original)
@@ -0,0 +1,332 @@
+'''
+Benchmark of the heuristics on a corpus of instances (question 4 of the README):
+runs a set of heuristics on every instance of a data folder, records
+for each run the wall time, CPU time, peak memory, number of evaluations
+per second and the values of the solution, writes the results as JSON or CSV
+and compares them to a stored baseline.
+
+    python -m src.scheduling.optim.benchmark --heuristics greedy best_ls --json results.json
+    python -m src.scheduling.optim.benchmark --baseline results.json
+    python -m src.scheduling.optim.benchmark --neighborhood-sizes
+
+An evaluation is a complete schedule (a call to Solution.stop_machines):
+a constructive run counts one, a local search one per explored neighbor.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.catalog import InstanceCatalog
+from src.scheduling.solution import Solution
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.optim.local_search import FirstNeighborLocalSearch, BestNeighborLocalSearch, \
+    SimulatedAnnealing
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2, CriticalReassignment, \
+    CriticalBlockMoves
+from src.scheduling.optim.tabu_search import TabuSearch
+from src.scheduling.optim.multi_start import run_seed
+
+
+class BenchmarkedHeuristic(object):
+    '''
+    A heuristic of the benchmark: HeuristicClass(params).run(instance, *run_args, params).
+    A deterministic heuristic is run once per instance, whatever the number of runs.
+    '''
+
+    def __init__(self, HeuristicClass, run_args: tuple=(), params: Dict=dict(), deterministic: bool=False):
+        self.HeuristicClass = HeuristicClass
+        self.run_args = tuple(run_args)
+        self.params = dict(params)
+        self.deterministic = deterministic
+
+
+HEURISTICS: Dict[str, BenchmarkedHeuristic] = {}
+
+
+def register(name: str, HeuristicClass, run_args: tuple=(), params: Dict=dict(), deterministic: bool=False):
+    '''
+    Adds a heuristic to the benchmark (the class and the arguments must be picklable
+    to be run in parallel).
+    '''
+    HEURISTICS[name] = BenchmarkedHeuristic(HeuristicClass, run_args, params, deterministic)
+
+
+register('greedy', Greedy, deterministic=True)
+register('nondeterminist', NonDeterminist)
+register('first_ls', FirstNeighborLocalSearch, (NonDeterminist, MyNeighborhood1))
+register('best_ls', BestNeighborLocalSearch, (NonDeterminist, [MyNeighborhood1, MyNeighborhood2]))
+register('tabu', TabuSearch, (NonDeterminist, [MyNeighborhood1, MyNeighborhood2]))
+register('annealing', SimulatedAnnealing, (NonDeterminist, [MyNeighborhood1, MyNeighborhood2]))
+register('critical_ls', BestNeighborLocalSearch, (NonDeterminist, [CriticalReassignment, CriticalBlockMoves]))
+
+
+# Voisinages dont la taille est comparée à celle des voisinages complets
+# (le voisinage critique de chacun vient après lui)
+NEIGHBORHOODS = {'reassignment': (MyNeighborhood1, CriticalReassignment),
+                 'resequencing': (MyNeighborhood2, CriticalBlockMoves)}
+
+
+# Colonnes des résultats, dans l'ordre des fichiers CSV
+FIELDS = ('instance', 'heuristic', 'run', 'seed', 'wall_time', 'cpu_time', 'peak_memory',
+          'evaluations', 'evaluations_per_second', 'evaluate', 'objective', 'cmax', 'sum_ci',
+          'energy', 'nb_violations', 'feasible')
+_INT_FIELDS = ('run', 'seed', 'peak_memory', 'evaluations', 'evaluate', 'objective', 'cmax',
+               'sum_ci', 'energy', 'nb_violations')
+_FLOAT_FIELDS = ('wall_time', 'cpu_time', 'evaluations_per_second')
+
+
+def run_one(instance: Instance, name: str, run: int, seed: int, memory: bool=True,
+            heuristic: Optional[BenchmarkedHeuristic]=None) -> Dict:
+    '''
+    Runs a heuristic once and returns its record.
+    @param memory: measure the peak memory with tracemalloc (slows the run down)
+    '''
+    heuristic = heuristic or HEURISTICS[name]
+    params = {**heuristic.params, 'seed': seed}
+    completed = Solution.nb_completed
+    if memory:
+        tracemalloc.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        sol = heuristic.HeuristicClass(params).run(instance, *heuristic.run_args, params)
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+        peak_memory = tracemalloc.get_traced_memory()[1] if memory else 0
+    finally:
+        if memory:
+            tracemalloc.stop()
+    evaluations = Solution.nb_completed - completed
+    return {'instance': instance.name, 'heuristic': name, 'run': run, 'seed': seed,
+            'wall_time': wall_time, 'cpu_time': cpu_time, 'peak_memory': peak_memory,
+            'evaluations': evaluations,
+            'evaluations_per_second': evaluations / wall_time if wall_time > 0 else 0.0,
+            'evaluate': sol.evaluate, 'objective': sol.objective, 'cmax': sol.cmax,
+            'sum_ci': sol.sum_ci, 'energy': sol.total_energy_consumption,
+            'nb_violations': sol.nb_violations, 'feasible': sol.is_feasible}
+
+
+def _run_task(task) -> Dict:
+    folder, use_cache, name, run, seed, memory, heuristic = task
+    return run_one(Instance.from_file(folder, use_cache), name, run, seed, memory, heuristic)
+
+
+def run_benchmark(data_folder: str, heuristics: Optional[List[str]]=None,
+                  instances: Optional[List[str]]=None, params: Dict=dict()) -> List[Dict]:
+    '''
+    Runs the heuristics on the instances of the data folder.
+    @param heuristics: names of registered heuristics, all of them if None
+    @param instances: names of the instances, all those of the folder if None
+    @param params: parameters of the benchmark:
+           - runs: number of runs of the non deterministic heuristics (1 by default)
+           - seed: master seed, run r of every heuristic uses its r-th seed (0 by default)
+           - workers: number of processes (1 by default: the runs compete for the
+             CPUs in parallel, so that times are less precise)
+           - memory: measure the peak memory (True by default)
+           - use_cache: use the binary cache of the instances (True by default, see Instance.from_file)
+    @return: the records of the runs, by instance, heuristic and run
+    '''
+    use_cache = params.get('use_cache', True)
+    catalog = InstanceCatalog(data_folder, use_cache)
+    names = list(HEURISTICS) if heuristics is None else list(heuristics)
+    instances = catalog.names if instances is None else list(instances)
+    runs = params.get('runs', 1)
+    seed = params.get('seed', 0)
+    workers = params.get('workers', 1)
+    memory = params.get('memory', True)
+    runs_of = [(instance, name, run) for instance in instances for name in names
+               for run in range(1 if HEURISTICS[name].deterministic else runs)]
+    if workers == 1:
+        # Les instances sont chargées une seule fois (le chargement n'est pas mesuré)
+        return [run_one(catalog[instance], name, run, run_seed(seed, run), memory)
+                for instance, name, run in runs_of]
+    tasks = [(catalog.folder(instance), use_cache, name, run, run_seed(seed, run), memory, HEURISTICS[name])
+             for instance, name, run in runs_of]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_run_task, tasks))
+
+
+def neighborhood_sizes(data_folder: str, instances: Optional[List[str]]=None, params: Dict=dict()) -> List[Dict]:
+    '''
+    Number of moves of the full and of the critical neighborhoods (see NEIGHBORHOODS)
+    of a solution of each instance.
+    @param instances: names of the instances, all those of the folder if None
+    @param params: - seed: seed of the NonDeterminist heuristic computing the solutions (0)
+           - use_cache: use the binary cache of the instances (True by default)
+    @return: one record (instance, neighborhood, full, critical) by instance and neighborhood
+    '''
+    catalog = InstanceCatalog(data_folder, params.get('use_cache', True))
+    instances = catalog.names if instances is None else list(instances)
+    seed = run_seed(params.get('seed', 0), 0)
+    records = []
+    for name in instances:
+        instance = catalog[name]
+        sol = NonDeterminist({'seed': seed}).run(instance)
+        for neighborhood, (Full, Critical) in NEIGHBORHOODS.items():
+            records.append({'instance': name, 'neighborhood': neighborhood,
+                            'full': sum(1 for _ in Full(instance).moves(sol)),
+                            'critical': sum(1 for _ in Critical(instance).moves(sol))})
+    return records
+
+
+def write_json(records: List[Dict], path: str):
+    with open(path, 'w') as file:
+        json.dump(records, file, indent=1)
+
+
+def write_csv(records: List[Dict], path: str):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def read_results(path: str) -> List[Dict]:
+    '''
+    Reads results written by write_json or write_csv (according to the extension).
+    '''
+    if not path.endswith('.csv'):
+        with open(path, 'r') as file:
+            return json.load(file)
+    records = []
+    with open(path, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            for field in _INT_FIELDS:
+                row[field] = int(row[field])
+            for field in _FLOAT_FIELDS:
+                row[field] = float(row[field])
+            row['feasible'] = row['feasible'] == 'True'
+            records.append(row)
+    return records
+
+
+class Regression(object):
+    '''
+    A value of a run worse than that of the same run in the baseline.
+    '''
+
+    def __init__(self, instance: str, heuristic: str, run: int, metric: str, baseline, value):
+        self.instance = instance
+        self.heuristic = heuristic
+        self.run = run
+        self.metric = metric
+        self.baseline = baseline
+        self.value = value
+
+    def __str__(self) -> str:
+        return f"{self.instance} {self.heuristic} run {self.run}: {self.metric} {self.baseline} -> {self.value}"
+
+
+def compare(records: List[Dict], baseline: List[Dict], params: Dict=dict()) -> List[Regression]:
+    '''
+    Compares the runs to those of the baseline with the same instance, heuristic and run.
+    A run regresses if it becomes infeasible, if its evaluate increases or if
+    its wall time increases by more than the tolerance.
+    @param params: - time_tolerance: relative increase of the wall time allowed (0.25 by default)
+                   - min_time: wall times below it are not compared, in seconds (0.05 by default)
+    '''
+    time_tolerance = params.get('time_tolerance', 0.25)
+    min_time = params.get('min_time', 0.05)
+    reference = {(r['instance'], r['heuristic'], r['run']): r for r in baseline}
+    regressions = []
+    for record in records:
+        key = (record['instance'], record['heuristic'], record['run'])
+        base = reference.get(key)
+        if base is None:
+            continue
+        if base['feasible'] and not record['feasible']:
+            regressions.append(Regression(*key, 'feasible', True, False))
+        if record['evaluate'] > base['evaluate']:
+            regressions.append(Regression(*key, 'evaluate', base['evaluate'], record['evaluate']))
+        if (max(base['wall_time'], record['wall_time']) >= min_time
+                and record['wall_time'] > base['wall_time'] * (1 + time_tolerance)):
+            regressions.append(Regression(*key, 'wall_time', round(base['wall_time'], 4),
+                                          round(record['wall_time'], 4)))
+    return regressions
+
+
+def summary(records: List[Dict]) -> List[Dict]:
+    '''
+    Totals by heuristic: number of runs and of feasible solutions, sum of the
+    best evaluate of each instance, total wall and CPU times, maximal peak memory
+    and evaluations per second.
+    '''
+    result = []
+    for name in dict.fromkeys(r['heuristic'] for r in records):
+        runs = [r for r in records if r['heuristic'] == name]
+        best: Dict[str, int] = {}
+        for r in runs:
+            best[r['instance']] = min(best.get(r['instance'], r['evaluate']), r['evaluate'])
+        wall_time = sum(r['wall_time'] for r in runs)
+        evaluations = sum(r['evaluations'] for r in runs)
+        result.append({'heuristic': name, 'runs': len(runs),
+                       'feasible': sum(r['feasible'] for r in runs),
+                       'best_evaluate': sum(best.values()),
+                       'wall_time': wall_time, 'cpu_time': sum(r['cpu_time'] for r in runs),
+                       'peak_memory': max(r['peak_memory'] for r in runs),
+                       'evaluations_per_second': evaluations / wall_time if wall_time > 0 else 0.0})
+    return result
+
+
+def main(argv: Optional[List[str]]=None) -> int:
+    '''
+    Command line entry point, returns 1 if regressions are found.
+    '''
+    from src.scheduling.tests.test_utils import DATA_FOLDER
+    parser = argparse.ArgumentParser(description="Benchmark of the heuristics on a corpus of instances")
+    parser.add_argument('--data', default=DATA_FOLDER, help="folder of the instances")
+    parser.add_argument('--heuristics', nargs='+', choices=list(HEURISTICS), help="all of them by default")
+    parser.add_argument('--instances', nargs='+', help="all the instances of the folder by default")
+    parser.add_argument('--runs', type=int, default=1, help="runs of the non deterministic heuristics")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help="do not measure the peak memory")
+    parser.add_argument('--json', help="JSON file of the results")
+    parser.add_argument('--csv', help="CSV file of the results")
+    parser.add_argument('--baseline', help="results (JSON or CSV) to compare with")
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--neighborhood-sizes', action='store_true',
+                        help="only compare the sizes of the full and critical neighborhoods")
+    args = parser.parse_args(argv)
+
+    if args.neighborhood_sizes:
+        sizes = neighborhood_sizes(args.data, args.instances, {'seed': args.seed})
+        print(f"{'neighborhood':<16}{'full':>10}{'critical':>10}{'ratio':>8}")
+        for neighborhood in NEIGHBORHOODS:
+            full = sum(r['full'] for r in sizes if r['neighborhood'] == neighborhood)
+            critical = sum(r['critical'] for r in sizes if r['neighborhood'] == neighborhood)
+            print(f"{neighborhood:<16}{full:>10}{critical:>10}{critical / max(full, 1):>8.2f}")
+        return 0
+
+    records = run_benchmark(args.data, args.heuristics, args.instances,
+                            {'runs': args.runs, 'seed': args.seed, 'workers': args.workers,
+                             'memory': not args.no_memory})
+    if args.json:
+        write_json(records, args.json)
+    if args.csv:
+        write_csv(records, args.csv)
+    print(f"{'heuristic':<16}{'runs':>6}{'feasible':>10}{'best evaluate':>15}"
+          f"{'wall (s)':>10}{'cpu (s)':>10}{'peak (kB)':>11}{'eval/s':>10}")
+    for row in summary(records):
+        print(f"{row['heuristic']:<16}{row['runs']:>6}{row['feasible']:>10}{row['best_evaluate']:>15}"
+              f"{row['wall_time']:>10.2f}{row['cpu_time']:>10.2f}{row['peak_memory'] // 1024:>11}"
+              f"{row['evaluations_per_second']:>10.0f}")
+    if args.baseline:
+        regressions = compare(records, read_results(args.baseline), {'time_tolerance': args.time_tolerance})
+        for regression in regressions:
+            print(regression)
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+'''
+Computation budget of a search: wall-clock time and number of evaluations.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Optional
+import time
+
+
+class Budget(object):
+    '''
+    Time and evaluation limits counted from the creation of the budget.
+    An evaluation is a complete schedule built by the search owning the
+    budget, which counts it (see count): the searches running in turn in
+    the same process have their own counts (Solution.nb_completed is only
+    a statistic of the process).
+    '''
+
+    def __init__(self, time_limit: Optional[float] = None, max_evaluations: Optional[int] = None):
+        '''
+        Constructor
+        @param time_limit: wall-clock limit in seconds (None: no limit)
+        @param max_evaluations: maximum number of evaluations (None: no limit)
+        '''
+        self.time_limit = time_limit
+        self.max_evaluations = max_evaluations
+        self._start = time.perf_counter()
+        self._deadline = None if time_limit is None else self._start + time_limit
+        self._evaluations = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    @property
+    def evaluations(self) -> int:
+        return self._evaluations
+
+    def count(self, evaluations: int = 1):
+        '''
+        Counts evaluations of the search.
+        '''
+        self._evaluations += evaluations
+
+    @property
+    def deadline(self) -> Optional[float]:
+        '''
+        End of the time limit as a time.time() value, which other
+        processes can compare to their own clock (None: no limit).
+        '''
+        if self._deadline is None:
+            return None
+        return time.time() + self._deadline - time.perf_counter()
+
+    def exhausted(self) -> Optional[str]:
+        '''
+        Returns the name of the exhausted limit ('time_limit' or 'max_evaluations'),
+        None if the search can go on.
+        '''
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            return 'time_limit'
+        if self.max_evaluations is not None and self.evaluations >= self.max_evaluations:
+            return 'max_evaluations'
+        return None
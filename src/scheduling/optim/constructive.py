@@ -7,13 +7,48 @@ from typing import Dict
 import random
 
 from src.scheduling.instance.instance import Instance
-from src.scheduling.solution import Solution
-from src.scheduling.optim.heuristics import Heuristic
+from src.scheduling.solution import Solution, ENERGY_WEIGHT, CMAX_WEIGHT
+from src.scheduling.optim.heuristics import Heuristic, initial_planning
+
+
+def candidates(sol: Solution):
+    '''
+    Returns the possible scheduling decisions for the available operations
+    as a list of (cost, end_time, operation, machine).
+    The cost is the increase of the objective if the operation is scheduled
+    on the machine, counting the tear down of a machine when it is started.
+    Machines on which the operation would end too late to be shut down are excluded.
+    '''
+    instance = sol.inst
+    cmax = sol.cmax
+    result = []
+    # Parcours sans tri : Greedy classe les décisions par leur coût, NonDeterminist trie sa liste restreinte
+    for operation in sol.ready_set:
+        ready_time = sol.ready_time(operation)
+        for machine_id in operation.available_machines:
+            machine = instance.get_machine(machine_id)
+            start_time = machine.operation_start_time(ready_time)
+            end_time = start_time + operation.get_duration_for_machine(machine_id)
+            if end_time + machine.tear_down_time > machine.end_time:
+                continue
+            energy = operation.get_energy_for_machine(machine_id)
+            if machine.is_running:
+                energy += machine.min_consumption * (start_time - machine.available_time)
+            else:
+                energy += machine.set_up_energy + machine.tear_down_energy
+            cost = ENERGY_WEIGHT * energy + CMAX_WEIGHT * max(0, end_time - cmax)
+            result.append((cost, end_time, operation, machine))
+    return result
 
 
 class Greedy(Heuristic):
     '''
     A deterministic greedy method to return a solution.
+    At each step, schedules the (available operation, machine) pair that
+    increases the objective the least (earliest end time to break ties).
+    The machines are stopped after their last operation.
+    If no operation can be scheduled before the end time of its machines,
+    the remaining operations are left unplanned (infeasible solution).
     '''
 
     def __init__(self, params: Dict=dict()):
@@ -21,8 +56,13 @@ class Greedy(Heuristic):
         Constructor
         @param params: The parameters of your heuristic method if any as a
                dictionary. Implementation should provide default values in the function.
+               - optimize_on_off: shut the machines down during the idle gaps where
+                 it saves energy (see Solution.optimize_on_off), False by default
+               - initial: solution to warm start from (see warm_start): its decisions
+                 that are still valid are kept and the other operations are scheduled
+                 by the heuristic
         '''
-        pass
+        self._params = dict(params)
 
     def run(self, instance: Instance, params: Dict=dict()) -> Solution:
         '''
@@ -33,13 +73,28 @@ class Greedy(Heuristic):
         @param instance: the instance to solve
         @param params: the parameters for the run
         '''
-        pass
+        params = {**self._params, **params}
+        sol = initial_planning(instance, params)
+        while True:
+            choices = candidates(sol)
+            if not choices:
+                break
+            _, _, operation, machine = min(
+                choices, key=lambda c: (c[0], c[1], c[2].operation_id, c[3].machine_id))
+            sol.schedule(operation, machine)
+        sol.stop_machines()
+        if params.get('optimize_on_off', False):
+            sol.optimize_on_off()
+        return sol
 
 
 class NonDeterminist(Heuristic):
     '''
     Heuristic that returns different values for different runs with the same parameters
     (or different values for different seeds and otherwise same parameters)
+    Randomized greedy (GRASP-like): at each step, the decision is drawn uniformly
+    among the candidates whose cost is within rcl_ratio of the best one
+    (restricted candidate list).
     '''
 
     def __init__(self, params: Dict=dict()):
@@ -47,8 +102,15 @@ class NonDeterminist(Heuristic):
         Constructor
         @param params: The parameters of your heuristic method if any as a
                dictionary. Implementation should provide default values in the function.
+               - seed: seed of the random generator (None: different at each run)
+               - rcl_ratio: width of the restricted candidate list, in [0, 1]
+               - optimize_on_off: shut the machines down during the idle gaps where
+                 it saves energy (see Solution.optimize_on_off), False by default
+               - initial: solution to warm start from (see warm_start): its decisions
+                 that are still valid are kept and the other operations are scheduled
+                 by the heuristic
         '''
-        raise "Not implemented error"
+        self._params = dict(params)
 
     def run(self, instance: Instance, params: Dict=dict()) -> Solution:
         '''
@@ -59,7 +121,28 @@ class NonDeterminist(Heuristic):
         @param instance: the instance to solve
         @param params: the parameters for the run
         '''
-        raise "Not implemented error"
+        params = {**self._params, **params}
+        rng = random.Random(params.get('seed'))
+        rcl_ratio = params.get('rcl_ratio', 0.3)
+        sol = initial_planning(instance, params)
+        while True:
+            choices = candidates(sol)
+            if not choices:
+                break
+            best = min(c[0] for c in choices)
+            worst = max(c[0] for c in choices)
+            threshold = best + rcl_ratio * (worst - best)
+            restricted = [c for c in choices if c[0] <= threshold]
+            # Tirage dans l'ordre des clés du ReadySet (seule la liste restreinte est triée) :
+            # une graine donne la même solution quel que soit l'ordre de parcours des candidats
+            ready = sol.ready_set
+            restricted.sort(key=lambda c: (ready.key(c[2]), c[2].index))
+            _, _, operation, machine = rng.choice(restricted)
+            sol.schedule(operation, machine)
+        sol.stop_machines()
+        if params.get('optimize_on_off', False):
+            sol.optimize_on_off()
+        return sol
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+'''
+Memo of the values of evaluated schedules, shared by the searches that
+revisit the same schedules (local searches, tabu search, multi-start).
+
+A schedule built by Solution.schedule (then Solution.stop_machines) only
+depends on the data of the instance, the machine of each operation and the
+order of the operations of each machine: its fingerprint is the digest of the
+data and these sequences (see fingerprint), and
+its values are stored in an EvaluationCache with LRU eviction.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, List, Optional, Tuple
+from array import array
+from collections import OrderedDict
+import sys
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.machine import Machine
+from src.scheduling.instance.operation import Operation
+from src.scheduling.solution import Solution, ENERGY_WEIGHT, CMAX_WEIGHT, INFEASIBILITY_PENALTY
+
+
+class Evaluation(object):
+    '''
+    Values of a complete schedule: evaluate, objective and its components.
+    '''
+
+    def __init__(self, evaluate: int, objective: int, cmax: int, sum_ci: int, energy: int):
+        self.evaluate = evaluate
+        self.objective = objective
+        self.cmax = cmax
+        self.sum_ci = sum_ci
+        self.energy = energy
+
+    @classmethod
+    def of(cls, sol: Solution) -> 'Evaluation':
+        '''
+        Values of the solution (each component is computed once).
+        '''
+        cmax, sum_ci, energy = sol.cmax, sol.sum_ci, sol.total_energy_consumption
+        objective = ENERGY_WEIGHT * energy + CMAX_WEIGHT * cmax
+        return cls(objective + INFEASIBILITY_PENALTY * sol.nb_violations, objective, cmax, sum_ci, energy)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Evaluation) and self.as_tuple() == other.as_tuple()
+
+    def as_tuple(self) -> Tuple[int, int, int, int, int]:
+        return self.evaluate, self.objective, self.cmax, self.sum_ci, self.energy
+
+    def __repr__(self) -> str:
+        return (f"Evaluation(evaluate={self.evaluate}, objective={self.objective}, cmax={self.cmax}, "
+                f"sum_ci={self.sum_ci}, energy={self.energy})")
+
+
+# Valeur de lookup pour une empreinte absente (None : planning qui ne peut pas être construit)
+MISSING = object()
+
+# Place d'une entrée en plus de son empreinte : entrée du dictionnaire, Evaluation et ses entiers
+_ENTRY_OVERHEAD = 400
+
+
+class EvaluationCache(object):
+    '''
+    Bounded memo fingerprint -> Evaluation (None if the schedule cannot be
+    built), evicting the least recently used entries when the number of
+    entries or their estimated size in bytes exceeds its limit.
+    Counts the hits, misses and evictions.
+    '''
+
+    def __init__(self, max_entries: Optional[int] = 100000, max_bytes: Optional[int] = None):
+        '''
+        Constructor
+        @param max_entries: maximum number of entries (None: no limit)
+        @param max_bytes: maximum estimated size of the entries in bytes (None: no limit)
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(instance: Instance, decisions: List[Tuple[Operation, Machine]]) -> bytes:
+        '''
+        Returns the fingerprint of the schedule given by the scheduling decisions
+        (see Solution.dispatch): the digest of the data of the instance (see
+        InstanceArrays.digest, an instance modified under the same name has another
+        one) and the dense indices of the operations of each machine, in processing order.
+        '''
+        sequences = [[] for _ in instance.machines]
+        for operation, machine in decisions:
+            sequences[machine.index].append(operation.index)
+        codes = array('i')
+        for sequence in sequences:
+            codes.extend(sequence)
+            codes.append(-1)
+        return instance.arrays.digest + codes.tobytes()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._entries
+
+    def lookup(self, key: bytes):
+        '''
+        Returns the Evaluation stored for the fingerprint (None for a schedule that
+        cannot be built), MISSING if there is none.
+        '''
+        entries = self._entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        return MISSING
+
+    def store(self, key: bytes, evaluation: Optional[Evaluation]):
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+            entries[key] = evaluation
+            return
+        entries[key] = evaluation
+        self.nbytes += sys.getsizeof(key) + _ENTRY_OVERHEAD
+        while entries and ((self.max_entries is not None and len(entries) > self.max_entries)
+                           or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            old, _ = entries.popitem(last=False)
+            self.nbytes -= sys.getsizeof(old) + _ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def evaluation(self, sol: Solution) -> Evaluation:
+        '''
+        Returns the values of a complete solution, computed only if its
+        schedule is not in the cache.
+        '''
+        key = self.fingerprint(sol.inst, sol.dispatch)
+        evaluation = self.lookup(key)
+        if evaluation is MISSING:
+            evaluation = Evaluation.of(sol)
+            self.store(key, evaluation)
+        return evaluation
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        return {'entries': len(self._entries), 'bytes': self.nbytes, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions, 'hit_rate': self.hit_rate}
+
+    def clear(self):
+        '''
+        Removes the entries and resets the statistics.
+        '''
+        self._entries.clear()
+        self.nbytes = self.hits = self.misses = self.evictions = 0
+
+
+_shared_cache: Optional[EvaluationCache] = None
+
+
+def shared_cache() -> EvaluationCache:
+    '''
+    Returns the cache of the process shared by the heuristics run with {'cache': True}.
+    '''
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = EvaluationCache()
+    return _shared_cache
+
+
+def cache_from_params(params: Dict) -> Optional[EvaluationCache]:
+    '''
+    Returns the cache given by the parameter cache of a heuristic or a neighborhood:
+    an EvaluationCache, True for the shared cache (see shared_cache), None or False for none.
+    '''
+    cache = params.get('cache')
+    if cache is True:
+        return shared_cache()
+    # Un cache vide est faux (__len__) : tester son type
+    return cache if isinstance(cache, EvaluationCache) else None
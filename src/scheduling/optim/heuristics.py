@@ -3,10 +3,79 @@ Mother class for heuristics.
 
 @author: Vassilissa Lehoux
 '''
-from typing import Dict
+from typing import Dict, List, Tuple, Union
 
 from src.scheduling.instance.instance import Instance
 from src.scheduling.solution import Solution
+from src.scheduling.encoding import SolutionCode
+from src.scheduling import instrumentation
+
+
+# Solution initiale d'une exécution (paramètre initial) : une solution, éventuellement
+# d'une autre version de l'instance, un code ou des décisions (operation_id, machine_id)
+InitialSolution = Union[Solution, SolutionCode, List[Tuple[int, int]]]
+
+
+def initial_decisions(instance: Instance, initial: InitialSolution) -> List[Tuple[int, int]]:
+    '''
+    Returns the scheduling decisions of an initial solution as (operation_id, machine_id)
+    in a valid dispatch order. The operations and machines of a Solution are matched
+    by id, so that it can come from a previous version of the instance (e.g. read with
+    from_csv); the dense indices of a SolutionCode must be those of the instance.
+    @raise ValueError: if a code does not have the dimensions of the instance
+    '''
+    if isinstance(initial, Solution):
+        return [(operation.operation_id, machine.machine_id) for operation, machine in initial.dispatch]
+    if isinstance(initial, SolutionCode):
+        arrays = instance.arrays
+        if initial.nb_operations != arrays.nb_operations or initial.nb_machines != arrays.nb_machines:
+            raise ValueError(f"Code of {initial.instance_name} does not match instance {instance.name}, "
+                             "decode it with its instance")
+        order = Solution.dispatch_order(instance, initial)
+        return list(zip(arrays.operation_ids[order].tolist(),
+                        arrays.machine_ids[initial.machines[order]].tolist()))
+    return [(int(operation_id), int(machine_id)) for operation_id, machine_id in initial]
+
+
+def warm_start(instance: Instance, initial: InitialSolution) -> Solution:
+    '''
+    Returns a partial solution of the instance keeping the decisions of the
+    initial solution that are still valid, in their order: the decisions on
+    operations or machines that no longer exist or are no longer eligible
+    are dropped, and so are those that would end too late for their machine
+    (its end time may have been tightened), the following operations of their
+    job being left to the heuristic. The machines are not stopped.
+    '''
+    sol = Solution(instance)
+    arrays = instance.arrays
+    operations, machines = instance.operations, instance.machines
+    operation_index, machine_index = arrays.operation_index, arrays.machine_index
+    pending = {}
+    for operation_id, machine_id in initial_decisions(instance, initial):
+        if operation_id not in operation_index or machine_id not in machine_index:
+            continue
+        operation = operations[operation_index[operation_id]]
+        if machine_id not in operation.available_machines:
+            continue
+        pending[operation_id] = machines[machine_index[machine_id]]
+        # Une décision dont l'opération attend un prédécesseur est prise après lui
+        while operation is not None and operation.operation_id in pending and operation in sol.ready_set:
+            try:
+                sol.schedule(operation, pending.pop(operation.operation_id))
+            except ValueError:
+                break
+            job = instance.get_job(operation.job_id)
+            operation = None if job.planned else job.next_operation
+    return sol
+
+
+def initial_planning(instance: Instance, params: Dict) -> Solution:
+    '''
+    Returns the planning a heuristic starts from: empty, or the warm start
+    of the initial solution given by the parameter initial (see warm_start).
+    '''
+    initial = params.get('initial')
+    return Solution(instance) if initial is None else warm_start(instance, initial)
 
 
 class Heuristic(object):
@@ -19,6 +88,8 @@ class Heuristic(object):
         Constructor
         @param params: The parameters of your heuristic method if any as a
                dictionary. Implementation should provide default values in the function.
+               Every heuristic accepts the parameter initial: a previous solution
+               (see InitialSolution) to warm start from instead of an empty planning.
         '''
         raise "Not Implemented Error"
 
@@ -31,4 +102,14 @@ class Heuristic(object):
         @param params: the parameters for the run
         '''
         raise "Not Implemented Error"
-        
+
+    def run_instrumented(self, instance: Instance, *args,
+                         params: Dict=dict()) -> Tuple[Solution, instrumentation.Stats]:
+        '''
+        Runs the heuristic (with the additional arguments of its run method if any)
+        and returns the solution with the statistics of the run: calls and times
+        of the hot paths and events such as the accepted moves (see the instrumentation module).
+        '''
+        with instrumentation.collect() as stats:
+            sol = self.run(instance, *args, params)
+        return sol, stats
@@ -4,24 +4,67 @@ then improve it.
 
 @author: Vassilissa Lehoux
 '''
-from typing import Dict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from bisect import bisect_left, insort
+import math
+import random
 
 from src.scheduling.optim.heuristics import Heuristic
 from src.scheduling.instance.instance import Instance
-from src.scheduling.solution import Solution
+from src.scheduling.solution import Solution, ENERGY_WEIGHT, CMAX_WEIGHT
+from src.scheduling.encoding import SolutionCode
+from src.scheduling import instrumentation
 from src.scheduling.optim.constructive import NonDeterminist
-from src.scheduling.optim.neighborhoods import MyNeighborhood1
+from src.scheduling.optim.budget import Budget
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2, Neighborhood, EnergyDelta
 
 
-class FirstNeighborLocalSearch(Heuristic):
+def initial_solution(instance: Instance, InitClass, params: Dict) -> Solution:
     '''
-    Vanilla local search will first create a solution,
-    then at each step try and improve it by looking at
-    solutions in its neighborhood.
-    The first solution found that improves over the current solution
-    replaces it.
-    The algorithm stops when no solution is better than the current solution
-    in its neighborhood.
+    Computes the initial solution of a local search with the InitClass heuristic.
+    '''
+    return InitClass(params).run(instance, params)
+
+
+def neighborhoods(instance: Instance, NeighborClass, params: Dict) -> List[Neighborhood]:
+    '''
+    Builds the neighborhoods of a local search: NeighborClass is
+    a neighborhood class or a list of neighborhood classes.
+    '''
+    classes = NeighborClass if isinstance(NeighborClass, (list, tuple)) else [NeighborClass]
+    return [Class(instance, params) for Class in classes]
+
+
+class Progress(object):
+    '''
+    State of a local search when its incumbent improves: elapsed time (s),
+    number of evaluations and of accepted moves since the start of the run,
+    value (evaluate) of the incumbent and incumbent (None for the simulated
+    annealing, whose incumbent is only built on demand).
+    '''
+
+    def __init__(self, time: float, evaluations: int, iterations: int, value: int, solution: Solution):
+        self.time = time
+        self.evaluations = evaluations
+        self.iterations = iterations
+        self.value = value
+        self.solution = solution
+
+    def __repr__(self) -> str:
+        return (f"Progress(time={self.time:.3f}s, evaluations={self.evaluations}, "
+                f"iterations={self.iterations}, value={self.value})")
+
+
+class LocalSearch(Heuristic):
+    '''
+    Anytime local search: the current solution is replaced by an improving
+    neighbor given by step() until there is none or a limit is reached.
+    The incumbent (best solution so far) is available at any moment in the
+    attribute incumbent, and the search can be followed, and cut, with a
+    callback or by iterating over iterate().
+    After a run, stopped gives the reason why it stopped ('local_optimum',
+    'max_iterations', 'time_limit', 'max_evaluations' or 'callback') and
+    trace the (time, evaluations, value) of each improvement.
     '''
 
     def __init__(self, params: Dict=dict()):
@@ -29,24 +72,148 @@ class FirstNeighborLocalSearch(Heuristic):
         Constructor
         @param params: The parameters of your heuristic method if any as a
                dictionary. Implementation should provide default values in the function.
+               - max_iterations: maximum number of improving moves (None: no limit)
+               - time_limit: wall-clock limit of the run in seconds (None: no limit)
+               - max_evaluations: maximum number of evaluated solutions (None: no limit)
+               - callback: function called with the Progress of each improvement
+                 (and of the initial solution), the run stops if it returns True
+               - order: order in which the moves of the neighborhoods are explored
+                 (see MoveNeighborhood)
+               - initial: solution to warm start from, repaired and completed by the
+                 initial heuristic (see warm_start)
+               - optimize_on_off: at the end, shut the machines of the incumbent down during
+                 the idle gaps where it saves energy (see Solution.optimize_on_off), False
+                 by default. The neighbors are evaluated without it: the initial solution
+                 is built without it too, so that it is compared to them on equal terms
+        '''
+        self._params = dict(params)
+        self.incumbent: Optional[Solution] = None
+        self.stopped: Optional[str] = None
+        self.trace: List[Tuple[float, int, int]] = []
+        self._budget: Optional[Budget] = None
+
+    def step(self, sol: Solution, value: int, explored: List[Neighborhood]) -> Optional[Solution]:
+        '''
+        Returns a neighbor better than the solution of value value, None if there is none.
         '''
-        raise "Not implemented error"
+        raise NotImplementedError
+
+    def iterate(self, instance: Instance, InitClass, NeighborClass, params: Dict=dict()) -> Iterator[Progress]:
+        '''
+        Runs the local search, yielding the Progress of the initial solution and
+        of each improvement. Stopping the iteration stops the search.
+        Same parameters as run (except callback).
+        '''
+        params = {**self._params, **params}
+        search = self._iterate(instance, InitClass, NeighborClass, {**params, 'optimize_on_off': False})
+        if not params.get('optimize_on_off', False):
+            yield from search
+            return
+        last = None
+        try:
+            for last in search:
+                yield last
+        finally:
+            # Aussi quand la recherche est interrompue (callback)
+            search.close()
+            progress = self._optimize_on_off(last)
+        if progress is not None:
+            yield progress
+
+    def _optimize_on_off(self, last: Optional[Progress]) -> Optional[Progress]:
+        '''
+        Applies optimize_on_off to the incumbent and keeps the result if it is better.
+        Returns its Progress, None if the incumbent is unchanged.
+        '''
+        incumbent = self.incumbent
+        if last is None or incumbent is None or not incumbent.is_feasible:
+            return None
+        optimized = incumbent.clone()
+        optimized.optimize_on_off()
+        value = optimized.evaluate
+        if value >= incumbent.evaluate:
+            return None
+        self.incumbent = optimized
+        progress = Progress(self._budget.elapsed, last.evaluations, last.iterations, value, optimized)
+        self.trace.append((progress.time, progress.evaluations, value))
+        return progress
+
+    def _iterate(self, instance: Instance, InitClass, NeighborClass, params: Dict) -> Iterator[Progress]:
+        '''
+        Search of iterate, without the optimize_on_off post-pass.
+        '''
+        max_iterations = params.get('max_iterations')
+        budget = Budget(params.get('time_limit'), params.get('max_evaluations'))
+        self._budget = budget
+        self.stopped = None
+        self.trace = []
+        sol = initial_solution(instance, InitClass, params)
+        budget.count()
+        explored = neighborhoods(instance, NeighborClass, {**params, 'budget': budget})
+        value = sol.evaluate
+        iterations = 0
+        while True:
+            self.incumbent = sol
+            progress = Progress(budget.elapsed, budget.evaluations, iterations, value, sol)
+            self.trace.append((progress.time, progress.evaluations, value))
+            yield progress
+            if max_iterations is not None and iterations >= max_iterations:
+                self.stopped = 'max_iterations'
+                return
+            self.stopped = budget.exhausted()
+            if self.stopped:
+                return
+            neighbor = self.step(sol, value, explored)
+            if neighbor is None:
+                # Un voisinage interrompu par le budget n'est pas un optimum local
+                self.stopped = budget.exhausted() or 'local_optimum'
+                return
+            sol, value = neighbor, neighbor.evaluate
+            iterations += 1
+            instrumentation.count('accepted_moves')
 
     def run(self, instance: Instance, InitClass, NeighborClass, params: Dict=dict()) -> Solution:
         '''
-        Compute a solution for the given instance.
+        Computes a solution for the given instance.
         Implementation should provide default values in the function
         (the function will be evaluated with an empty dictionary).
 
         @param instance: the instance to solve
         @param InitClass: the class for the heuristic computing the initialization
         @param NeighborClass: the class of neighborhood used in the vanilla local search
+               (or a list of classes)
         @param params: the parameters for the run
         '''
-        raise "Not implemented error"
+        callback = {**self._params, **params}.get('callback')
+        search = self.iterate(instance, InitClass, NeighborClass, params)
+        for progress in search:
+            if callback is not None and callback(progress):
+                search.close()
+                self.stopped = 'callback'
+        return self.incumbent
+
 
+class FirstNeighborLocalSearch(LocalSearch):
+    '''
+    Vanilla local search will first create a solution,
+    then at each step try and improve it by looking at
+    solutions in its neighborhood.
+    The first solution found that improves over the current solution
+    replaces it.
+    The algorithm stops when no solution is better than the current solution
+    in its neighborhood, or when a limit is reached (see LocalSearch).
+    With several neighborhoods, they are explored in turn.
+    '''
+
+    def step(self, sol: Solution, value: int, explored: List[Neighborhood]) -> Optional[Solution]:
+        for neighborhood in explored:
+            neighbor = neighborhood.first_better_neighbor(sol)
+            if neighbor is not sol and neighbor.evaluate < value:
+                return neighbor
+        return None
 
-class BestNeighborLocalSearch(Heuristic):
+
+class BestNeighborLocalSearch(LocalSearch):
     '''
     Vanilla local search will first create a solution,
     then at each step try and improve it by looking at
@@ -54,7 +221,12 @@ class BestNeighborLocalSearch(Heuristic):
     The best solution found that improves over the current solution
     replaces it.
     The algorithm stops when no solution is better than the current solution
-    in its neighborhood.
+    in its neighborhood, or when a limit is reached (see LocalSearch).
+    With several neighborhoods, the best neighbor of each of them is computed
+    and the best one replaces the current solution.
+    With several workers, the moves of the neighborhoods are evaluated by a
+    pool of processes (see ParallelExplorer), with the same result as in one
+    process. The evaluation limit is then only checked between two steps.
     '''
 
     def __init__(self, params: Dict=dict()):
@@ -62,21 +234,305 @@ class BestNeighborLocalSearch(Heuristic):
         Constructor
         @param params: The parameters of your heuristic method if any as a
                dictionary. Implementation should provide default values in the function.
+               - workers: number of processes evaluating the neighbors (1: no pool),
+                 the neighborhoods must then provide moves(sol) (see MyNeighborhood1)
+               - max_iterations, time_limit, max_evaluations, callback: see LocalSearch
         '''
-        raise "Not implemented error"
+        super().__init__(params)
+        self._explorer = None
 
-    def run(self, instance: Instance, InitClass, NeighborClass, params: Dict=dict()) -> Solution:
+    def iterate(self, instance: Instance, InitClass, NeighborClass, params: Dict=dict()) -> Iterator[Progress]:
+        workers = {**self._params, **params}.get('workers', 1)
+        if workers <= 1:
+            yield from super().iterate(instance, InitClass, NeighborClass, params)
+            return
+        from src.scheduling.optim.parallel_neighborhoods import ParallelExplorer
+        self._explorer = ParallelExplorer(instance, NeighborClass, {**self._params, **params}, workers)
+        try:
+            yield from super().iterate(instance, InitClass, NeighborClass, params)
+        finally:
+            self._explorer.close()
+            self._explorer = None
+
+    def step(self, sol: Solution, value: int, explored: List[Neighborhood]) -> Optional[Solution]:
+        if self._explorer is not None:
+            neighbor = self._explorer.best_neighbor(sol, self._budget)
+            return None if neighbor is sol else neighbor
+        best, best_value = None, value
+        for neighborhood in explored:
+            neighbor = neighborhood.best_neighbor(sol)
+            if neighbor is not sol:
+                neighbor_value = neighbor.evaluate
+                if neighbor_value < best_value:
+                    best, best_value = neighbor, neighbor_value
+        return best
+
+
+class SimulatedAnnealing(LocalSearch):
+    '''
+    Simulated annealing on the timetable version of the moves of MyNeighborhood1
+    (an operation moved to another machine at the same start time) and
+    MyNeighborhood2 (swap of two consecutive operations of a machine),
+    see EnergyDelta. Random moves are scored by their change of the objective,
+    computed incrementally (energy with EnergyDelta, Cmax from the completion
+    times of the jobs) without building any solution: a move of change d is
+    accepted if d <= 0 or with probability exp(-d / T), and only accepted
+    moves are applied to the timetable.
+    The temperature T decreases by the cooling schedule every
+    moves_per_temperature moves and is raised again (reheating) when the
+    incumbent has not improved for reheat_after temperature steps.
+    The initial solution must be feasible and is returned unchanged otherwise.
+    The incumbent is built from its code when it is accessed (see LocalSearch
+    for the time limit, the callback and the progress, whose evaluations are
+    the evaluated moves). After a run, evaluated_moves, accepted_moves,
+    reheats and moves_per_second describe the search.
+    '''
+
+    def __init__(self, params: Dict=dict()):
         '''
-        Computes a solution for the given instance.
-        Implementation should provide default values in the function
-        (the function will be evaluated with an empty dictionary).
+        Constructor
+        @param params: The parameters of your heuristic method if any as a
+               dictionary. Implementation should provide default values in the function.
+               - seed: seed of the random generator (moves and initial solution)
+               - initial_temperature: None to accept an average degrading move
+                 with probability 1/2 at the start (default)
+               - cooling: 'geometric' (T = alpha * T, default), 'lundy_mees'
+                 (T = T / (1 + beta * T)) or a function (T0, T) -> new T
+               - alpha: geometric cooling factor (0.95)
+               - beta: Lundy and Mees factor (same first step as the geometric cooling by default)
+               - moves_per_temperature: moves between two temperature steps (100)
+               - reheat_after: temperature steps without improvement before
+                 reheating (50), None: no reheating, the search stops when T
+                 is below final_temperature
+               - reheat_ratio: temperature after reheating, relative to T0 (0.5)
+               - final_temperature: relative to T0 (1e-4)
+               - max_moves: maximum number of evaluated moves (20000, None: no limit)
+               - compact: at the end, schedule the operations of the incumbent as early
+                 as possible in the same order and keep this solution if it is better (True)
+               - time_limit, callback, optimize_on_off: see LocalSearch (the moves
+                 need machines running in one period, see EnergyDelta)
+        '''
+        super().__init__(params)
+        self._best_code: Optional[SolutionCode] = None
+        self.evaluated_moves = 0
+        self.accepted_moves = 0
+        self.reheats = 0
+        self.moves_per_second = 0.0
 
-        @param instance: the instance to solve
-        @param InitClass: the class for the heuristic computing the initialization
-        @param NeighborClass: the class of neighborhood used in the vanilla local search
-        @param params: the parameters for the run
+    @property
+    def incumbent(self) -> Optional[Solution]:
+        if self._incumbent is None and self._best_code is not None:
+            self._incumbent = Solution.decode(self._instance, self._best_code)
+        return self._incumbent
+
+    @incumbent.setter
+    def incumbent(self, sol: Optional[Solution]):
+        self._incumbent = sol
+        self._best_code = None
+
+    def _set_best(self, code: SolutionCode):
+        self._incumbent = None
+        self._best_code = code
+
+    def _iterate(self, instance: Instance, InitClass, NeighborClass, params: Dict) -> Iterator[Progress]:
+        '''
+        Runs the simulated annealing, yielding the Progress of the initial
+        solution and of each improvement of the incumbent.
+        '''
+        rng = random.Random(params.get('seed'))
+        moves_per_temperature = params.get('moves_per_temperature', 100)
+        reheat_after = params.get('reheat_after', 50)
+        max_moves = params.get('max_moves', 20000)
+        budget = Budget(params.get('time_limit'))
+        self._budget = budget
+        classes = NeighborClass if isinstance(NeighborClass, (list, tuple)) else [NeighborClass]
+        reassignments = any(issubclass(Class, MyNeighborhood1) for Class in classes)
+        swaps = any(issubclass(Class, MyNeighborhood2) for Class in classes)
+        if not reassignments and not swaps:
+            raise ValueError("Simulated annealing uses MyNeighborhood1 and/or MyNeighborhood2 moves")
+        self._instance = instance
+        self.stopped = None
+        self.trace = []
+        self.evaluated_moves = self.accepted_moves = self.reheats = 0
+
+        sol = initial_solution(instance, InitClass, params)
+        self.incumbent = sol
+        value = sol.evaluate
+        self.trace.append((budget.elapsed, 0, value))
+        yield Progress(budget.elapsed, 0, 0, value, sol)
+        if not sol.is_feasible:
+            self.stopped = 'infeasible'
+            return
+        state = _AnnealingState(sol, rng, reassignments, swaps)
+        best_value = value
+
+        temperature = params.get('initial_temperature')
+        if temperature is None:
+            temperature = state.initial_temperature(100)
+        initial_temperature = temperature
+        final_temperature = params.get('final_temperature', 1e-4) * initial_temperature
+        cooling = _cooling_schedule(params, initial_temperature)
+        steps_without_improvement = 0
+        while True:
+            if max_moves is not None and self.evaluated_moves >= max_moves:
+                self.stopped = 'max_moves'
+                break
+            if self.evaluated_moves % 64 == 0 and budget.exhausted():
+                self.stopped = budget.exhausted()
+                break
+            move = state.random_move()
+            self.evaluated_moves += 1
+            if move is not None:
+                change = move[0]
+                if change <= 0 or rng.random() < math.exp(-change / temperature):
+                    state.apply(move)
+                    value += change
+                    self.accepted_moves += 1
+                    if value < best_value:
+                        best_value = value
+                        steps_without_improvement = 0
+                        self._set_best(state.delta.encode())
+                        self.trace.append((budget.elapsed, self.evaluated_moves, value))
+                        yield Progress(budget.elapsed, self.evaluated_moves, self.accepted_moves, value, None)
+            if self.evaluated_moves % moves_per_temperature == 0:
+                temperature = cooling(initial_temperature, temperature)
+                steps_without_improvement += 1
+                if reheat_after is not None and steps_without_improvement >= reheat_after:
+                    temperature = params.get('reheat_ratio', 0.5) * initial_temperature
+                    steps_without_improvement = 0
+                    self.reheats += 1
+                elif reheat_after is None and temperature < final_temperature:
+                    self.stopped = 'frozen'
+                    break
+        elapsed = budget.elapsed
+        self.moves_per_second = self.evaluated_moves / elapsed if elapsed > 0 else 0.0
+        if params.get('compact', True) and self._best_code is not None:
+            # Les mouvements gardent les dates de début : le planning au plus tôt peut être meilleur
+            compacted = _compact(instance, self._best_code)
+            if compacted is not None and compacted.evaluate < best_value:
+                self.incumbent = compacted
+                self.trace.append((budget.elapsed, self.evaluated_moves, compacted.evaluate))
+                yield Progress(budget.elapsed, self.evaluated_moves, self.accepted_moves, compacted.evaluate,
+                               compacted)
+
+
+def _compact(instance: Instance, code: SolutionCode) -> Optional[Solution]:
+    '''
+    Schedules the operations of the code as early as possible on the same machines,
+    in increasing start time, None if the schedule is infeasible.
+    '''
+    sol = Solution(instance)
+    starts = code.starts.tolist()
+    machines = code.machines.tolist()
+    try:
+        for index in sorted(range(len(starts)), key=starts.__getitem__):
+            sol.schedule(instance.operations[index], instance.machines[machines[index]])
+    except (ValueError, AssertionError):
+        return None
+    sol.stop_machines()
+    return sol
+
+
+def _cooling_schedule(params: Dict, initial_temperature: float) -> Callable[[float, float], float]:
+    cooling: Union[str, Callable] = params.get('cooling', 'geometric')
+    alpha = params.get('alpha', 0.95)
+    if callable(cooling):
+        return cooling
+    if cooling == 'geometric':
+        return lambda t0, t: alpha * t
+    if cooling == 'lundy_mees':
+        beta = params.get('beta', (1 / alpha - 1) / initial_temperature)
+        return lambda t0, t: t / (1 + beta * t)
+    raise ValueError(f"Unknown cooling schedule {cooling}")
+
+
+class _AnnealingState(object):
+    '''
+    Timetable of a simulated annealing with the completion times of the jobs,
+    to compute the change of the objective of a move in O(log n).
+    A move is (change of the objective, kind, arguments of the EnergyDelta move,
+    changes of the completion times).
+    '''
+
+    def __init__(self, sol: Solution, rng: random.Random, reassignments: bool, swaps: bool):
+        self.delta = EnergyDelta(sol)
+        self._rng = rng
+        self._instance = sol.inst
+        self._kinds = [kind for kind, used in (('reassignment', reassignments), ('swap', swaps)) if used]
+        self._completions = sorted(self.delta.record(job.operations[-1]).end_time
+                                   for job in sol.inst.jobs if job.operations)
+
+    def _cmax_change(self, changes: List[Tuple[int, int]]) -> int:
+        '''
+        Change of Cmax if the completion times change as given (old, new).
+        '''
+        removed = [old for old, _ in changes]
+        remaining = 0
+        for completion in reversed(self._completions):
+            if completion in removed:
+                removed.remove(completion)
+            else:
+                remaining = completion
+                break
+        cmax = self._completions[-1] if self._completions else 0
+        return max([remaining] + [new for _, new in changes]) - cmax
+
+    def random_move(self):
+        '''
+        Returns a random move with its change of the objective, None if the
+        drawn move is not possible.
+        '''
+        rng = self._rng
+        instance = self._instance
+        if rng.choice(self._kinds) == 'reassignment':
+            operation = rng.choice(instance.operations)
+            machine = instance.get_machine(rng.choice(operation.available_machines))
+            record = self.delta.record(operation)
+            if record is None or machine.machine_id == self.delta.machine_id(operation):
+                return None
+            energy = self.delta.reassignment(operation, machine)
+            if energy is None:
+                return None
+            changes = []
+            if not operation.successors:
+                changes.append((record.end_time,
+                                record.start_time + operation.get_duration_for_machine(machine.machine_id)))
+            return (ENERGY_WEIGHT * energy + CMAX_WEIGHT * self._cmax_change(changes),
+                    'reassignment', (operation, machine), changes)
+        machine = rng.choice(instance.machines)
+        timeline = self.delta.timeline(machine)
+        if len(timeline) < 2:
+            return None
+        position = rng.randrange(len(timeline) - 1)
+        energy = self.delta.swap(machine, position)
+        if energy is None:
+            return None
+        first, second = timeline[position], timeline[position + 1]
+        changes = []
+        if not second.operation.successors:
+            changes.append((second.end_time, first.start_time + second.duration))
+        if not first.operation.successors:
+            changes.append((first.end_time, first.start_time + second.duration + first.duration))
+        return (ENERGY_WEIGHT * energy + CMAX_WEIGHT * self._cmax_change(changes), 'swap', (machine, position), changes)
+
+    def apply(self, move):
+        _, kind, arguments, changes = move
+        if kind == 'reassignment':
+            self.delta.apply_reassignment(*arguments)
+        else:
+            self.delta.apply_swap(*arguments)
+        for old, new in changes:
+            del self._completions[bisect_left(self._completions, old)]
+            insort(self._completions, new)
+
+    def initial_temperature(self, samples: int) -> float:
+        '''
+        Temperature at which the average degrading move among random moves
+        is accepted with probability 1/2.
         '''
-        raise "Not implemented error"
+        changes = [move[0] for move in (self.random_move() for _ in range(samples))
+                   if move is not None and move[0] > 0]
+        return sum(changes) / len(changes) / math.log(2) if changes else 1.0
 
 
 if __name__ == "__main__":
@@ -85,6 +541,6 @@ if __name__ == "__main__":
     import os
     inst = Instance.from_file(TEST_FOLDER_DATA + os.path.sep + "jsp10")
     heur = FirstNeighborLocalSearch()
-    sol = heur.run(inst, NonDeterminist, MyNeighborhood1)
+    sol = heur.run(inst, NonDeterminist, [MyNeighborhood1, MyNeighborhood2])
     plt = sol.gantt("tab20")
     plt.savefig("gantt.png")
@@ -0,0 +1,266 @@
+'''
+Multi-start driver: runs a heuristic many times with different seeds,
+possibly in several processes, and keeps the best solution.
+
+The seed of each run is derived from a master seed (numpy SeedSequence),
+so that run k always gets the same seed whatever the number of processes
+and the order in which the runs end.
+The solutions are sent back by the worker processes as SolutionCode.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, List, Optional
+import multiprocessing
+import queue
+import os
+import time
+
+import numpy as np
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.solution import Solution
+from src.scheduling.encoding import SolutionCode
+from src.scheduling.optim.heuristics import Heuristic, initial_decisions
+from src.scheduling.optim.constructive import NonDeterminist
+
+
+def run_seed(master_seed: int, run: int) -> int:
+    '''
+    Returns the 64-bit seed of a run, independent of those of the other runs
+    (the run-th child of the master SeedSequence).
+    '''
+    child = np.random.SeedSequence(master_seed, spawn_key=(run,))
+    return int(child.generate_state(1, dtype=np.uint64)[0])
+
+
+class RunStats(object):
+    '''
+    Values of the solution of one run of a multi-start.
+    '''
+
+    def __init__(self, run: int, seed: int, evaluate: float, objective: float, cmax: int,
+                 energy: int, feasible: bool, duration: float):
+        self.run = run
+        self.seed = seed
+        self.evaluate = evaluate
+        self.objective = objective
+        self.cmax = cmax
+        self.energy = energy
+        self.feasible = feasible
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return (f"RunStats(run={self.run}, seed={self.seed}, evaluate={self.evaluate}, "
+                f"feasible={self.feasible}, duration={self.duration:.3f}s)")
+
+
+class MultiStartResult(object):
+    '''
+    Best solution of a multi-start, with the statistics of the completed runs
+    (by run number) and the reason why it stopped ('runs', 'time_limit' or 'target').
+    '''
+
+    def __init__(self, best: Solution, runs: List[RunStats], stopped: str, duration: float):
+        self.best = best
+        self.runs = runs
+        self.stopped = stopped
+        self.duration = duration
+
+    @property
+    def best_run(self) -> Optional[RunStats]:
+        return min(self.runs, key=lambda r: (r.evaluate, r.run)) if self.runs else None
+
+
+# Instance du processus de travail (voir _init_worker)
+_worker_instance: Optional[Instance] = None
+
+
+def _init_worker(instance_name: str, arrays):
+    global _worker_instance
+    _worker_instance = Instance.from_arrays(instance_name, arrays)
+
+
+def _run_once(instance: Instance, HeuristicClass, run_args: tuple, params: Dict, run: int, seed: int):
+    '''
+    Runs the heuristic once and returns (stats, code of the solution).
+    '''
+    params = {**params, 'seed': seed}
+    start = time.perf_counter()
+    sol = HeuristicClass(params).run(instance, *run_args, params)
+    duration = time.perf_counter() - start
+    stats = RunStats(run, seed, sol.evaluate, sol.objective, sol.cmax,
+                     sol.total_energy_consumption, sol.is_feasible, duration)
+    return stats, sol.encode()
+
+
+def _worker_run(HeuristicClass, run_args: tuple, params: Dict, run: int, seed: int):
+    return _run_once(_worker_instance, HeuristicClass, run_args, params, run, seed)
+
+
+def multi_start(instance: Instance, HeuristicClass=NonDeterminist, run_args: tuple=(),
+                params: Dict=dict()) -> MultiStartResult:
+    '''
+    Runs HeuristicClass(params).run(instance, *run_args, params) with the seed
+    of each run added to params, and keeps the solution of lowest evaluate.
+    @param instance: the instance to solve
+    @param HeuristicClass: the heuristic (any Heuristic subclass, picklable)
+    @param run_args: the additional arguments of run, e.g. (InitClass, NeighborClass)
+           for the local searches
+    @param params: the parameters of the heuristic, and of the multi-start:
+           - nb_runs: number of runs (10 by default)
+           - seed: master seed of the seeds of the runs (see run_seed, None: different at each call)
+           - workers: number of processes (number of CPUs by default,
+             1: the runs are done in the current process)
+           - time_limit: wall-clock budget in seconds (None: no limit), each run
+             gets the remaining time as its own time_limit (the local searches stop
+             by themselves), no run is started after it and the runs in progress
+             are awaited; the first runs are always started
+           - target: stops as soon as a solution has evaluate <= target (None: no target)
+           - initial: solution every run warm starts from (see warm_start)
+    '''
+    nb_runs = params.get('nb_runs', 10)
+    if nb_runs < 1:
+        raise ValueError(f"A multi-start needs at least one run, not {nb_runs}")
+    workers = params.get('workers') or os.cpu_count() or 1
+    time_limit = params.get('time_limit')
+    target = params.get('target')
+    heuristic_params = {k: v for k, v in params.items()
+                        if k not in ('nb_runs', 'seed', 'workers', 'time_limit', 'target')}
+    if heuristic_params.get('initial') is not None:
+        # Les décisions sont envoyées aux processus à la place de la solution
+        heuristic_params['initial'] = initial_decisions(instance, heuristic_params['initial'])
+    # Les graines sont calculées au lancement de chaque exécution
+    master_seed = np.random.SeedSequence(params.get('seed')).entropy
+    start = time.perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+
+    def run_params() -> Dict:
+        # Chaque exécution reçoit le temps restant comme limite
+        if deadline is None:
+            return heuristic_params
+        return {**heuristic_params, 'time_limit': max(0.0, deadline - time.perf_counter())}
+
+    runs: List[RunStats] = []
+    best_code: Optional[SolutionCode] = None
+    best_stats: Optional[RunStats] = None
+    stopped = 'runs'
+
+    def record(stats: RunStats, code: SolutionCode) -> bool:
+        '''
+        Keeps the run, returns True if the target is reached.
+        '''
+        nonlocal best_code, best_stats
+        runs.append(stats)
+        if best_stats is None or (stats.evaluate, stats.run) < (best_stats.evaluate, best_stats.run):
+            best_code, best_stats = code, stats
+        return target is not None and best_stats.evaluate <= target
+
+    if workers <= 1:
+        for run in range(nb_runs):
+            if run > 0 and deadline is not None and time.perf_counter() >= deadline:
+                stopped = 'time_limit'
+                break
+            if record(*_run_once(instance, HeuristicClass, run_args, run_params(), run,
+                                    run_seed(master_seed, run))):
+                stopped = 'target'
+                break
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(instance.name, instance.arrays))
+        # Résultats (ou exceptions) des exécutions, déposés par le thread de résultats du pool
+        results = queue.Queue()
+        # Au plus un calcul par processus en cours : rien n'est lancé après l'arrêt
+        pending = 0
+        next_run = 0
+        try:
+            while next_run < nb_runs or pending:
+                expired = deadline is not None and time.perf_counter() >= deadline
+                if expired and next_run < nb_runs and next_run > 0:
+                    stopped = 'time_limit'
+                    # Les exécutions en cours s'arrêtent d'elles-mêmes (time_limit) : elles sont attendues
+                    next_run = nb_runs
+                while next_run < nb_runs and pending < workers:
+                    pool.apply_async(_worker_run, (HeuristicClass, run_args, run_params(), next_run,
+                                                   run_seed(master_seed, next_run)),
+                                     callback=results.put, error_callback=results.put)
+                    pending += 1
+                    next_run += 1
+                if not pending:
+                    break
+                timeout = None
+                if deadline is not None and next_run < nb_runs:
+                    timeout = max(0.0, deadline - time.perf_counter())
+                try:
+                    done = [results.get(timeout=timeout)]
+                except queue.Empty:
+                    continue
+                while not results.empty():
+                    done.append(results.get())
+                pending -= len(done)
+                for result in done:
+                    if isinstance(result, BaseException):
+                        raise result
+                reached = False
+                for result in sorted(done, key=lambda r: r[0].run):
+                    reached = record(*result) or reached
+                if reached:
+                    stopped = 'target'
+                    break
+        finally:
+            if pending:
+                # Objectif atteint (ou erreur) : les exécutions en cours sont interrompues
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+
+    if stopped == 'runs' and deadline is not None and time.perf_counter() >= deadline:
+        # Exécutions arrêtées par leur limite de temps
+        stopped = 'time_limit'
+    runs.sort(key=lambda r: r.run)
+    return MultiStartResult(Solution.decode(instance, best_code), runs, stopped, time.perf_counter() - start)
+
+
+class MultiStart(Heuristic):
+    '''
+    Heuristic running another heuristic several times (see multi_start)
+    and returning the best solution. The result of the last run, with the
+    statistics of every run, is kept in the attribute result.
+    '''
+
+    def __init__(self, params: Dict=dict()):
+        '''
+        Constructor
+        @param params: The parameters of your heuristic method if any as a
+               dictionary. Implementation should provide default values in the function.
+               - heuristic: the heuristic class (NonDeterminist by default)
+               - run_args: the additional arguments of its run method
+               - and the parameters of multi_start and of the heuristic
+        '''
+        self._params = dict(params)
+        self.result: Optional[MultiStartResult] = None
+
+    def run(self, instance: Instance, params: Dict=dict()) -> Solution:
+        '''
+        Computes a solution for the given instance.
+        Implementation should provide default values in the function
+        (the function will be evaluated with an empty dictionary).
+
+        @param instance: the instance to solve
+        @param params: the parameters for the run
+        '''
+        params = {**self._params, **params}
+        HeuristicClass = params.pop('heuristic', NonDeterminist)
+        run_args = tuple(params.pop('run_args', ()))
+        self.result = multi_start(instance, HeuristicClass, run_args, params)
+        return self.result.best
+
+
+if __name__ == "__main__":
+    # Best of 20 runs of the non deterministic heuristic
+    from src.scheduling.tests.test_utils import TEST_FOLDER_DATA
+    inst = Instance.from_file(TEST_FOLDER_DATA + os.path.sep + "jsp1")
+    heur = MultiStart({'nb_runs': 20, 'seed': 0})
+    sol = heur.run(inst)
+    for stats in heur.result.runs:
+        print(stats)
+    print(sol.objective, heur.result.stopped)
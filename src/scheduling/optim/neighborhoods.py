@@ -4,10 +4,26 @@ They must derive from the Neighborhood class.
 
 @author: Vassilissa Lehoux
 '''
-from typing import Dict
+from bisect import bisect_left
+import random
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.machine import Machine, ScheduledOperation
+from src.scheduling.instance.operation import Operation
 from src.scheduling.solution import Solution
+from src.scheduling.encoding import SolutionCode
+from src.scheduling.disjunctive_graph import DisjunctiveGraph
+from src.scheduling.optim.budget import Budget
+from src.scheduling.optim.evaluation_cache import EvaluationCache, Evaluation, MISSING, cache_from_params
+from src.scheduling import instrumentation
+
+
+# Un mouvement remplace les décisions d'ordonnancement de la solution (voir Solution.dispatch)
+# à partir d'une position par une fenêtre de décisions de même longueur :
+# (position, [(opération, machine), ...])
+Move = Tuple[int, List[Tuple[Operation, Machine]]]
 
 
 class Neighborhood(object):
@@ -37,53 +53,535 @@ class Neighborhood(object):
         raise "Not implemented error"
 
 
-class MyNeighborhood1(Neighborhood):
+def _suffix(dispatch: List[Tuple[Operation, Machine]], move: Move) -> List[Tuple[Operation, Machine]]:
+    position, window = move
+    return window + dispatch[position + len(window):]
+
+
+def _evaluate(sol: Solution, dispatch: List[Tuple[Operation, Machine]], move: Move,
+              cache: Optional[EvaluationCache] = None, budget: Optional[Budget] = None) -> Optional[int]:
+    '''
+    Returns the value of the neighbor obtained by applying the move,
+    None if an operation of the neighbor cannot end before the end time of its machine.
+    The move is applied in place and undone (the solution is left unchanged).
+    With a cache, the neighbor is only scheduled if its schedule is not in the cache.
+    The built schedules are counted by the budget.
+    '''
+    if cache is not None:
+        position, window = move
+        key = cache.fingerprint(sol.inst, dispatch[:position] + window + dispatch[position + len(window):])
+        evaluation = cache.lookup(key)
+        if evaluation is not MISSING:
+            return None if evaluation is None else evaluation.evaluate
+    checkpoint = sol.checkpoint_before(move[0])
+    undone = sol.rollback(checkpoint)
+    try:
+        for operation, machine in _suffix(dispatch, move):
+            sol.schedule(operation, machine)
+        sol.stop_machines()
+        if budget is not None:
+            budget.count()
+        if cache is None:
+            return sol.evaluate
+        evaluation = Evaluation.of(sol)
+        cache.store(key, evaluation)
+        return evaluation.evaluate
+    except ValueError:
+        if cache is not None:
+            cache.store(key, None)
+        return None
+    finally:
+        sol.rollback(checkpoint)
+        sol.replay(undone)
+
+
+def _neighbor(sol: Solution, dispatch: List[Tuple[Operation, Machine]], move: Move) -> Solution:
+    neighbor = sol.clone()
+    neighbor.replan(move[0], _suffix(dispatch, move))
+    return neighbor
+
+
+def neighbor_decisions(dispatch: List[Tuple[Operation, Machine]], move: Move) -> List[Tuple[Operation, Machine]]:
+    '''
+    Returns the scheduling decisions of the neighbor from the position of the move
+    (to give to Solution.replan with this position).
+    '''
+    return _suffix(dispatch, move)
+
+
+def evaluate_neighbor(sol: Solution, dispatch: List[Tuple[Operation, Machine]], move: Move,
+                      cache: Optional[EvaluationCache] = None, budget: Optional[Budget] = None) -> Optional[int]:
+    '''
+    Returns the value of the neighbor obtained by applying the move to the solution
+    of dispatch dispatch, None if it cannot be built (the solution is left unchanged).
+    The evaluation is measured by instrumentation.collect (neighborhood.evaluate)
+    and counted by the budget, the neighbor is looked up in the cache first.
+    '''
+    # Résolu à l'appel : la version mesurée pendant instrumentation.collect
+    return _evaluate(sol, dispatch, move, cache, budget)
+
+
+def build_neighbor(sol: Solution, dispatch: List[Tuple[Operation, Machine]], move: Move) -> Solution:
+    '''
+    Returns a new solution, the neighbor obtained by applying the move
+    (measured by instrumentation.collect as neighborhood.neighbor).
+    '''
+    return _neighbor(sol, dispatch, move)
+
+
+def _first_better(sol: Solution, moves: Iterator[Move], budget: Optional[Budget] = None,
+                  cache: Optional[EvaluationCache] = None) -> Solution:
+    value = sol.evaluate
+    dispatch = sol.dispatch
+    for move in moves:
+        if budget is not None and budget.exhausted():
+            break
+        neighbor_value = _evaluate(sol, dispatch, move, cache, budget)
+        if neighbor_value is not None and neighbor_value < value:
+            return _neighbor(sol, dispatch, move)
+    return sol
+
+
+def _best(sol: Solution, moves: Iterator[Move], budget: Optional[Budget] = None,
+          cache: Optional[EvaluationCache] = None) -> Solution:
+    '''
+    Returns the best neighbor, or the best one among the neighbors evaluated
+    before the budget is exhausted.
+    '''
+    best_value = sol.evaluate
+    best_move = None
+    dispatch = sol.dispatch
+    for move in moves:
+        if budget is not None and budget.exhausted():
+            break
+        neighbor_value = _evaluate(sol, dispatch, move, cache, budget)
+        if neighbor_value is not None and neighbor_value < best_value:
+            best_value, best_move = neighbor_value, move
+    if best_move is None:
+        return sol
+    return _neighbor(sol, dispatch, best_move)
+
+
+class MoveNeighborhood(Neighborhood):
     '''
-    Give the Neighborhood a meaningful name and add here a short description.
+    Neighborhood given by a generator of moves (see Move): a move only
+    describes the scheduling decisions it changes, and the neighbor
+    solution is built only when the move is applied.
+    iter_moves gives the moves lazily in the chosen order, evaluate_move
+    and apply_move evaluate and build their neighbors, and the first better
+    and best neighbors are computed on top of them: the first better neighbor
+    stops at the first improving move, without generating the next ones in
+    the natural order. The random and most promising first orders sort all
+    the moves, but still evaluate only those they look at.
+    Subclasses implement moves(sol), the moves in their natural order.
     '''
 
     def __init__(self, instance: Instance, params: Dict=dict()):
         '''
         Constructor
+        @param params: - budget: Budget counting the evaluated neighbors and stopping the
+                         exploration when it is exhausted (the best neighbor found so far is returned)
+                       - order: order of the moves, 'natural' (order of moves(sol), by default),
+                         'random' or 'promising' (see promise)
+                       - seed: seed of the random order
+                       - cache: EvaluationCache memoizing the values of the neighbors,
+                         True for the shared one (see cache_from_params)
         '''
-        raise "Not implemented error"
+        super().__init__(instance, params)
+        self._budget = params.get('budget')
+        self._cache = cache_from_params(params)
+        self._order = params.get('order', 'natural')
+        if self._order not in ('natural', 'random', 'promising'):
+            raise ValueError(f"Unknown order of the moves: {self._order}")
+        self._rng = random.Random(params.get('seed'))
+
+    def moves(self, sol: Solution) -> Iterator[Move]:
+        '''
+        Returns the moves of the neighborhood of the solution, in their natural order.
+        '''
+        raise NotImplementedError
+
+    def promise(self, dispatch: List[Tuple[Operation, Machine]], move: Move) -> int:
+        '''
+        Estimates the change of the objective made by the move (lower is more
+        promising) from the operations it moves to another machine: change of
+        their energy and of their duration, the start times being ignored.
+        '''
+        position, window = move
+        machines = {operation.operation_id: machine for operation, machine in dispatch[position:position + len(window)]}
+        change = 0
+        for operation, machine in window:
+            old = machines[operation.operation_id]
+            if machine is not old:
+                change += (operation.get_energy_for_machine(machine.machine_id)
+                           - operation.get_energy_for_machine(old.machine_id)
+                           + operation.get_duration_for_machine(machine.machine_id)
+                           - operation.get_duration_for_machine(old.machine_id))
+        return change
+
+    def iter_moves(self, sol: Solution) -> Iterator[Move]:
+        '''
+        Returns the moves of the neighborhood of the solution in the order of the neighborhood.
+        '''
+        if self._order == 'natural':
+            return self.moves(sol)
+        moves = list(self.moves(sol))
+        if self._order == 'random':
+            self._rng.shuffle(moves)
+        else:
+            dispatch = sol.dispatch
+            moves.sort(key=lambda move: self.promise(dispatch, move))
+        return iter(moves)
+
+    def evaluate_move(self, sol: Solution, move: Move) -> Optional[int]:
+        '''
+        Returns the value (evaluate) of the neighbor given by the move, None if
+        it cannot be scheduled. The solution is left unchanged.
+        '''
+        return _evaluate(sol, sol.dispatch, move, self._cache, self._budget)
+
+    def apply_move(self, sol: Solution, move: Move) -> Solution:
+        '''
+        Returns the neighbor given by the move (a new solution).
+        '''
+        return _neighbor(sol, sol.dispatch, move)
 
     def best_neighbor(self, sol: Solution) -> Solution:
         '''
         Returns the best solution in the neighborhood of the solution.
         Can be the solution itself.
         '''
-        raise "Not implemented error"
+        return _best(sol, self.iter_moves(sol), self._budget, self._cache)
 
     def first_better_neighbor(self, sol: Solution) -> Solution:
         '''
         Returns the first solution in the neighborhood of the solution
         that improves other it and the solution itself if none is better.
         '''
-        raise "Not implemented error"
+        return _first_better(sol, self.iter_moves(sol), self._budget, self._cache)
 
 
-class MyNeighborhood2(Neighborhood):
+class MyNeighborhood1(MoveNeighborhood):
     '''
-    Give the Neighborhood a meaningful name and add here a short description.
+    Machine reassignment: a neighbor is obtained by moving one operation
+    to another of its eligible machines, the order of the scheduling
+    decisions being kept (at most n * (M - 1) neighbors).
     '''
 
-    def __init__(self, instance: Instance, params: Dict=dict()):
+    def moves(self, sol: Solution) -> Iterator[Move]:
+        for position, (operation, machine) in enumerate(sol.dispatch):
+            for machine_id in operation.available_machines:
+                if machine_id != machine.machine_id:
+                    yield position, [(operation, self._instance.get_machine(machine_id))]
+
+
+class MyNeighborhood2(MoveNeighborhood):
+    '''
+    Resequencing: a neighbor is obtained by swapping two consecutive
+    operations of a machine, when the second one does not depend on an
+    operation scheduled between them (at most n - M neighbors).
+    '''
+
+    def moves(self, sol: Solution) -> Iterator[Move]:
+        dispatch = sol.dispatch
+        positions = {operation.operation_id: position for position, (operation, _) in enumerate(dispatch)}
+        last_on_machine = {}
+        for position, (operation, machine) in enumerate(dispatch):
+            previous = last_on_machine.get(machine.machine_id)
+            last_on_machine[machine.machine_id] = position
+            if previous is None or dispatch[previous][0].job_id == operation.job_id:
+                continue
+            if any(positions.get(pred.operation_id, -1) >= previous for pred in operation.predecessors):
+                continue
+            yield previous, [dispatch[position], dispatch[previous]] + dispatch[previous + 1:position]
+
+
+def critical_blocks(sol: Solution) -> List[List[int]]:
+    '''
+    Returns the blocks of a critical path of the solution (see
+    DisjunctiveGraph.critical_path): maximal sequences of consecutive
+    operations of the path processed on the same machine, as lists of
+    positions in the dispatch of the solution.
+    There is none if an operation is not scheduled.
+    '''
+    dispatch = sol.dispatch
+    if len(dispatch) < len(sol.inst.operations):
+        return []
+    graph = DisjunctiveGraph.from_solution(sol)
+    positions = {operation.index: position for position, (operation, _) in enumerate(dispatch)}
+    blocks = []
+    previous_machine = None
+    for operation in graph.critical_path():
+        machine_id = graph.machine_of(operation)
+        if machine_id != previous_machine:
+            blocks.append([])
+            previous_machine = machine_id
+        blocks[-1].append(positions[operation.index])
+    return blocks
+
+
+class CriticalReassignment(MoveNeighborhood):
+    '''
+    Machine reassignment restricted to the operations of a critical path:
+    the moves of MyNeighborhood1 that can shorten the makespan
+    (at most |path| * (M - 1) neighbors).
+    '''
+
+    def moves(self, sol: Solution) -> Iterator[Move]:
+        dispatch = sol.dispatch
+        for block in critical_blocks(sol):
+            for position in block:
+                operation, machine = dispatch[position]
+                for machine_id in operation.available_machines:
+                    if machine_id != machine.machine_id:
+                        yield position, [(operation, self._instance.get_machine(machine_id))]
+
+
+class CriticalBlockMoves(MoveNeighborhood):
+    '''
+    Resequencing at the boundaries of the blocks of a critical path: an
+    operation of a block is moved before the first operation of the block or
+    after the last one, the other operations keeping their order (with the
+    swaps of the first two and of the last two operations). A move is kept
+    only if no operation is moved before one of its predecessors in the
+    dispatch (at most 2 * |path| neighbors).
+    '''
+
+    def moves(self, sol: Solution) -> Iterator[Move]:
+        dispatch = sol.dispatch
+        positions = {operation.operation_id: position for position, (operation, _) in enumerate(dispatch)}
+
+        def to_front(first: int, position: int) -> Optional[Move]:
+            # L'opération en position passe devant celle en first
+            operation = dispatch[position][0]
+            if any(positions[pred.operation_id] >= first for pred in operation.predecessors):
+                return None
+            return first, [dispatch[position]] + dispatch[first:position]
+
+        def to_back(position: int, last: int) -> Optional[Move]:
+            # L'opération en position passe derrière celle en last
+            operation = dispatch[position][0]
+            if any(positions[succ.operation_id] <= last for succ in operation.successors):
+                return None
+            return position, dispatch[position + 1:last + 1] + [dispatch[position]]
+
+        for block in critical_blocks(sol):
+            size = len(block)
+            if size < 2:
+                continue
+            first, last = block[0], block[-1]
+            candidates = [to_front(first, position) for position in block[1:]]
+            # Pour deux opérations, les deux déplacements sont la même permutation
+            if size > 2:
+                candidates.extend(to_back(position, last) for position in block[:-1])
+            for move in candidates:
+                if move is not None:
+                    yield move
+
+
+class EnergyDelta(object):
+    '''
+    Delta evaluation of the total energy consumption of a solution for the
+    timetable version of the moves of MyNeighborhood1 and MyNeighborhood2,
+    where the other operations keep their start times:
+    - reassignment: the operation keeps its start time on the other machine,
+    - swap of two consecutive operations of a machine: the second one starts
+      at the start time of the first one, which follows it immediately.
+    The solution must be complete, with every machine running in one period
+    from its first to its last operation (as built by schedule and stop_machines).
+    The energy of a machine is then
+        set_up_energy + tear_down_energy + processing energies
+        + min_consumption * (last end - first start - processing times)
+    so that a move only changes the ends of the timelines of two machines.
+    The deltas are computed in O(log n) without modifying the solution,
+    None is returned for moves leading to an infeasible timetable.
+    The moves can then be applied to the timetable of the EnergyDelta
+    (apply_reassignment, apply_swap), the solution itself being left unchanged,
+    and the resulting timetable encoded to build a solution (encode).
+    '''
+
+    def __init__(self, sol: Solution):
         '''
-        Constructor
+        Constructor: builds the timelines of the machines.
+        @raise ValueError: if a machine is running or has several periods
         '''
-        raise "Not implemented error"
+        self._instance = sol.inst
+        self._timelines: Dict[int, List[ScheduledOperation]] = {}
+        self._starts: Dict[int, List[int]] = {}
+        self._positions: Dict[int, Tuple[int, int]] = {}
+        # Opération planifiée de chaque opération (par identifiant)
+        self._records: Dict[int, ScheduledOperation] = {}
+        for machine in sol.inst.machines:
+            if machine.is_running or len(machine.start_times) > 1:
+                raise ValueError(f"Machine {machine.machine_id} must be stopped after one period")
+            timeline = machine.scheduled_operations
+            self._timelines[machine.machine_id] = timeline
+            self._starts[machine.machine_id] = [record.start_time for record in timeline]
+            for position, record in enumerate(timeline):
+                self._positions[record.operation_id] = (machine.machine_id, position)
+                self._records[record.operation_id] = record
 
-    def best_neighbor(self, sol: Solution) -> Solution:
+    def timeline(self, machine: Machine) -> List[ScheduledOperation]:
         '''
-        Returns the best solution in the neighborhood of the solution.
-        Can be the solution itself.
+        Returns the operations of the machine in increasing start time.
         '''
-        raise "Not implemented error"
+        return self._timelines[machine.machine_id]
 
-    def first_better_neighbor(self, sol: Solution) -> Solution:
+    def machine_id(self, operation: Operation) -> Optional[int]:
         '''
-        Returns the first solution in the neighborhood of the solution
-        that improves other it and the solution itself if none is better.
+        Returns the machine of the operation in the timetable, None if it is not planned.
         '''
-        raise "Not implemented error"
+        position = self._positions.get(operation.operation_id)
+        return None if position is None else position[0]
+
+    def record(self, operation: Operation) -> Optional[ScheduledOperation]:
+        '''
+        Returns the planning of the operation in the timetable, None if it is not planned.
+        '''
+        return self._records.get(operation.operation_id)
+
+    @staticmethod
+    def _span(timeline: List[ScheduledOperation]) -> int:
+        return timeline[-1].end_time - timeline[0].start_time if timeline else 0
+
+    def reassignment(self, operation: Operation, machine: Machine) -> Optional[int]:
+        '''
+        Returns the change of the total energy consumption if the operation
+        is moved to the machine with the same start time, None if it does not
+        fit between the operations of the machine or before its successor.
+        '''
+        source_id, position = self._positions[operation.operation_id]
+        if source_id == machine.machine_id:
+            return 0
+        duration = operation.get_duration_for_machine(machine.machine_id)
+        if duration is None:
+            return None
+        record = self._timelines[source_id][position]
+        start = record.start_time
+        end = start + duration
+        for succ in operation.successors:
+            succ_record = self._records.get(succ.operation_id)
+            if succ_record is not None and succ_record.start_time < end:
+                return None
+
+        target = self._timelines[machine.machine_id]
+        index = bisect_left(self._starts[machine.machine_id], start)
+        if index > 0 and target[index - 1].end_time > start:
+            return None
+        if index < len(target) and target[index].start_time < end:
+            return None
+        if index == 0 and start < machine.set_up_time:
+            return None
+        if index == len(target) and end + machine.tear_down_time > machine.end_time:
+            return None
+
+        delta = operation.get_energy_for_machine(machine.machine_id)
+        if target:
+            span = max(end, target[-1].end_time) - min(start, target[0].start_time)
+            delta += machine.min_consumption * (span - self._span(target) - duration)
+        else:
+            delta += machine.set_up_energy + machine.tear_down_energy
+
+        source = self._instance.get_machine(source_id)
+        timeline = self._timelines[source_id]
+        if len(timeline) == 1:
+            return delta - source.set_up_energy - source.tear_down_energy - record.energy
+        first = timeline[1] if position == 0 else timeline[0]
+        last = timeline[-2] if position == len(timeline) - 1 else timeline[-1]
+        span = last.end_time - first.start_time
+        return delta - record.energy + source.min_consumption * (span - self._span(timeline) + record.duration)
+
+    def swap(self, machine: Machine, position: int) -> Optional[int]:
+        '''
+        Returns the change of the total energy consumption if the operations
+        at position and position + 1 on the machine are swapped, None if they
+        belong to the same job or if the swap violates a precedence constraint.
+        '''
+        timeline = self._timelines[machine.machine_id]
+        first, second = timeline[position], timeline[position + 1]
+        if first.job_id == second.job_id:
+            return None
+        start = first.start_time
+        first_end = start + second.duration + first.duration
+        for pred in second.operation.predecessors:
+            pred_record = self._records.get(pred.operation_id)
+            if pred_record is None or pred_record.end_time > start:
+                return None
+        for succ in first.operation.successors:
+            succ_record = self._records.get(succ.operation_id)
+            if succ_record is not None and succ_record.start_time < first_end:
+                return None
+        if position + 2 < len(timeline):
+            return 0
+        # La paire termine la période : la machine s'arrête plus tôt
+        return machine.min_consumption * (first_end - second.end_time)
+
+
+    def _renumber(self, machine_id: int, first: int):
+        for position in range(first, len(self._timelines[machine_id])):
+            self._positions[self._timelines[machine_id][position].operation_id] = (machine_id, position)
+
+    def apply_reassignment(self, operation: Operation, machine: Machine):
+        '''
+        Moves the operation to the machine in the timetable, with the same start time
+        (the move must be feasible, see reassignment).
+        '''
+        source_id, position = self._positions[operation.operation_id]
+        if source_id == machine.machine_id:
+            return
+        start = self._timelines[source_id].pop(position).start_time
+        self._starts[source_id].pop(position)
+        self._renumber(source_id, position)
+        record = ScheduledOperation(operation, start, operation.get_duration_for_machine(machine.machine_id),
+                                    operation.get_energy_for_machine(machine.machine_id))
+        index = bisect_left(self._starts[machine.machine_id], start)
+        self._timelines[machine.machine_id].insert(index, record)
+        self._starts[machine.machine_id].insert(index, start)
+        self._records[operation.operation_id] = record
+        self._renumber(machine.machine_id, index)
+
+    def apply_swap(self, machine: Machine, position: int):
+        '''
+        Swaps the operations at position and position + 1 on the machine in the
+        timetable (the move must be feasible, see swap).
+        '''
+        timeline = self._timelines[machine.machine_id]
+        first, second = timeline[position], timeline[position + 1]
+        start = first.start_time
+        second = ScheduledOperation(second.operation, start, second.duration, second.energy)
+        first = ScheduledOperation(first.operation, second.end_time, first.duration, first.energy)
+        timeline[position], timeline[position + 1] = second, first
+        self._starts[machine.machine_id][position:position + 2] = [second.start_time, first.start_time]
+        for index, record in ((position, second), (position + 1, first)):
+            self._records[record.operation_id] = record
+            self._positions[record.operation_id] = (machine.machine_id, index)
+
+    def encode(self) -> SolutionCode:
+        '''
+        Returns the code of the solution of the timetable, every machine running in
+        one period from the set up of its first operation to the end of its last one.
+        '''
+        instance = self._instance
+        machines = [-1] * len(instance.operations)
+        starts = [-1] * len(instance.operations)
+        sequences, sequence_offsets = [], [0]
+        on_times, off_times, interval_offsets = [], [], [0]
+        for machine in instance.machines:
+            timeline = self._timelines[machine.machine_id]
+            for record in timeline:
+                machines[record.operation.index] = machine.index
+                starts[record.operation.index] = record.start_time
+                sequences.append(record.operation.index)
+            sequence_offsets.append(len(sequences))
+            if timeline:
+                on_times.append(timeline[0].start_time - machine.set_up_time)
+                off_times.append(timeline[-1].end_time)
+            interval_offsets.append(len(on_times))
+        return SolutionCode(instance.name, machines, starts, sequences, sequence_offsets,
+                            on_times, off_times, interval_offsets)
+
+_this_module = sys.modules[__name__]
+instrumentation.add_hot_path('neighborhood.evaluate', _this_module, '_evaluate')
+instrumentation.add_hot_path('neighborhood.neighbor', _this_module, '_neighbor')
+instrumentation.add_hot_path('neighborhood.first_better', _this_module, '_first_better')
+instrumentation.add_hot_path('neighborhood.best', _this_module, '_best')
@@ -0,0 +1,123 @@
+'''
+Evaluation of the neighbors of a solution sharded over a process pool.
+
+Every worker builds the instance and the neighborhoods once (from the
+arrays of the instance). For each exploration, it receives the current
+solution as a compact list of actions (see Solution.actions) and the
+shard of the moves it evaluates, and returns the best move of its shard.
+Only the best move is then applied in the calling process.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import time
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.solution import Solution
+from src.scheduling.optim.neighborhoods import Move, Neighborhood, build_neighbor, evaluate_neighbor
+from src.scheduling.optim.local_search import neighborhoods
+from src.scheduling.optim.evaluation_cache import cache_from_params
+from src.scheduling.optim.budget import Budget
+
+
+def all_moves(explored: List[Neighborhood], sol: Solution) -> List[Move]:
+    '''
+    Moves of the neighborhoods, in the order in which they are explored.
+    '''
+    return [move for neighborhood in explored for move in neighborhood.moves(sol)]
+
+
+# Instance, neighborhoods et dernière solution reçue du processus de travail
+_worker_state: Dict = {}
+
+
+def _init_worker(instance_name: str, arrays, NeighborClasses: list, params: Dict):
+    instance = Instance.from_arrays(instance_name, arrays)
+    _worker_state['instance'] = instance
+    _worker_state['neighborhoods'] = neighborhoods(instance, NeighborClasses, params)
+    _worker_state['cache'] = cache_from_params(params)
+    _worker_state['exploration'] = None
+
+
+def _best_in_shard(exploration: int, actions: List[Tuple[int, int, int]], shard: int, nb_shards: int,
+                   deadline: Optional[float]) -> Tuple[Optional[int], Optional[int], int]:
+    '''
+    Evaluates the moves shard, shard + nb_shards, ... of the solution.
+    Returns (best value, index of the best move, number of evaluated moves).
+    '''
+    if _worker_state['exploration'] != exploration:
+        sol = Solution(_worker_state['instance'])
+        sol.apply_actions(actions)
+        moves = all_moves(_worker_state['neighborhoods'], sol)
+        _worker_state['exploration'] = exploration
+        _worker_state['current'] = (sol, sol.dispatch, moves)
+    sol, dispatch, moves = _worker_state['current']
+    cache = _worker_state['cache']
+    best_value, best_index = None, None
+    evaluated = 0
+    for index in range(shard, len(moves), nb_shards):
+        if deadline is not None and time.time() >= deadline:
+            break
+        value = evaluate_neighbor(sol, dispatch, moves[index], cache)
+        evaluated += 1
+        if value is not None and (best_value is None or value < best_value):
+            best_value, best_index = value, index
+    return best_value, best_index, evaluated
+
+
+class ParallelExplorer(object):
+    '''
+    Best neighbor over the union of neighborhoods, computed by a pool of
+    worker processes. The result is the one of exploring the neighborhoods
+    in turn in one process and keeping the first best neighbor.
+    '''
+
+    def __init__(self, instance: Instance, NeighborClass, params: Dict=dict(), workers: int=2):
+        '''
+        Constructor: starts the worker processes.
+        @param NeighborClass: a neighborhood class or a list of neighborhood classes
+               (they must provide moves(sol), see MyNeighborhood1)
+        @param workers: number of processes, and of shards of each exploration
+        '''
+        classes = list(NeighborClass) if isinstance(NeighborClass, (list, tuple)) else [NeighborClass]
+        worker_params = {k: v for k, v in params.items() if k not in ('budget', 'callback', 'cache')}
+        # Chaque processus a son propre cache partagé
+        worker_params['cache'] = cache_from_params(params) is not None
+        self._explored = neighborhoods(instance, classes, worker_params)
+        self._workers = workers
+        self._explorations = itertools.count()
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                             initargs=(instance.name, instance.arrays, classes, worker_params))
+
+    def best_neighbor(self, sol: Solution, budget: Optional[Budget] = None) -> Solution:
+        '''
+        Returns the best neighbor if it is better than the solution, the solution itself otherwise.
+        @param budget: budget of the search, counting the evaluations of the workers,
+               which stop evaluating moves at its deadline
+        '''
+        deadline = None if budget is None else budget.deadline
+        value = sol.evaluate
+        actions = sol.actions()
+        exploration = next(self._explorations)
+        futures = [self._executor.submit(_best_in_shard, exploration, actions, shard, self._workers, deadline)
+                   for shard in range(self._workers)]
+        best_value, best_index = None, None
+        evaluated = 0
+        for future in futures:
+            shard_value, shard_index, shard_evaluated = future.result()
+            evaluated += shard_evaluated
+            if shard_value is not None and (best_value is None or (shard_value, shard_index) < (best_value, best_index)):
+                best_value, best_index = shard_value, shard_index
+        # Les plannings construits par les processus de travail sont comptés ici
+        Solution.nb_completed += evaluated
+        if budget is not None:
+            budget.count(evaluated)
+        if best_value is None or best_value >= value:
+            return sol
+        moves = all_moves(self._explored, sol)
+        return build_neighbor(sol, sol.dispatch, moves[best_index])
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
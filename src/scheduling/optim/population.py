@@ -0,0 +1,170 @@
+'''
+Batch evaluation of encoded solutions, for multi-start and population methods.
+A solution is encoded by two vectors over the dense operation indices:
+- assignment: dense index of the machine of each operation,
+- sequence: permutation of the operations giving the order in which they are
+  scheduled. An operation placed before its job predecessor is scheduled
+  right after it (the order is repaired, any permutation is valid).
+Decoding schedules the operations in this order exactly as Solution.schedule,
+then stops the machines as Solution.stop_machines.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Tuple
+
+import numpy as np
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.solution import Solution, ENERGY_WEIGHT, CMAX_WEIGHT
+
+
+class PopulationScores(object):
+    '''
+    Values of a population of N encoded solutions (arrays of length N).
+    The values of an infeasible solution (an operation on a machine where it
+    cannot be executed, or ending too late for the tear down of its machine)
+    are those of its schedule without the end time constraints.
+    '''
+
+    def __init__(self, cmax: np.ndarray, sum_ci: np.ndarray, energy: np.ndarray, feasible: np.ndarray):
+        self.cmax = cmax
+        self.sum_ci = sum_ci
+        self.energy = energy
+        self.feasible = feasible
+
+    @property
+    def objective(self) -> np.ndarray:
+        '''
+        Same objective as Solution.objective.
+        '''
+        return ENERGY_WEIGHT * self.energy + CMAX_WEIGHT * self.cmax
+
+    def __len__(self) -> int:
+        return len(self.cmax)
+
+
+class PopulationEvaluator(object):
+    '''
+    Decodes and evaluates N encoded solutions of an instance at once:
+    the operations are scheduled one step at a time for the N solutions,
+    each step being a few NumPy operations on arrays of length N.
+    '''
+
+    def __init__(self, instance: Instance):
+        '''
+        Constructor
+        '''
+        self._instance = instance
+        arrays = instance.arrays
+        self._arrays = arrays
+        self._predecessors = arrays.predecessors
+        # Position de chaque opération dans son job (pour réparer l'ordre)
+        self._depth = np.zeros(arrays.nb_operations, dtype=np.int64)
+        for i, pred in enumerate(arrays.predecessors.tolist()):
+            if pred != -1:
+                self._depth[i] = self._depth[pred] + 1
+        self._last_operations = np.array([job.operations[-1].index for job in instance.jobs if job.operations],
+                                         dtype=np.int64)
+        self._dtype = np.result_type(arrays.durations, arrays.energies, arrays.set_up_times,
+                                     arrays.set_up_energies, arrays.tear_down_times,
+                                     arrays.tear_down_energies, arrays.min_consumptions)
+
+    @staticmethod
+    def encode(sol: Solution) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the (assignment, sequence) vectors of a complete solution.
+        @raise ValueError: if an operation is not scheduled
+        '''
+        dispatch = sol.dispatch
+        if len(dispatch) < len(sol.all_operations):
+            raise ValueError("Only complete solutions can be encoded")
+        assignment = np.zeros(len(sol.all_operations), dtype=np.int64)
+        for operation, machine in dispatch:
+            assignment[operation.index] = machine.index
+        sequence = np.array([operation.index for operation, _ in dispatch], dtype=np.int64)
+        return assignment, sequence
+
+    def dispatch_order(self, sequences: np.ndarray) -> np.ndarray:
+        '''
+        Repairs the sequences (N x n) so that every operation comes after its
+        job predecessor: an operation takes the rank of its predecessor if it is
+        later than its own, and follows it.
+        '''
+        sequences = np.atleast_2d(sequences)
+        nb_solutions, nb_operations = sequences.shape
+        rows = np.arange(nb_solutions)[:, None]
+        ranks = np.empty_like(sequences)
+        ranks[rows, sequences] = np.arange(nb_operations)
+        # Les prédécesseurs ont une profondeur plus faible : on traite les opérations par profondeur
+        for depth in range(1, int(self._depth.max(initial=0)) + 1):
+            level = np.flatnonzero(self._depth == depth)
+            ranks[:, level] = np.maximum(ranks[:, level], ranks[:, self._predecessors[level]])
+        keys = ranks * (int(self._depth.max(initial=0)) + 1) + self._depth
+        return np.argsort(keys, axis=1, kind='stable')
+
+    def evaluate(self, assignments: np.ndarray, sequences: np.ndarray) -> PopulationScores:
+        '''
+        Evaluates N encoded solutions.
+        @param assignments: N x n array of dense machine indices
+        @param sequences: N x n array, each row a permutation of the operations
+        '''
+        arrays = self._arrays
+        assignments = np.atleast_2d(np.asarray(assignments, dtype=np.int64))
+        order = self.dispatch_order(np.asarray(sequences, dtype=np.int64))
+        nb_solutions, nb_operations = order.shape
+        nb_machines = arrays.nb_machines
+        rows = np.arange(nb_solutions)
+        dtype = self._dtype
+
+        ends = np.zeros((nb_solutions, nb_operations), dtype=dtype)
+        available = np.zeros((nb_solutions, nb_machines), dtype=dtype)
+        first_start = np.zeros((nb_solutions, nb_machines), dtype=dtype)
+        running = np.zeros((nb_solutions, nb_machines), dtype=bool)
+        processing_time = np.zeros((nb_solutions, nb_machines), dtype=dtype)
+        processing_energy = np.zeros(nb_solutions, dtype=dtype)
+        feasible = np.ones(nb_solutions, dtype=bool)
+
+        for step in range(nb_operations):
+            operation = order[:, step]
+            machine = assignments[rows, operation]
+            feasible &= arrays.eligible[operation, machine]
+            pred = self._predecessors[operation]
+            ready = np.where(pred >= 0, ends[rows, np.maximum(pred, 0)], 0)
+            set_up = arrays.set_up_times[machine]
+            is_running = running[rows, machine]
+            current = available[rows, machine]
+            # Voir Machine.operation_start_time
+            start = np.where(is_running, np.maximum(ready, current),
+                             np.maximum(current, ready - set_up) + set_up)
+            duration = arrays.durations[operation, machine]
+            end = start + duration
+            feasible &= end + arrays.tear_down_times[machine] <= arrays.end_times[machine]
+
+            first_start[rows, machine] = np.where(is_running, first_start[rows, machine], start - set_up)
+            running[rows, machine] = True
+            available[rows, machine] = end
+            processing_time[rows, machine] += duration
+            processing_energy += arrays.energies[operation, machine]
+            ends[rows, operation] = end
+
+        # Arrêt des machines après leur dernière opération (voir Solution.stop_machines)
+        idle = available - first_start - arrays.set_up_times - processing_time
+        per_machine = arrays.set_up_energies + arrays.tear_down_energies + arrays.min_consumptions * idle
+        energy = processing_energy + np.where(running, per_machine, 0).sum(axis=1)
+
+        completions = ends[:, self._last_operations]
+        return PopulationScores(completions.max(axis=1, initial=0), completions.sum(axis=1),
+                                energy, feasible)
+
+    def decode(self, assignment: np.ndarray, sequence: np.ndarray) -> Solution:
+        '''
+        Builds the Solution of one encoded solution.
+        @raise ValueError: if an operation ends too late for the tear down of its machine
+        '''
+        machines = self._instance.machines
+        operations = self._instance.operations
+        sol = Solution(self._instance)
+        for index in self.dispatch_order(sequence)[0].tolist():
+            sol.schedule(operations[index], machines[int(assignment[index])])
+        sol.stop_machines()
+        return sol
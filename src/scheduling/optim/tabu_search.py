@@ -0,0 +1,186 @@
+'''
+Tabu search on the neighborhoods of optim.neighborhoods.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Dict, Iterator, List, Tuple
+import random
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.machine import Machine
+from src.scheduling.instance.operation import Operation
+from src.scheduling import instrumentation
+from src.scheduling.optim.budget import Budget
+from src.scheduling.optim.evaluation_cache import cache_from_params
+from src.scheduling.optim.local_search import LocalSearch, Progress, initial_solution, neighborhoods
+from src.scheduling.optim.neighborhoods import Move, evaluate_neighbor, neighbor_decisions
+
+
+class TabuList(object):
+    '''
+    Tabu attributes of the moves, hashed into a fixed-size table storing for
+    each slot the iteration until which it is tabu: insertion and test are in O(1).
+    Two attributes in the same slot share their status (a move can be wrongly
+    tabu, which only restricts the search a little more).
+    '''
+
+    def __init__(self, size: int = 1 << 14):
+        '''
+        Constructor
+        @param size: number of slots, rounded up to a power of 2
+        '''
+        self._mask = (1 << max(0, (size - 1).bit_length())) - 1
+        self._until = [0] * (self._mask + 1)
+
+    def add(self, attribute: int, until: int):
+        slot = hash(attribute) & self._mask
+        if self._until[slot] < until:
+            self._until[slot] = until
+
+    def is_tabu(self, attribute: int, iteration: int) -> bool:
+        return self._until[hash(attribute) & self._mask] > iteration
+
+
+def move_attributes(dispatch: List[Tuple[Operation, Machine]], move: Move, nb_machines: int,
+                    nb_operations: int) -> Tuple[List[int], List[int]]:
+    '''
+    Returns the attributes (integers) added and removed by the move:
+    the (operation, machine) assignments that change, and the order of the
+    two operations exchanged when the move shifts an operation of the window
+    before its first operation (see MyNeighborhood2) or after its last one
+    (see CriticalBlockMoves).
+    '''
+    position, window = move
+    old = dispatch[position:position + len(window)]
+    assignments = nb_operations * nb_machines
+    # La fenêtre contient les mêmes opérations dans un autre ordre : comparer par opération
+    old_machines = {operation: machine for operation, machine in old}
+    new_machines = {operation: machine for operation, machine in window}
+    added = [operation.index * nb_machines + machine.index
+             for operation, machine in window if machine is not old_machines[operation]]
+    removed = [operation.index * nb_machines + machine.index
+               for operation, machine in old if machine is not new_machines[operation]]
+    if window[0][0] is not old[0][0]:
+        if window[0][0] is old[-1][0]:
+            # La dernière opération passe devant la première
+            before, after = window[0][0], old[0][0]
+        else:
+            # La première opération passe derrière la dernière
+            before, after = old[-1][0], window[-1][0]
+        added.append(assignments + before.index * nb_operations + after.index)
+        removed.append(assignments + after.index * nb_operations + before.index)
+    return added, removed
+
+
+class TabuSearch(LocalSearch):
+    '''
+    Tabu search: at each iteration, the best non tabu move of a candidate list
+    (a random sample of the moves of the neighborhoods) is applied, even if it
+    does not improve the current solution. The attributes removed by the move
+    (assignment of an operation to a machine, relative order of two operations)
+    become tabu for tenure iterations: a move adding a tabu attribute is
+    forbidden, unless it gives a solution better than the best one found
+    (aspiration). The neighborhoods must provide moves(sol) (see MyNeighborhood1).
+    The incumbent is the best solution found (see LocalSearch for the limits,
+    the callback and the progress). Besides the limits, the search stops after
+    max_no_improvement iterations without improving the incumbent
+    ('max_no_improvement') or when every candidate move is tabu or
+    infeasible ('no_admissible_move').
+    '''
+
+    def __init__(self, params: Dict=dict()):
+        '''
+        Constructor
+        @param params: The parameters of your heuristic method if any as a
+               dictionary. Implementation should provide default values in the function.
+               - seed: seed of the random generator (sampling and initial solution)
+               - tenure: number of iterations during which an attribute is tabu (10)
+               - candidates: size of the candidate list, None for all the moves (30)
+               - max_iterations: maximum number of iterations (1000)
+               - max_no_improvement: iterations without improving the incumbent (200)
+               - tabu_size: number of slots of the tabu list (16384)
+               - cache: EvaluationCache of the values of the neighbors, True for the
+                 shared one (None by default, see cache_from_params)
+               - time_limit, max_evaluations, callback, optimize_on_off: see LocalSearch
+        '''
+        super().__init__(params)
+
+    def _iterate(self, instance: Instance, InitClass, NeighborClass, params: Dict) -> Iterator[Progress]:
+        '''
+        Runs the tabu search, yielding the Progress of the initial solution and
+        of each improvement of the incumbent.
+        '''
+        rng = random.Random(params.get('seed'))
+        tenure = params.get('tenure', 10)
+        candidates = params.get('candidates', 30)
+        max_iterations = params.get('max_iterations', 1000)
+        max_no_improvement = params.get('max_no_improvement', 200)
+        budget = Budget(params.get('time_limit'), params.get('max_evaluations'))
+        self._budget = budget
+        tabu = TabuList(params.get('tabu_size', 1 << 14))
+        cache = cache_from_params(params)
+        nb_machines, nb_operations = len(instance.machines), len(instance.operations)
+        self.stopped = None
+        self.trace = []
+
+        sol = initial_solution(instance, InitClass, params)
+        budget.count()
+        explored = neighborhoods(instance, NeighborClass, params)
+        best_value = sol.evaluate
+        self.incumbent = sol.clone()
+        iterations = last_improvement = 0
+        progress = Progress(budget.elapsed, budget.evaluations, 0, best_value, self.incumbent)
+        self.trace.append((progress.time, progress.evaluations, best_value))
+        yield progress
+        while True:
+            if max_iterations is not None and iterations >= max_iterations:
+                self.stopped = 'max_iterations'
+                return
+            if max_no_improvement is not None and iterations - last_improvement >= max_no_improvement:
+                self.stopped = 'max_no_improvement'
+                return
+            self.stopped = budget.exhausted()
+            if self.stopped:
+                return
+            dispatch = sol.dispatch
+            moves = [move for neighborhood in explored for move in neighborhood.moves(sol)]
+            if candidates is not None and len(moves) > candidates:
+                moves = rng.sample(moves, candidates)
+            chosen, chosen_value, chosen_removed = None, None, None
+            for move in moves:
+                if budget.exhausted():
+                    break
+                added, removed = move_attributes(dispatch, move, nb_machines, nb_operations)
+                is_tabu = any(tabu.is_tabu(attribute, iterations) for attribute in added)
+                neighbor_value = evaluate_neighbor(sol, dispatch, move, cache, budget)
+                if neighbor_value is None or (is_tabu and neighbor_value >= best_value):
+                    continue
+                if chosen is None or neighbor_value < chosen_value:
+                    chosen, chosen_value, chosen_removed = move, neighbor_value, removed
+            if chosen is None:
+                # Tous les candidats sont tabous ou irréalisables
+                self.stopped = budget.exhausted() or 'no_admissible_move'
+                return
+            sol.replan(chosen[0], neighbor_decisions(dispatch, chosen))
+            iterations += 1
+            instrumentation.count('accepted_moves')
+            for attribute in chosen_removed:
+                tabu.add(attribute, iterations + tenure)
+            if chosen_value < best_value:
+                best_value, last_improvement = chosen_value, iterations
+                self.incumbent = sol.clone()
+                progress = Progress(budget.elapsed, budget.evaluations, iterations, best_value, self.incumbent)
+                self.trace.append((progress.time, progress.evaluations, best_value))
+                yield progress
+
+
+if __name__ == "__main__":
+    # Tabu search on the two neighborhoods, one second
+    from src.scheduling.tests.test_utils import TEST_FOLDER_DATA
+    from src.scheduling.optim.constructive import NonDeterminist
+    from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2
+    import os
+    inst = Instance.from_file(TEST_FOLDER_DATA + os.path.sep + "jsp1")
+    heur = TabuSearch({'seed': 0, 'time_limit': 1.0})
+    sol = heur.run(inst, NonDeterminist, [MyNeighborhood1, MyNeighborhood2])
+    print(sol.evaluate, heur.stopped, heur.trace[-1])
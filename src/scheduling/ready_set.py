@@ -0,0 +1,101 @@
+'''
+Indexed priority queue of the operations ready to be scheduled.
+
+@author: Vassilissa Lehoux
+'''
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import heapq
+
+from src.scheduling.instance.operation import Operation
+
+
+class ReadySet(object):
+    '''
+    Set of operations ordered by a key (e.g. their earliest start time).
+    Membership is tested in O(1) with a dictionary indexed by the dense index
+    of the operations, insertion and removal are in O(log n): removed entries
+    are only marked and discarded when they reach the top of the heap.
+    The key of an operation must not change while it is in the set.
+    '''
+
+    def __init__(self, key: Callable[[Operation], Any]):
+        '''
+        Constructor
+        @param key: function giving the priority of an operation (lowest first)
+        '''
+        self._key = key
+        self._heap: List[list] = []
+        self._entries: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, operation: Operation) -> bool:
+        entry = self._entries.get(operation.index)
+        return entry is not None and entry[2] is operation
+
+    def __iter__(self) -> Iterator[Operation]:
+        '''
+        Iterates over the operations in O(n), in no particular order
+        (see ordered for the order of the keys).
+        '''
+        return (entry[2] for entry in self._entries.values())
+
+    def ordered(self) -> List[Operation]:
+        '''
+        Returns the operations by increasing key, in O(n log n).
+        '''
+        return [entry[2] for entry in sorted(self._entries.values())]
+
+    def key(self, operation: Operation) -> Any:
+        '''
+        Returns the key of an operation of the set.
+        '''
+        return self._entries[operation.index][0]
+
+    def clear(self):
+        self._heap = []
+        self._entries = {}
+
+    def push(self, operation: Operation):
+        '''
+        Adds the operation to the set (does nothing if it is already in the set).
+        '''
+        if operation in self:
+            return
+        # L'index départage les clés égales, les opérations ne sont jamais comparées
+        entry = [self._key(operation), operation.index, operation, True]
+        self._entries[operation.index] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, operation: Operation):
+        '''
+        Removes the operation from the set.
+        @raise KeyError: if the operation is not in the set
+        '''
+        if operation not in self:
+            raise KeyError(f"Operation {operation.operation_id} is not ready")
+        self._entries.pop(operation.index)[3] = False
+        self._discard_removed()
+
+    def peek(self) -> Optional[Operation]:
+        '''
+        Returns the operation of lowest key, None if the set is empty.
+        '''
+        return self._heap[0][2] if self._heap else None
+
+    def pop(self) -> Operation:
+        '''
+        Removes and returns the operation of lowest key.
+        @raise IndexError: if the set is empty
+        '''
+        operation = self.peek()
+        if operation is None:
+            raise IndexError("pop from an empty ready set")
+        self.remove(operation)
+        return operation
+
+    def _discard_removed(self):
+        heap = self._heap
+        while heap and not heap[0][3]:
+            heapq.heappop(heap)
@@ -3,25 +3,92 @@ Object containing the solution to the optimization problem.
 
 @author: Vassilissa Lehoux
 '''
-from typing import List
+from typing import Any, Callable, List, Optional, Tuple
+import os
 from matplotlib import pyplot as plt
 from src.scheduling.instance.instance import Instance
 from src.scheduling.instance.operation import Operation
 
 from matplotlib import colormaps
 from src.scheduling.instance.machine import Machine
+from src.scheduling.ready_set import ReadySet
+from src.scheduling.encoding import SolutionCode, save_codes, load_codes
+from src.scheduling import instrumentation
 
+import numpy as np
+
+
+# Pondération des objectifs (voir Compte_Rendu_TP.md) :
+# objective = ENERGY_WEIGHT * total_energy_consumption + CMAX_WEIGHT * cmax
+ENERGY_WEIGHT = 1
+CMAX_WEIGHT = 1
+# Pénalité par contrainte violée pour évaluer les solutions non réalisables
+INFEASIBILITY_PENALTY = 100000
+
+
+def _read_columns(path: str, nb_columns: int) -> np.ndarray:
+    '''
+    Reads a CSV file of integers with a header line in one read,
+    returns its rows as an array of shape (rows, nb_columns).
+    '''
+    with open(path) as file:
+        file.readline()
+        text = file.read()
+    values = text.replace('\n', ',').split(',')
+    values = np.array([value for value in values if value.strip()], dtype=np.int64)
+    if values.size % nb_columns:
+        raise ValueError(f"{path} does not have {nb_columns} columns")
+    return values.reshape(-1, nb_columns)
+
+
+def _dense_index(ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    '''
+    Returns the dense indices of the ids in values.
+    @raise ValueError: if a value is not an id
+    '''
+    order = np.argsort(ids, kind='stable')
+    positions = np.searchsorted(ids, values, sorter=order)
+    positions = np.minimum(positions, len(ids) - 1)
+    indices = order[positions]
+    if values.size and not np.array_equal(ids[indices], values):
+        raise ValueError(f"Unknown ids {sorted(set(values.tolist()) - set(ids.tolist()))}")
+    return indices
 
 class Solution(object):
     '''
     Solution class
+    The planning is stored in the operations and machines of the instance.
+    Every change made to them by schedule, Machine.add_operation and
+    Machine.stop is recorded in an undo journal of
+    (object, previous state, method name, arguments) entries, so that:
+    - checkpoint() / rollback(checkpoint) undo the changes made since the
+      checkpoint without copying anything,
+    - clone() only copies the journal: the planning of the clone is
+      rebuilt by replaying it the first time the clone is used while
+      another solution of the instance was modified (copy-on-write).
+    Objects of the instance always hold the planning of the last used solution.
+    The available operations are kept in a ReadySet, updated by schedule
+    and rebuilt from the jobs after a rollback or a replay.
     '''
 
-    def __init__(self, instance: Instance):
+    # Nombre de plannings complétés par stop_machines dans le processus (pour les mesures)
+    nb_completed = 0
+
+    def __init__(self, instance: Instance, ready_key: Optional[Callable[[Operation], Any]] = None):
         '''
         Constructor
+        @param ready_key: priority of the available operations (lowest first),
+               their earliest start time (ready_time) by default
         '''
-        raise "Not implemented error"
+        self._instance = instance
+        self._machines = instance.machines
+        self._jobs = instance.jobs
+        self._operations = instance.operations
+        self._journal: list = []
+        self._ready_key = ready_key or Solution.ready_time
+        self._ready = ReadySet(self._ready_key)
+        self._ready_is_valid = False
+        self.reset()
 
 
     @property
@@ -29,14 +96,194 @@ class Solution(object):
         '''
         Returns the associated instance
         '''
-        raise "Not implemented error"
+        return self._instance
 
 
     def reset(self):
         '''
         Resets the solution: everything needs to be replanned
         '''
-        raise "Not implemented error"
+        self._journal = []
+        self._ready_is_valid = False
+        self._attach()
+        for machine in self._machines:
+            machine.reset()
+        for job in self._jobs:
+            job.reset()
+
+    def _attach(self):
+        '''
+        Makes the objects of the instance record their changes in the journal of the solution.
+        '''
+        self._instance._active_solution = self
+        for machine in self._machines:
+            machine.set_journal(self._journal)
+        for job in self._jobs:
+            job.set_journal(self._journal)
+        for operation in self._operations:
+            operation.set_journal(self._journal)
+
+    def _activate(self):
+        '''
+        Rebuilds the planning of the solution in the objects of the instance
+        if another solution of the instance has been used since.
+        '''
+        if self._instance._active_solution is self:
+            return
+        entries = self._journal
+        self.reset()
+        self.replay(entries)
+
+    def checkpoint(self) -> int:
+        '''
+        Returns a checkpoint of the current planning, to be given to rollback.
+        '''
+        self._activate()
+        return len(self._journal)
+
+    def rollback(self, checkpoint: int) -> list:
+        '''
+        Undoes the changes made since the checkpoint, in O(number of changes).
+        Returns the undone journal entries, that replay can apply again.
+        '''
+        self._activate()
+        undone = self._journal[checkpoint:]
+        for obj, state, _, _ in reversed(undone):
+            obj.restore_state(state)
+        del self._journal[checkpoint:]
+        self._ready_is_valid = False
+        return undone
+
+    def replay(self, entries: list):
+        '''
+        Applies again journal entries (returned by rollback or taken
+        from another solution of the same instance).
+        '''
+        self._activate()
+        for obj, _, action, args in entries:
+            getattr(obj, action)(*args)
+        self._ready_is_valid = False
+
+    def clone(self) -> 'Solution':
+        '''
+        Returns a copy of the solution. Only the journal is copied:
+        the copy replays it when it is first used (see _activate).
+        '''
+        other = Solution.__new__(Solution)
+        other._instance = self._instance
+        other._machines = self._machines
+        other._jobs = self._jobs
+        other._operations = self._operations
+        other._journal = list(self._journal)
+        other._ready_key = self._ready_key
+        other._ready = ReadySet(self._ready_key)
+        other._ready_is_valid = False
+        return other
+
+    @property
+    def dispatch(self) -> List[Tuple[Operation, Machine]]:
+        '''
+        Returns the scheduling decisions (operation, machine) in the order
+        they were made: scheduling them in this order rebuilds the planning.
+        '''
+        self._activate()
+        return [(args[0], obj) for obj, _, action, args in self._journal if action == 'add_operation']
+
+    def actions(self) -> List[Tuple[int, int, int]]:
+        '''
+        Returns the changes of the planning as a compact list of
+        (dense operation index, dense machine index, time) for the scheduling
+        decisions (time: earliest start given to Machine.add_operation),
+        (-1, dense machine index, time) for the stops of the machines and,
+        for the periods set by optimize_on_off (see Machine.set_periods), their
+        start and stop times in order, the first one as (-2, dense machine index, time)
+        and the next ones as (-3, dense machine index, time).
+        Unlike encode, it keeps the order of the decisions: apply_actions on
+        a solution of a copy of the instance (e.g. in another process) gives
+        the same planning and the same dispatch.
+        '''
+        self._activate()
+        actions = []
+        for obj, _, action, args in self._journal:
+            if action == 'add_operation':
+                actions.append((args[0].index, obj.index, args[1]))
+            elif action == 'stop':
+                actions.append((-1, obj.index, args[0]))
+            elif action == 'set_periods':
+                times = [time for interval in args[0] for time in interval]
+                actions.extend((-2 if i == 0 else -3, obj.index, time) for i, time in enumerate(times))
+        return actions
+
+    def apply_actions(self, actions: List[Tuple[int, int, int]]):
+        '''
+        Replaces the planning by the one given by actions (see actions).
+        '''
+        self.reset()
+        operations, machines = self._operations, self._machines
+        # Dates des périodes en cours de lecture (machine, dates)
+        periods = None
+        for operation_index, machine_index, time in actions:
+            if operation_index == -3:
+                periods[1].append(time)
+                continue
+            if periods is not None:
+                times = periods[1]
+                machines[periods[0]].set_periods(list(zip(times[::2], times[1::2])))
+                periods = None
+            if operation_index == -2:
+                periods = (machine_index, [time])
+            elif operation_index == -1:
+                machines[machine_index].stop(time)
+            else:
+                self.schedule(operations[operation_index], machines[machine_index], at_time=time)
+        if periods is not None:
+            times = periods[1]
+            machines[periods[0]].set_periods(list(zip(times[::2], times[1::2])))
+
+    def checkpoint_before(self, position: int) -> int:
+        '''
+        Returns the checkpoint just before the position-th scheduling decision
+        (the current checkpoint if there are not as many decisions).
+        '''
+        self._activate()
+        for index, (_, _, action, _) in enumerate(self._journal):
+            if action == 'add_operation':
+                if position == 0:
+                    return index
+                position -= 1
+        return len(self._journal)
+
+    def replan(self, position: int, decisions: List[Tuple[Operation, Machine]]):
+        '''
+        Replaces the scheduling decisions from the position-th one by the given
+        decisions, then stops the machines.
+        @raise ValueError: if an operation cannot end before the end time of its machine
+               (the solution is then partially planned, rollback to restore it)
+        '''
+        self.rollback(self.checkpoint_before(position))
+        for operation, machine in decisions:
+            self.schedule(operation, machine)
+        self.stop_machines()
+
+    @property
+    def nb_violations(self) -> int:
+        '''
+        Returns the number of violated constraints: operations not planned,
+        precedence constraints not respected and machines with an invalid planning.
+        '''
+        self._activate()
+        violations = 0
+        for operation in self._operations:
+            if not operation.assigned:
+                violations += 1
+                continue
+            for pred in operation.predecessors:
+                if pred.assigned and pred.end_time > operation.start_time:
+                    violations += 1
+        for machine in self._machines:
+            if not machine.validate_schedule():
+                violations += 1
+        return violations
 
     @property
     def is_feasible(self) -> bool:
@@ -44,35 +291,38 @@ class Solution(object):
         Returns True if the solution respects the constraints.
         To call this function, all the operations must be planned.
         '''
-        raise "Not implemented error"
+        return self.nb_violations == 0
 
     @property
     def evaluate(self) -> int:
         '''
         Computes the value of the solution
+        (objective, penalized by the number of violated constraints).
         '''
-        raise "Not implemented error"
+        return self.objective + INFEASIBILITY_PENALTY * self.nb_violations
 
     @property
     def objective(self) -> int:
         '''
         Returns the value of the objective function
         '''
-        raise "Not implemented error"
+        return ENERGY_WEIGHT * self.total_energy_consumption + CMAX_WEIGHT * self.cmax
 
     @property
     def cmax(self) -> int:
         '''
         Returns the maximum completion time of a job
         '''
-        raise "Not implemented error"
+        self._activate()
+        return max((job.completion_time for job in self._jobs), default=0)
 
     @property
     def sum_ci(self) -> int:
         '''
         Returns the sum of completion times of all the jobs
         '''
-        raise "Not implemented error"
+        self._activate()
+        return sum(job.completion_time for job in self._jobs)
 
     @property
     def total_energy_consumption(self) -> int:
@@ -80,15 +330,23 @@ class Solution(object):
         Returns the total energy consumption for processing
         all the jobs (including energy for machine switched on but doing nothing).
         '''
-        raise "Not implemented error"
+        self._activate()
+        return sum(machine.total_energy_consumption for machine in self._machines)
 
     def __str__(self) -> str:
         '''
         String representation of the solution
         '''
-        return ""
+        self._activate()
+        lines = [f"{self._instance}: cmax={self.cmax} sum_ci={self.sum_ci} "
+                 f"energy={self.total_energy_consumption} objective={self.objective} "
+                 f"feasible={self.is_feasible}"]
+        for machine in self._machines:
+            operations = ' '.join(str(op) for op in machine.scheduled_operations)
+            lines.append(f"{machine}: start={machine.start_times} stop={machine.stop_times} {operations}")
+        return '\n'.join(lines)
 
-    def to_csv(self):
+    def to_csv(self, operation_file: Optional[str] = None, machine_file: Optional[str] = None) -> Tuple[str, str]:
         '''
         Save the solution to a csv files with the following formats:
         Operation file:
@@ -98,44 +356,262 @@ class Solution(object):
         Machine file:
           One line per pair of (start time, stop time) for the machine
           header: "machine_id, start_time, stop_time"
+        The operations not planned are not written, and the stop time of a
+        machine still running is -1. Each file is written at once.
+        @param operation_file: path of the operation file, <instance>_sol_op.csv by default
+        @param machine_file: path of the machine file, <instance>_sol_mach.csv by default
+        @return: the paths of the two files
         '''
-        raise "Not implemented error"
+        code = self.encode()
+        arrays = self._instance.arrays
+        operation_file = operation_file or f"{self._instance.name}_sol_op.csv"
+        machine_file = machine_file or f"{self._instance.name}_sol_mach.csv"
+        planned = np.flatnonzero(code.machines >= 0)
+        rows = zip(arrays.operation_ids[planned].tolist(), arrays.machine_ids[code.machines[planned]].tolist(),
+                   code.starts[planned].tolist())
+        lines = ["operation_id,machine_id,start_time"]
+        lines.extend(f"{operation_id},{machine_id},{start}" for operation_id, machine_id, start in rows)
+        with open(operation_file, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        machine_ids = np.repeat(arrays.machine_ids, np.diff(code.interval_offsets))
+        rows = zip(machine_ids.tolist(), code.on_times.tolist(), code.off_times.tolist())
+        lines = ["machine_id,start_time,stop_time"]
+        lines.extend(f"{machine_id},{start},{stop}" for machine_id, start, stop in rows)
+        with open(machine_file, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        return operation_file, machine_file
 
     def from_csv(self, inst_folder, operation_file, machine_file):
         '''
         Reads a solution from the instance folder
+        (files written by to_csv, their paths being relative to the folder).
+        Each file is read at once and parsed into arrays, and the planning
+        is rebuilt from them as in load.
+        @raise ValueError: if the files do not give a valid planning of the instance
+        '''
+        arrays = self._instance.arrays
+        operations = _read_columns(os.path.join(inst_folder, operation_file), 3)
+        intervals = _read_columns(os.path.join(inst_folder, machine_file), 3)
+        operation_index = _dense_index(arrays.operation_ids, operations[:, 0])
+        machine_index = _dense_index(arrays.machine_ids, operations[:, 1])
+        nb_machines = len(arrays.machine_ids)
+        machines = np.full(len(arrays.operation_ids), -1, dtype=np.int64)
+        starts = np.full(len(arrays.operation_ids), -1, dtype=np.int64)
+        machines[operation_index] = machine_index
+        starts[operation_index] = operations[:, 2]
+        # Séquences des machines : opérations triées par machine puis date de début
+        order = operation_index[np.lexsort((operations[:, 2], machine_index))]
+        sequence_offsets = np.concatenate(([0], np.cumsum(np.bincount(machine_index, minlength=nb_machines))))
+        interval_machines = _dense_index(arrays.machine_ids, intervals[:, 0])
+        by_machine = np.lexsort((intervals[:, 1], interval_machines))
+        interval_offsets = np.concatenate(([0], np.cumsum(np.bincount(interval_machines, minlength=nb_machines))))
+        self.load(SolutionCode(self._instance.name, machines, starts, order, sequence_offsets,
+                               intervals[by_machine, 1], intervals[by_machine, 2], interval_offsets))
+
+    def to_binary(self, path: str, compress: bool = False):
+        '''
+        Saves the solution in the compact binary format of the codes (see save_codes),
+        for archiving: use save_codes to archive many solutions in one file.
         '''
-        raise "Not implemented error"
+        save_codes(path, [self.encode()], compress)
+
+    def from_binary(self, path: str):
+        '''
+        Reads a solution saved by to_binary (the first code of a file of codes).
+        @raise ValueError: if the file does not give a valid planning of the instance
+        '''
+        codes = load_codes(path)
+        if not codes:
+            raise ValueError(f"{path} contains no solution")
+        self.load(codes[0])
+
+    @property
+    def ready_set(self) -> ReadySet:
+        '''
+        Returns the available operations as a priority queue
+        (rebuilt from the next operations of the jobs if needed).
+        '''
+        self._activate()
+        if not self._ready_is_valid:
+            self._ready.clear()
+            for job in self._jobs:
+                if not job.planned:
+                    self._ready.push(job.next_operation)
+            self._ready_is_valid = True
+        return self._ready
+
+    def encode(self) -> SolutionCode:
+        '''
+        Returns the compact encoding of the solution (see SolutionCode).
+        '''
+        self._activate()
+        machine_index = self._instance.arrays.machine_index
+        machines = [machine_index[op.assigned_to] if op.assigned else -1 for op in self._operations]
+        starts = [op.start_time if op.assigned else -1 for op in self._operations]
+        sequences, sequence_offsets = [], [0]
+        on_times, off_times, interval_offsets = [], [], [0]
+        for machine in self._machines:
+            sequences.extend(record.operation.index for record in machine.scheduled_operations)
+            sequence_offsets.append(len(sequences))
+            machine_starts = machine.start_times
+            on_times.extend(machine_starts)
+            if machine.is_running:
+                off_times.extend(machine.stop_times[:len(machine_starts) - 1])
+                off_times.append(-1)
+            else:
+                off_times.extend(machine.stop_times)
+            interval_offsets.append(len(on_times))
+        return SolutionCode(self._instance.name, machines, starts, sequences, sequence_offsets,
+                            on_times, off_times, interval_offsets)
+
+    @staticmethod
+    def decode(instance: Instance, code: SolutionCode) -> 'Solution':
+        '''
+        Builds the solution of a code (see load).
+        @raise ValueError: if the code does not match the instance or is not a valid planning
+        '''
+        sol = Solution(instance)
+        sol.load(code)
+        return sol
+
+    @staticmethod
+    def dispatch_order(instance: Instance, code: SolutionCode) -> List[int]:
+        '''
+        Returns the dense indices of the planned operations of the code by
+        increasing start time, an operation coming after its predecessors
+        at equal start time: the order in which load schedules them.
+        '''
+        assigned = np.flatnonzero(code.machines >= 0)
+        positions = np.zeros(len(instance.operations), dtype=np.int64)
+        for job in instance.jobs:
+            for position, operation in enumerate(job.operations):
+                positions[operation.index] = position
+        return assigned[np.lexsort((positions[assigned], code.starts[assigned]))].tolist()
+
+    def load(self, code: SolutionCode):
+        '''
+        Replaces the planning by the one of the code. The operations are scheduled
+        by increasing start time, so that the order of the decisions is a valid dispatch order.
+        The machines being started as late as possible, the on-times of the code
+        must be the ones of the rebuilt periods.
+        @raise ValueError: if the code does not match the instance or is not a valid planning
+        '''
+        instance = self._instance
+        if code.instance_name != instance.name or code.nb_operations != len(instance.operations) \
+                or code.nb_machines != len(instance.machines):
+            raise ValueError(f"Code of {code.instance_name} does not match instance {instance.name}")
+        self.reset()
+        operations, machines = instance.operations, instance.machines
+        starts = code.starts.tolist()
+        order = self.dispatch_order(instance, code)
+        intervals = [code.intervals(m) for m in range(len(machines))]
+        periods = [0] * len(machines)
+        for i in order:
+            m = int(code.machines[i])
+            machine, start = machines[m], starts[i]
+            # Arrêt de la machine si l'opération appartient à une période suivante
+            while periods[m] + 1 < len(intervals[m]) and intervals[m][periods[m] + 1][0] <= start:
+                if machine.is_running:
+                    machine.stop(intervals[m][periods[m]][1])
+                periods[m] += 1
+            self.schedule(operations[i], machine, at_time=start)
+            if operations[i].start_time != start:
+                raise ValueError(f"Operation {operations[i].operation_id} cannot start at {start}")
+        for m, machine in enumerate(machines):
+            if machine.is_running and intervals[m] and intervals[m][-1][1] != -1:
+                machine.stop(intervals[m][-1][1])
+            # Les machines sont démarrées au plus tard : les dates de démarrage doivent coïncider
+            on_times = [on for on, _ in intervals[m]]
+            if machine.start_times != on_times:
+                raise ValueError(f"Machine {machine.machine_id} cannot start at {on_times}, "
+                                 f"its periods start at {machine.start_times}")
+
+    def optimize_on_off(self):
+        '''
+        Post-pass on the fixed planning (machines and start times unchanged):
+        every machine is shut down during the idle gaps where it saves energy
+        (see Machine.optimal_intervals) and stopped after its last operation.
+        The periods of each machine are replaced in place (see Machine.set_periods,
+        recorded in the journal): O(n) for n scheduled operations, no operation
+        is scheduled again. Can be called after any heuristic.
+        '''
+        self._activate()
+        for machine in self._machines:
+            intervals = machine.optimal_intervals()
+            if intervals:
+                machine.set_periods(intervals)
 
     @property
     def available_operations(self)-> List[Operation]:
         '''
         Returns the available operations for scheduling:
         all constraints have been met for those operations to start
+        (sorted by the key of the ready set).
         '''
-        raise "Not implemented error"
+        return self.ready_set.ordered()
 
     @property
     def all_operations(self) -> List[Operation]:
         '''
         Returns all the operations in the instance
         '''
-        raise "Not implemented error"
+        return self._operations
+
+    @staticmethod
+    def ready_time(operation: Operation) -> int:
+        '''
+        Returns the earliest start time of the operation
+        with respect to the precedence constraints.
+        '''
+        predecessors = operation.predecessors
+        if not predecessors:
+            return 0
+        return max(pred.end_time for pred in predecessors)
 
-    def schedule(self, operation: Operation, machine: Machine):
+    def schedule(self, operation: Operation, machine: Machine, at_time: Optional[int] = None):
         '''
         Schedules the operation at the end of the planning of the machine.
         Starts the machine if stopped.
         @param operation: an operation that is available for scheduling
+        @param at_time: earliest start time of the operation if it must start
+               later than the end of its predecessors
         '''
-        assert(operation in self.available_operations)
-        raise "Not implemented error"
+        ready = self.ready_set
+        assert(operation in ready)
+        if self._ready_key is Solution.ready_time:
+            ready_time = ready.key(operation)
+        else:
+            ready_time = self.ready_time(operation)
+        if at_time is not None and at_time > ready_time:
+            ready_time = at_time
+        start_time = machine.add_operation(operation, ready_time)
+        operation.schedule(machine.machine_id, start_time,
+                           operation.get_duration_for_machine(machine.machine_id),
+                           operation.get_energy_for_machine(machine.machine_id),
+                           check_success=False)
+        job = self._instance.get_job(operation.job_id)
+        job.schedule_operation()
+        ready.remove(operation)
+        if not job.planned:
+            ready.push(job.next_operation)
+
+    def stop_machines(self):
+        '''
+        Stops every running machine right after its last operation
+        (to call once all the operations are scheduled).
+        '''
+        self._activate()
+        Solution.nb_completed += 1
+        for machine in self._machines:
+            if machine.is_running:
+                machine.stop(machine.available_time)
 
     def gantt(self, colormapname):
         """
         Generate a plot of the planning.
         Standard colormaps can be found at https://matplotlib.org/stable/users/explain/colors/colormaps.html
         """
+        self._activate()
         fig, ax = plt.subplots()
         colormap = colormaps[colormapname]
         for machine in self.inst.machines:
@@ -216,3 +692,10 @@ class Solution(object):
         ax.grid(True)
     
         return plt
+
+
+instrumentation.add_hot_path('Solution.schedule', Solution, 'schedule')
+instrumentation.add_hot_path('Solution.stop_machines', Solution, 'stop_machines')
+instrumentation.add_hot_path('Solution.rollback', Solution, 'rollback')
+instrumentation.add_hot_path('Solution.replay', Solution, 'replay')
+instrumentation.add_hot_path('Solution.total_energy_consumption', Solution, 'total_energy_consumption')
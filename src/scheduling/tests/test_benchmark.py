@@ -0,0 +1,88 @@
+'''
+Tests of the benchmark of the heuristics.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import tempfile
+import shutil
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.optim.multi_start import run_seed
+from src.scheduling.optim import benchmark
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.records = benchmark.run_benchmark(DATA_FOLDER, ['greedy', 'nondeterminist'], ['jsp10', 'jsp100'],
+                                               {'runs': 2, 'seed': 4, 'use_cache': False})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_records(self):
+        self.assertEqual([(r['instance'], r['heuristic'], r['run']) for r in self.records],
+                         [('jsp10', 'greedy', 0), ('jsp10', 'nondeterminist', 0), ('jsp10', 'nondeterminist', 1),
+                          ('jsp100', 'greedy', 0), ('jsp100', 'nondeterminist', 0),
+                          ('jsp100', 'nondeterminist', 1)])
+        instance = Instance.from_file(os.path.join(DATA_FOLDER, 'jsp100'), use_cache=False)
+        record = self.records[5]
+        sol = NonDeterminist({'seed': run_seed(4, 1)}).run(instance)
+        self.assertEqual(record['seed'], run_seed(4, 1))
+        self.assertEqual((record['evaluate'], record['cmax'], record['energy']),
+                         (sol.evaluate, sol.cmax, sol.total_energy_consumption))
+        for record in self.records:
+            self.assertEqual(set(record), set(benchmark.FIELDS))
+            self.assertEqual(record['evaluations'], 1)
+            self.assertGreater(record['peak_memory'], 0)
+            self.assertGreater(record['evaluations_per_second'], 0)
+
+    def test_files(self):
+        for name in ('results.json', 'results.csv'):
+            path = os.path.join(self.folder, name)
+            if name.endswith('.csv'):
+                benchmark.write_csv(self.records, path)
+            else:
+                benchmark.write_json(self.records, path)
+            self.assertEqual(benchmark.read_results(path), self.records)
+
+    def test_compare(self):
+        self.assertEqual(benchmark.compare(self.records, self.records), [])
+        worse = [dict(r) for r in self.records]
+        worse[1]['evaluate'] += 1
+        worse[2]['wall_time'] = max(1.0, 2 * worse[2]['wall_time'])
+        worse[3]['feasible'] = False
+        regressions = benchmark.compare(worse, self.records)
+        self.assertEqual([(r.instance, r.heuristic, r.run, r.metric) for r in regressions],
+                         [('jsp10', 'nondeterminist', 0, 'evaluate'), ('jsp10', 'nondeterminist', 1, 'wall_time'),
+                          ('jsp100', 'greedy', 0, 'feasible')])
+
+    def test_neighborhood_sizes(self):
+        sizes = benchmark.neighborhood_sizes(DATA_FOLDER, ['jsp10', 'jsp100'], {'seed': 4, 'use_cache': False})
+        self.assertEqual([(r['instance'], r['neighborhood']) for r in sizes],
+                         [(name, neighborhood) for name in ('jsp10', 'jsp100')
+                          for neighborhood in benchmark.NEIGHBORHOODS])
+        for record in sizes:
+            self.assertLess(record['critical'], record['full'])
+            self.assertGreater(record['critical'], 0)
+
+    def test_register(self):
+        benchmark.register('greedy_on_off', Greedy, params={'optimize_on_off': True}, deterministic=True)
+        try:
+            records = benchmark.run_benchmark(DATA_FOLDER, ['greedy', 'greedy_on_off'], ['jsp100'],
+                                              {'runs': 3, 'workers': 2, 'memory': False, 'use_cache': False})
+        finally:
+            del benchmark.HEURISTICS['greedy_on_off']
+        self.assertEqual([r['heuristic'] for r in records], ['greedy', 'greedy_on_off'])
+        self.assertLessEqual(records[1]['energy'], records[0]['energy'])
+        self.assertEqual(records[1]['cmax'], records[0]['cmax'])
+        self.assertEqual(benchmark.summary(records)[0]['best_evaluate'], records[0]['evaluate'])
+
+
+if __name__ == "__main__":
+    unittest.main()
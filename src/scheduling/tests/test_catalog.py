@@ -0,0 +1,78 @@
+'''
+Tests for the InstanceCatalog class
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import tempfile
+import shutil
+import os
+from unittest import mock
+
+from src.scheduling.instance.catalog import InstanceCatalog, natural_key
+from src.scheduling.instance.instance import Instance
+from src.scheduling.tests.test_utils import TEST_FOLDER_DATA
+
+
+class TestInstanceCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ('jsp10', 'jsp2'):
+            folder = os.path.join(self.root, name)
+            os.mkdir(folder)
+            for suffix in ('_op.csv', '_mach.csv'):
+                shutil.copy(os.path.join(TEST_FOLDER_DATA, 'jsp1', 'jsp1' + suffix),
+                            os.path.join(folder, name + suffix))
+        os.mkdir(os.path.join(self.root, 'not_an_instance'))
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.cache_dir)
+
+    def test_discovery(self):
+        catalog = InstanceCatalog(self.root, cache_dir=self.cache_dir)
+        self.assertEqual(catalog.names, ['jsp2', 'jsp10'])
+        self.assertEqual(len(catalog), 2)
+        self.assertIn('jsp10', catalog)
+        self.assertNotIn('not_an_instance', catalog)
+        self.assertEqual(sorted(['jsp10', 'jsp2', 'jsp1'], key=natural_key), ['jsp1', 'jsp2', 'jsp10'])
+
+    def test_info_without_parsing(self):
+        catalog = InstanceCatalog(self.root, cache_dir=self.cache_dir)
+        with mock.patch.object(Instance, 'read_arrays', side_effect=AssertionError('csv parsed')):
+            info = catalog.info('jsp2')
+        self.assertEqual((info.nb_jobs, info.nb_operations, info.nb_machines), (2, 4, 4))
+        self.assertFalse(catalog.is_loaded('jsp2'))
+        # Une fois le cache écrit, les informations viennent de son en-tête
+        catalog.prefetch(['jsp10'], workers=1)
+        other = InstanceCatalog(self.root, cache_dir=self.cache_dir)
+        with mock.patch.object(Instance, 'read_arrays', side_effect=AssertionError('csv parsed')):
+            self.assertEqual(str(other.info('jsp10')), 'jsp10_M4_J2_O4')
+
+    def test_lazy_loading(self):
+        catalog = InstanceCatalog(self.root, use_cache=False)
+        self.assertFalse(catalog.is_loaded('jsp10'))
+        inst = catalog['jsp10']
+        self.assertTrue(catalog.is_loaded('jsp10'))
+        self.assertFalse(catalog.is_loaded('jsp2'))
+        self.assertIs(catalog['jsp10'], inst)
+        self.assertEqual(inst.name, 'jsp10')
+        self.assertEqual(inst.nb_operations, 4)
+        with self.assertRaises(KeyError):
+            catalog['jsp3']
+
+    def test_parallel_prefetch(self):
+        catalog = InstanceCatalog(self.root, cache_dir=self.cache_dir)
+        catalog.prefetch(workers=2)
+        self.assertTrue(all(catalog.is_loaded(name) for name in catalog.names))
+        with mock.patch.object(Instance, 'read_arrays', side_effect=AssertionError('csv parsed')):
+            instances = list(catalog)
+        self.assertEqual([inst.name for inst in instances], ['jsp2', 'jsp10'])
+        self.assertEqual(instances[0].arrays.durations.tolist(),
+                         Instance.from_file(os.path.join(self.root, 'jsp2'), use_cache=False).arrays.durations.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
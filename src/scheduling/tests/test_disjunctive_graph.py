@@ -0,0 +1,98 @@
+'''
+Tests of the disjunctive graph.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import random
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.disjunctive_graph import DisjunctiveGraph
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+class TestDisjunctiveGraph(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.names = rng.sample(sorted(os.listdir(DATA_FOLDER)), 8)
+
+    def test_solution_graph(self):
+        for name in self.names:
+            instance = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+            for heuristic in (Greedy(), NonDeterminist({'seed': 1})):
+                sol = heuristic.run(instance)
+                if not all(op.assigned for op in instance.operations):
+                    continue
+                graph = DisjunctiveGraph.from_solution(sol)
+                self.assertEqual(graph.makespan, sol.cmax, name)
+                for operation in instance.operations:
+                    self.assertEqual(graph.head(operation), operation.start_time, name)
+                path = graph.critical_path()
+                self.assertTrue(all(graph.is_critical(op) for op in path))
+                self.assertEqual(graph.head(path[0]) + sum(graph.duration(op) for op in path),
+                                 graph.makespan, name)
+                for previous, operation in zip(path, path[1:]):
+                    self.assertEqual(graph.head(operation), graph.head(previous) + graph.duration(previous))
+
+    def assert_same(self, graph, instance):
+        fresh = DisjunctiveGraph(instance, graph.sequences())
+        self.assertEqual(graph.heads, fresh.heads)
+        self.assertEqual(graph.tails, fresh.tails)
+        # Tête du puits maintenue par _update
+        self.assertEqual(graph.makespan, max(head + graph.duration(op)
+                                             for head, op in zip(graph.heads, instance.operations)))
+
+    def test_incremental_moves(self):
+        rng = random.Random(1)
+        for name in self.names:
+            instance = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+            sol = Greedy().run(instance)
+            graph = DisjunctiveGraph.from_solution(sol)
+            for _ in range(30):
+                machine = rng.choice(instance.machines)
+                sequence = graph.sequence(machine)
+                if len(sequence) < 2:
+                    continue
+                position = rng.randrange(len(sequence) - 1)
+                if sequence[position].job_id == sequence[position + 1].job_id:
+                    continue
+                makespan = graph.makespan
+                estimate = graph.swap_estimate(machine, position)
+                heads = list(graph.heads)
+                try:
+                    graph.swap(machine, position)
+                except ValueError:
+                    self.assertEqual(graph.heads, heads)
+                    continue
+                self.assert_same(graph, instance)
+                self.assertLessEqual(estimate, graph.makespan)
+                if estimate >= makespan:
+                    self.assertEqual(estimate, graph.makespan)
+
+            for _ in range(30):
+                operation = rng.choice(instance.operations)
+                machine = instance.get_machine(rng.choice(operation.available_machines))
+                sequence = [op for op in graph.sequence(machine) if op is not operation]
+                position = rng.randrange(len(sequence) + 1)
+                estimate = graph.insertion_estimate(operation, machine, position)
+                before = sequence[position - 1] if position > 0 else None
+                after = sequence[position] if position < len(sequence) else None
+                old = (before and graph.head(before), after and graph.tail(after))
+                heads = list(graph.heads)
+                try:
+                    graph.move(operation, machine, position)
+                except ValueError:
+                    self.assertEqual(graph.heads, heads)
+                    continue
+                self.assert_same(graph, instance)
+                self.assertEqual(graph.sequence(machine).index(operation), position)
+                if old == (before and graph.head(before), after and graph.tail(after)):
+                    self.assertEqual(estimate, graph.head(operation) + graph.duration(operation)
+                                     + graph.tail(operation))
+
+
+if __name__ == "__main__":
+    unittest.main()
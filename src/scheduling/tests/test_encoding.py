@@ -0,0 +1,176 @@
+'''
+Tests of the compact encoding of the solutions.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import subprocess
+import pickle
+import tempfile
+import shutil
+import sys
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.solution import Solution
+from src.scheduling.encoding import SolutionCode, save_codes, load_codes
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.tests.test_utils import TEST_FOLDER_DATA, DATA_FOLDER
+
+
+def planning(sol):
+    return ([(op.assigned_to, op.start_time, op.end_time) for op in sol.all_operations],
+            [(m.start_times, m.stop_times, m.is_running, m.total_energy_consumption) for m in sol.inst.machines],
+            sol.evaluate)
+
+
+class TestSolutionCode(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    def check_round_trip(self, sol):
+        expected = planning(sol)
+        code = sol.encode()
+        decoded = Solution.decode(sol.inst, code)
+        self.assertEqual(planning(decoded), expected)
+        self.assertEqual(decoded.encode(), code)
+        self.assertEqual(hash(decoded.encode()), hash(code))
+        return code
+
+    def test_round_trip(self):
+        codes = set()
+        for name in ("jsp2", "jsp10", "jsp55", "jsp100"):
+            inst = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+            for heuristic in (Greedy(), NonDeterminist({'seed': 1}), NonDeterminist({'seed': 2})):
+                codes.add(self.check_round_trip(heuristic.run(inst)))
+        self.assertGreater(len(codes), 8)
+
+    def test_partial_and_stopped(self):
+        inst = Instance.from_file(os.path.join(TEST_FOLDER_DATA, "jsp1"), use_cache=False)
+        sol = Solution(inst)
+        sol.schedule(inst.operations[0], inst.machines[1])
+        sol.schedule(inst.operations[1], inst.machines[0])
+        # Arrêt entre deux opérations, la machine 0 reste en marche
+        inst.machines[1].stop(inst.machines[1].available_time)
+        sol.schedule(inst.operations[2], inst.machines[1])
+        code = self.check_round_trip(sol)
+        self.assertEqual(len(code.intervals(1)), 2)
+        self.assertEqual(code.intervals(0)[-1][1], -1)
+        self.assertEqual(code.starts[3], -1)
+
+    def test_equality(self):
+        first = Greedy().run(self.inst).encode()
+        second = NonDeterminist({'seed': 1}).run(self.inst).encode()
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, Greedy().run(self.inst).encode())
+        self.assertEqual(pickle.loads(pickle.dumps(first)), first)
+        self.assertLess(first.nbytes, 2000)
+        other = Instance.from_file(os.path.join(DATA_FOLDER, "jsp10"), use_cache=False)
+        self.assertRaises(ValueError, Solution.decode, other, first)
+
+    def test_stable_hash(self):
+        code = Greedy().run(self.inst).encode()
+        script = ("from src.scheduling.instance.instance import Instance;"
+                  "from src.scheduling.optim.constructive import Greedy;"
+                  f"print(Greedy().run(Instance.from_file({os.path.join(DATA_FOLDER, 'jsp100')!r}, use_cache=False)).encode().hash64)")
+        root = os.path.normpath(os.path.join(DATA_FOLDER, os.pardir))
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONHASHSEED='123'), check=True).stdout
+        self.assertEqual(int(output), code.hash64)
+
+
+class TestSolutionFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_csv(self):
+        for heuristic in (NonDeterminist({'seed': 1, 'optimize_on_off': True}), Greedy()):
+            sol = heuristic.run(self.inst)
+            expected = planning(sol)
+            operation_file, machine_file = sol.to_csv(os.path.join(self.folder, 'op.csv'),
+                                                      os.path.join(self.folder, 'mach.csv'))
+            with open(operation_file) as file:
+                lines = file.read().splitlines()
+            self.assertEqual(lines[0], "operation_id,machine_id,start_time")
+            self.assertEqual(len(lines), len(self.inst.operations) + 1)
+            loaded = Solution(self.inst)
+            loaded.from_csv(self.folder, 'op.csv', 'mach.csv')
+            self.assertEqual(planning(loaded), expected)
+            self.assertEqual(loaded.encode(), sol.encode())
+
+    def test_partial_csv(self):
+        inst = Instance.from_file(os.path.join(TEST_FOLDER_DATA, "jsp1"), use_cache=False)
+        sol = Solution(inst)
+        sol.schedule(inst.operations[0], inst.machines[1])
+        sol.schedule(inst.operations[1], inst.machines[0])
+        inst.machines[1].stop(inst.machines[1].available_time)
+        sol.schedule(inst.operations[2], inst.machines[1])
+        code = sol.encode()
+        current = os.getcwd()
+        os.chdir(self.folder)
+        try:
+            files = sol.to_csv()
+        finally:
+            os.chdir(current)
+        self.assertEqual(files, ("jsp1_sol_op.csv", "jsp1_sol_mach.csv"))
+        loaded = Solution(inst)
+        loaded.from_csv(self.folder, *files)
+        self.assertEqual(loaded.encode(), code)
+        with open(os.path.join(self.folder, 'bad.csv'), 'w') as file:
+            file.write("operation_id,machine_id,start_time\n0,99,0\n")
+        self.assertRaises(ValueError, loaded.from_csv, self.folder, 'bad.csv', files[1])
+
+    def test_tampered_machine_file(self):
+        sol = Greedy().run(self.inst)
+        sol.to_csv(os.path.join(self.folder, 'op.csv'), os.path.join(self.folder, 'mach.csv'))
+        with open(os.path.join(self.folder, 'mach.csv')) as file:
+            lines = file.read().splitlines()
+        machine_id, start, stop = lines[1].split(',')
+        self.assertEqual(start, '0')
+        # Démarrage de la première machine décalé : le planning reconstruit ne le suit pas
+        lines[1] = f"{machine_id},3,{stop}"
+        with open(os.path.join(self.folder, 'tampered.csv'), 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        loaded = Solution(self.inst)
+        self.assertRaises(ValueError, loaded.from_csv, self.folder, 'op.csv', 'tampered.csv')
+        code = sol.encode()
+        on_times = code.on_times.copy()
+        on_times[0] = 3
+        tampered = SolutionCode(code.instance_name, code.machines, code.starts, code.sequences,
+                                code.sequence_offsets, on_times, code.off_times, code.interval_offsets)
+        self.assertRaises(ValueError, Solution.decode, self.inst, tampered)
+        loaded.from_csv(self.folder, 'op.csv', 'mach.csv')
+        self.assertEqual(planning(loaded), planning(sol))
+
+    def test_binary(self):
+        codes = [NonDeterminist({'seed': seed}).run(self.inst).encode() for seed in range(20)]
+        code = codes[0]
+        back, end = SolutionCode.from_bytes(code.to_bytes())
+        self.assertEqual(back, code)
+        self.assertEqual(back.hash64, code.hash64)
+        self.assertEqual(end, len(code.to_bytes()))
+        self.assertLess(len(code.to_bytes()), code.nbytes)
+        sizes = []
+        for compress in (False, True):
+            path = os.path.join(self.folder, f'codes{compress}.bin')
+            save_codes(path, codes, compress)
+            self.assertEqual(load_codes(path), codes)
+            sizes.append(os.path.getsize(path))
+        self.assertLess(sizes[1], sizes[0])
+        sol = Solution.decode(self.inst, code)
+        path = os.path.join(self.folder, 'sol.bin')
+        sol.to_binary(path, compress=True)
+        loaded = Solution(self.inst)
+        loaded.from_binary(path)
+        self.assertEqual(planning(loaded), planning(sol))
+        self.assertRaises(ValueError, load_codes, __file__)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+'''
+Tests of the memo of evaluated schedules.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.arrays import InstanceArrays
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.optim.evaluation_cache import EvaluationCache, Evaluation, MISSING, cache_from_params, \
+    shared_cache
+from src.scheduling.optim.local_search import BestNeighborLocalSearch
+from src.scheduling.solution import Solution
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2, _evaluate
+from src.scheduling.optim.tabu_search import TabuSearch
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+NEIGHBORHOODS = [MyNeighborhood1, MyNeighborhood2]
+
+
+class TestEvaluationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+        self.sol = NonDeterminist({'seed': 1}).run(self.inst)
+
+    def test_fingerprint(self):
+        dispatch = self.sol.dispatch
+        key = EvaluationCache.fingerprint(self.inst, dispatch)
+        # Même séquence sur chaque machine dans un autre ordre de décisions : même planning
+        move = next(move for move in MyNeighborhood2(self.inst).moves(self.sol))
+        position, window = move
+        other = next((i for i in range(1, len(dispatch))
+                      if dispatch[i][1] is not dispatch[i - 1][1]
+                      and dispatch[i - 1][0] not in dispatch[i][0].predecessors), None)
+        interleaved = dispatch[:other - 1] + [dispatch[other], dispatch[other - 1]] + dispatch[other + 1:]
+        self.assertEqual(EvaluationCache.fingerprint(self.inst, interleaved), key)
+        neighbor = dispatch[:position] + window + dispatch[position + len(window):]
+        self.assertNotEqual(EvaluationCache.fingerprint(self.inst, neighbor), key)
+        cache = EvaluationCache()
+        self.assertEqual(cache.evaluation(self.sol), Evaluation.of(self.sol))
+        self.assertEqual(cache.evaluation(self.sol).evaluate, self.sol.evaluate)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_modified_instance(self):
+        # Même nom, énergies différentes : les valeurs en cache ne sont pas reprises
+        fields = self.inst.arrays.as_dict()
+        fields['energies'] = fields['energies'] * 3
+        other = Instance.from_arrays(self.inst.name, InstanceArrays(**fields))
+        self.assertRaises(ValueError, self.inst.arrays.energies.__imul__, 3)
+        sol = Solution(other)
+        sol.apply_actions(self.sol.actions())
+        cache = EvaluationCache()
+        moves = list(MyNeighborhood1(self.inst).moves(self.sol))[:5]
+        for move in moves:
+            _evaluate(self.sol, self.sol.dispatch, move, cache)
+        other_moves = list(MyNeighborhood1(other).moves(sol))[:5]
+        self.assertNotEqual(EvaluationCache.fingerprint(other, sol.dispatch),
+                            EvaluationCache.fingerprint(self.inst, self.sol.dispatch))
+        for move in other_moves:
+            self.assertEqual(_evaluate(sol, sol.dispatch, move, cache), _evaluate(sol, sol.dispatch, move))
+        self.assertEqual(cache.hits, 0)
+
+    def test_lru(self):
+        cache = EvaluationCache(max_entries=2)
+        cache.store(b'a', None)
+        cache.store(b'b', Evaluation(1, 1, 1, 1, 0))
+        self.assertIsNone(cache.lookup(b'a'))
+        cache.store(b'c', Evaluation(2, 2, 2, 2, 0))
+        # b est le moins récemment utilisé
+        self.assertIs(cache.lookup(b'b'), MISSING)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertAlmostEqual(cache.hit_rate, 0.5)
+
+        cache = EvaluationCache(max_entries=None, max_bytes=2000)
+        for i in range(100):
+            cache.store(bytes([i]) * 10, None)
+        self.assertLessEqual(cache.nbytes, 2000)
+        self.assertGreater(cache.evictions, 0)
+        self.assertIn(bytes([99]) * 10, cache)
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes, cache.evictions), (0, 0, 0))
+
+    def test_cached_evaluation(self):
+        cache = EvaluationCache()
+        dispatch = self.sol.dispatch
+        value = self.sol.evaluate
+        for Neighborhood in NEIGHBORHOODS:
+            for move in Neighborhood(self.inst).moves(self.sol):
+                expected = _evaluate(self.sol, dispatch, move)
+                self.assertEqual(_evaluate(self.sol, dispatch, move, cache), expected)
+                self.assertEqual(_evaluate(self.sol, dispatch, move, cache), expected)
+        self.assertEqual(cache.hits, cache.misses)
+        self.assertEqual(self.sol.evaluate, value)
+
+    def test_searches(self):
+        for heuristic, params in ((BestNeighborLocalSearch, {}), (TabuSearch, {'max_iterations': 40})):
+            expected = heuristic({'seed': 1, **params}).run(self.inst, NonDeterminist, NEIGHBORHOODS)
+            cache = EvaluationCache()
+            sol = heuristic({'seed': 1, 'cache': cache, **params}).run(self.inst, NonDeterminist, NEIGHBORHOODS)
+            self.assertEqual(sol.evaluate, expected.evaluate)
+            self.assertEqual(sol.dispatch, expected.dispatch)
+            self.assertGreater(cache.hits, 0)
+        self.assertIs(cache_from_params({'cache': True}), shared_cache())
+        self.assertIsNone(cache_from_params({}))
+        empty = EvaluationCache()
+        self.assertIs(cache_from_params({'cache': empty}), empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
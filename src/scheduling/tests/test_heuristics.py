@@ -0,0 +1,118 @@
+'''
+Tests of the warm start of the heuristics.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import os
+
+import numpy as np
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.arrays import InstanceArrays
+from src.scheduling.solution import Solution
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.optim.heuristics import initial_decisions, warm_start
+from src.scheduling.optim.local_search import BestNeighborLocalSearch
+from src.scheduling.optim.multi_start import multi_start
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+NEIGHBORHOODS = [MyNeighborhood1, MyNeighborhood2]
+
+
+def decisions(sol):
+    return [(operation.operation_id, machine.machine_id) for operation, machine in sol.dispatch]
+
+
+class TestWarmStart(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+        self.sol = BestNeighborLocalSearch({'seed': 1}).run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.code = self.sol.encode()
+
+    def tightened(self):
+        '''
+        Copy of the instance where the end time of the machine ending last is
+        too early for its last operation.
+        '''
+        self.sol.evaluate
+        machine = max(self.inst.machines, key=lambda m: m.stop_times[-1])
+        fields = self.inst.arrays.as_dict()
+        end_times = fields['end_times'].copy()
+        end_times[machine.index] = machine.stop_times[-1] + machine.tear_down_time - 1
+        fields['end_times'] = end_times
+        return Instance.from_arrays(self.inst.name, InstanceArrays(**fields)), machine
+
+    def test_same_instance(self):
+        value = self.sol.evaluate
+        dispatch = decisions(self.sol)
+        # Le code donne les décisions par date de début (voir Solution.load)
+        by_start = decisions(Solution.decode(self.inst, self.code))
+        for initial, expected in ((self.sol, dispatch), (self.code, by_start), (dispatch, dispatch)):
+            self.assertEqual(initial_decisions(self.inst, initial), expected)
+            sol = Greedy({'initial': initial}).run(self.inst)
+            self.assertEqual(decisions(sol), expected)
+            self.assertEqual(sol.evaluate, value)
+
+    def test_tightened_end_time(self):
+        inst, machine = self.tightened()
+        self.assertRaises(ValueError, Solution.decode, inst, self.code)
+        partial = warm_start(inst, self.code)
+        kept = decisions(partial)
+        self.assertLess(len(kept), len(inst.operations))
+        # Seules les décisions devenues impossibles et celles qui en dépendent sont perdues
+        self.assertGreater(len(kept), len(inst.operations) - 2 * len(inst.machines))
+        self.assertTrue(set(kept) <= set(decisions(self.sol)))
+        for heuristic in (Greedy({'initial': self.code}), NonDeterminist({'seed': 1, 'initial': self.code})):
+            sol = heuristic.run(inst)
+            self.assertTrue(sol.is_feasible)
+            self.assertEqual(decisions(sol)[:len(kept)], kept)
+
+        cold = BestNeighborLocalSearch({'seed': 1})
+        cold_sol = cold.run(inst, NonDeterminist, NEIGHBORHOODS)
+        warm = BestNeighborLocalSearch({'seed': 1, 'initial': self.code})
+        warm_sol = warm.run(inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertTrue(warm_sol.is_feasible)
+        self.assertLessEqual(warm_sol.evaluate, cold_sol.evaluate)
+        self.assertLess(warm.trace[-1][1], cold.trace[-1][1])
+
+    def test_added_job(self):
+        arrays = self.inst.arrays
+        last_job = arrays.operation_jobs == arrays.operation_jobs.max()
+        # Nouveau job : copie du dernier job avec de nouveaux ids
+        new_ids = arrays.operation_ids.max() + 1 + np.arange(last_job.sum())
+        machines = [tuple(int(getattr(arrays, name)[m]) for name in
+                          ('machine_ids', 'set_up_times', 'set_up_energies', 'tear_down_times',
+                           'tear_down_energies', 'min_consumptions', 'end_times'))
+                    for m in range(arrays.nb_machines)]
+        inst = Instance.from_arrays(self.inst.name, InstanceArrays.from_dense(
+            np.concatenate((arrays.operation_ids, new_ids)),
+            np.concatenate((arrays.job_ids[arrays.operation_jobs], [arrays.job_ids.max() + 1] * len(new_ids))),
+            np.vstack((arrays.durations, arrays.durations[last_job])),
+            np.vstack((arrays.energies, arrays.energies[last_job])),
+            np.vstack((arrays.eligible, arrays.eligible[last_job])), machines))
+        self.assertRaises(ValueError, initial_decisions, inst, self.code)
+        expected = decisions(Solution.decode(self.inst, self.code))
+        partial = warm_start(inst, Solution.decode(self.inst, self.code))
+        self.assertEqual(decisions(partial), expected)
+        sol = Greedy({'initial': expected}).run(inst)
+        self.assertEqual(decisions(sol)[:len(expected)], expected)
+        self.assertTrue(all(operation.assigned for operation in inst.operations) or not sol.is_feasible)
+
+    def test_multi_start(self):
+        inst, _ = self.tightened()
+        result = multi_start(inst, NonDeterminist, params={'nb_runs': 3, 'seed': 0, 'workers': 2,
+                                                           'initial': self.sol})
+        kept = warm_start(inst, self.sol).encode()
+        best = result.best.encode()
+        # Les décisions conservées commencent la séquence de chaque machine
+        for m in range(len(inst.machines)):
+            sequence = kept.sequence(m).tolist()
+            self.assertEqual(best.sequence(m).tolist()[:len(sequence)], sequence)
+
+
+if __name__ == "__main__":
+    unittest.main()
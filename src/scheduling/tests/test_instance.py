@@ -4,19 +4,24 @@ import shutil
 import os
 import csv
 
+from unittest import mock
+
 from src.scheduling.instance.instance import Instance
+from src.scheduling.instance import cache
+from src.scheduling.tests.test_utils import TEST_FOLDER_DATA
 
 class TestInstance(unittest.TestCase):
 
     def setUp(self):
         self.test_dir = tempfile.mkdtemp()
-        self._create_test_instance_files(self.test_dir)
-        self.instance = Instance.from_file(self.test_dir)
+        TestInstance._create_test_instance_files(self.test_dir)
+        self.instance = Instance.from_file(self.test_dir, use_cache=False)
 
     def tearDown(self):
         shutil.rmtree(self.test_dir)
 
-    def _create_test_instance_files(self, directory):
+    @staticmethod
+    def _create_test_instance_files(directory):
         prefix = os.path.basename(directory)
         operations_file = os.path.join(directory, f'{prefix}_op.csv')
         machines_file = os.path.join(directory, f'{prefix}_mach.csv')
@@ -125,6 +130,37 @@ class TestInstance(unittest.TestCase):
         self.assertIn(2, op2.available_machines)
         self.assertEqual(len(op2.available_machines), 1)  # Only machine 2
 
+    def test_arrays(self):
+        arrays = self.instance.arrays
+        self.assertEqual(arrays.durations.shape, (3, 2))
+        self.assertEqual(arrays.energies.shape, (3, 2))
+        self.assertEqual(arrays.eligible.tolist(), [[True, True], [False, True], [True, True]])
+        self.assertEqual(arrays.durations.tolist(), [[5, 6], [0, 3], [4, 5]])
+        self.assertEqual(arrays.set_up_times.tolist(), [1.0, 1.5])
+        self.assertEqual(arrays.min_consumptions.tolist(), [0.5, 0.8])
+        self.assertEqual(arrays.predecessors.tolist(), [-1, 0, -1])
+        self.assertEqual(arrays.successors.tolist(), [1, -1, -1])
+        self.assertEqual(arrays.operation_jobs.tolist(), [0, 0, 1])
+        # Sans colonne end_time, tout planning doit tenir avant la fin
+        self.assertTrue((arrays.end_times >= 5 + 3 + 5 + 1.0 + 1.0 + 1.5 + 1.5).all())
+
+    def test_objects_are_views_on_arrays(self):
+        arrays = self.instance.arrays
+        for operation in self.instance.operations:
+            i = operation.index
+            for machine in self.instance.machines:
+                m = machine.index
+                if arrays.eligible[i, m]:
+                    self.assertEqual(operation.get_duration_for_machine(machine.machine_id), arrays.durations[i, m])
+                    self.assertEqual(operation.get_energy_for_machine(machine.machine_id), arrays.energies[i, m])
+                    self.assertEqual(machine.get_operation_cost(operation),
+                                     (arrays.durations[i, m], arrays.energies[i, m]))
+                else:
+                    self.assertIsNone(operation.get_duration_for_machine(machine.machine_id))
+                    self.assertEqual(machine.get_operation_cost(operation), (None, None))
+        self.assertIsNone(self.instance.get_operation(1).get_duration_for_machine(999))
+        self.assertEqual(self.instance.get_machine(2).set_up_time, arrays.set_up_times[1])
+
     def test_nonexistent_ids_raise_errors(self):
         # Test that requesting non-existent IDs raises KeyError
         with self.assertRaises(KeyError):
@@ -137,5 +173,128 @@ class TestInstance(unittest.TestCase):
             self.instance.get_operation(999)
 
 
+class TestLongFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.name = os.path.basename(self.test_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, op_rows, mach_rows):
+        with open(os.path.join(self.test_dir, f'{self.name}_op.csv'), 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['job', 'operation', 'machine', 'processing_time', 'energy_consumption'])
+            writer.writerows(op_rows)
+        with open(os.path.join(self.test_dir, f'{self.name}_mach.csv'), 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['machine_id', 'set_up_time', 'set_up_energy', 'tear_down_time',
+                             'tear_down_energy', 'min_consumption', 'end_time'])
+            writer.writerows(mach_rows)
+        return Instance.from_file(self.test_dir, use_cache=False)
+
+    def test_jsp1(self):
+        inst = Instance.from_file(TEST_FOLDER_DATA + os.path.sep + "jsp1", use_cache=False)
+        self.assertEqual((inst.nb_jobs, inst.nb_operations, inst.nb_machines), (2, 4, 4))
+        self.assertEqual(inst.arrays.durations[0].tolist(), [10, 12, 16, 8])
+        self.assertEqual(inst.arrays.energies[3].tolist(), [9, 12, 15, 11])
+        self.assertTrue(inst.arrays.eligible.all())
+        self.assertEqual(inst.arrays.end_times.tolist(), [100, 120, 130, 110])
+        self.assertEqual(inst.get_machine(1).end_time, 120)
+        self.assertEqual(list(inst.get_operation(3).predecessors), [inst.get_operation(2)])
+        self.assertEqual([op.operation_id for op in inst.get_job(1).operations], [2, 3])
+        self.assertTrue(inst.validate_instance())
+        # Opérations sans __dict__ (slots)
+        self.assertFalse(hasattr(inst.get_operation(0), '__dict__'))
+
+    def test_partial_eligibility(self):
+        inst = self._write([[0, 0, 1, 4, 2], [0, 1, 0, 3, 1], [0, 1, 1, 5, 2]],
+                           [[0, 1, 1, 1, 1, 1, 50], [1, 2, 2, 2, 2, 1, 60]])
+        self.assertEqual(inst.arrays.eligible.tolist(), [[False, True], [True, True]])
+        self.assertEqual(inst.get_operation(0).available_machines, [1])
+        self.assertIsNone(inst.get_operation(0).get_duration_for_machine(0))
+        self.assertEqual(inst.get_operation(1).get_energy_for_machine(1), 2)
+
+    def test_unsorted_operations_and_float_values(self):
+        inst = self._write([[1, 2, 0, 4.5, 2], [0, 0, 0, 3, 1], [0, 1, 0, 2, 1]],
+                           [[0, 1, 1, 1, 1, 1, 50]])
+        self.assertEqual(inst.arrays.operation_ids.tolist(), [0, 1, 2])
+        self.assertEqual(inst.arrays.durations[:, 0].tolist(), [3.0, 2.0, 4.5])
+        self.assertEqual(inst.arrays.predecessors.tolist(), [-1, 0, -1])
+
+    def test_non_consecutive_rows(self):
+        with self.assertRaises(ValueError):
+            self._write([[0, 0, 0, 4, 2], [0, 1, 0, 3, 1], [0, 0, 1, 5, 2]],
+                        [[0, 1, 1, 1, 1, 1, 50], [1, 2, 2, 2, 2, 1, 60]])
+
+    def test_unknown_machine(self):
+        with self.assertRaises(KeyError):
+            self._write([[0, 0, 3, 4, 2]], [[0, 1, 1, 1, 1, 1, 50]])
+
+
+class TestInstanceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        TestInstance._create_test_instance_files(self.test_dir)
+        self.name = os.path.basename(self.test_dir)
+        # Cache dans un dossier temporaire distinct des fichiers CSV
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_path = cache.cache_file(self.test_dir, self.name, self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def _assert_same_instance(self, inst1, inst2):
+        for name, array in inst1.arrays.as_dict().items():
+            self.assertEqual(array.tolist(), getattr(inst2.arrays, name).tolist(), name)
+
+    def test_cache_is_used(self):
+        inst1 = Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        self.assertTrue(os.path.exists(self.cache_path))
+        with mock.patch.object(Instance, 'read_arrays', side_effect=AssertionError('csv parsed')):
+            inst2 = Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        self._assert_same_instance(inst1, inst2)
+        self.assertEqual(inst2.get_operation(1).get_duration_for_machine(2), 6)
+
+    def test_cache_disabled(self):
+        Instance.from_file(self.test_dir, use_cache=False)
+        self.assertFalse(os.listdir(self.cache_dir))
+        self.assertFalse(os.path.exists(cache.cache_file(self.test_dir, self.name)))
+
+    def test_cache_dir(self):
+        Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        self.assertTrue(os.path.exists(self.cache_path))
+        self.assertFalse(os.path.exists(cache.cache_file(self.test_dir, self.name)))
+        self.assertEqual(os.path.dirname(cache.cache_file(self.test_dir, self.name)), self.test_dir)
+
+    def test_cache_invalidated_when_csv_changes(self):
+        Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        machines_file = os.path.join(self.test_dir, f'{self.name}_mach.csv')
+        with open(machines_file, 'a', newline='') as csvfile:
+            csv.writer(csvfile).writerow([3, 2.0, 2.0, 2.0, 2.0, 1.0])
+        inst = Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        self.assertEqual(inst.nb_machines, 3)
+        with mock.patch.object(Instance, 'read_arrays', side_effect=AssertionError('csv parsed')):
+            self.assertEqual(Instance.from_file(self.test_dir, cache_dir=self.cache_dir).nb_machines, 3)
+
+    def test_cache_fresh_when_csv_touched(self):
+        Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        machines_file = os.path.join(self.test_dir, f'{self.name}_mach.csv')
+        stat = os.stat(machines_file)
+        os.utime(machines_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with mock.patch.object(Instance, 'read_arrays', side_effect=AssertionError('csv parsed')):
+            Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+
+    def test_corrupted_cache_is_rebuilt(self):
+        Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        with open(self.cache_path, 'wb') as file:
+            file.write(b'not a npz file')
+        inst = Instance.from_file(self.test_dir, cache_dir=self.cache_dir)
+        self.assertEqual(inst.nb_operations, 3)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+'''
+Tests of the instrumentation of the hot paths.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.instance.machine import Machine
+from src.scheduling.solution import Solution
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.optim.local_search import FirstNeighborLocalSearch
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2
+from src.scheduling.optim.tabu_search import TabuSearch
+from src.scheduling import instrumentation
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    def test_disabled(self):
+        schedule = Solution.schedule
+        energy = vars(Machine)['total_energy_consumption']
+        with instrumentation.collect():
+            self.assertIsNot(Solution.schedule, schedule)
+            self.assertTrue(instrumentation.is_active())
+            with self.assertRaises(RuntimeError):
+                with instrumentation.collect():
+                    pass
+        self.assertIs(Solution.schedule, schedule)
+        self.assertIs(vars(Machine)['total_energy_consumption'], energy)
+        self.assertFalse(instrumentation.is_active())
+        instrumentation.count('accepted_moves')
+
+    def test_constructive(self):
+        sol, stats = Greedy().run_instrumented(self.inst)
+        self.assertEqual(stats['Solution.schedule'], len(self.inst.operations))
+        self.assertEqual(stats['Machine.add_operation'], len(self.inst.operations))
+        self.assertEqual(stats['Solution.stop_machines'], 1)
+        self.assertEqual(stats['accepted_moves'], 0)
+        self.assertLessEqual(stats.times['Machine.add_operation'], stats.times['Solution.schedule'])
+        self.assertLessEqual(stats.times['Solution.schedule'], stats.wall_time)
+        self.assertEqual(sol.evaluate, Greedy().run(self.inst).evaluate)
+        self.assertIn('Solution.schedule', stats.report())
+
+    def test_local_search(self):
+        heuristic = FirstNeighborLocalSearch({'seed': 2, 'max_iterations': 3})
+        sol, stats = heuristic.run_instrumented(self.inst, NonDeterminist, MyNeighborhood1)
+        self.assertEqual(stats['accepted_moves'], 3)
+        # Un planning par voisin exploré et par voisin retenu, plus la solution initiale
+        self.assertEqual(stats['Solution.stop_machines'],
+                         stats['neighborhood.evaluate'] + stats['neighborhood.neighbor'] + 1)
+        self.assertEqual(stats['neighborhood.neighbor'], 3)
+        self.assertEqual(sol.evaluate, heuristic.run(self.inst, NonDeterminist, MyNeighborhood1).evaluate)
+        self.assertEqual(stats.as_dict()['counters'], {'accepted_moves': 3})
+
+    def test_tabu_search(self):
+        # Les évaluations des autres modules passent par les fonctions mesurées
+        heuristic = TabuSearch({'seed': 0, 'max_iterations': 5})
+        sol, stats = heuristic.run_instrumented(self.inst, NonDeterminist, [MyNeighborhood1, MyNeighborhood2])
+        self.assertGreater(stats['neighborhood.evaluate'], 0)
+        # Chaque évaluation annule le voisin construit
+        self.assertLessEqual(2 * stats['neighborhood.evaluate'], stats['Solution.rollback'])
+        self.assertEqual(heuristic.stopped, 'max_iterations')
+        self.assertEqual(stats['accepted_moves'], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+'''
+Tests of the local searches.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import time
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.optim.local_search import FirstNeighborLocalSearch, BestNeighborLocalSearch, \
+    SimulatedAnnealing
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2
+from src.scheduling.optim.tabu_search import TabuSearch
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+NEIGHBORHOODS = [MyNeighborhood1, MyNeighborhood2]
+
+
+class TestLocalSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    def check_trace(self, heuristic, sol):
+        self.assertIs(heuristic.incumbent, sol)
+        values = [value for _, _, value in heuristic.trace]
+        self.assertEqual(values[-1], sol.evaluate)
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_local_optimum(self):
+        for Class in (FirstNeighborLocalSearch, BestNeighborLocalSearch):
+            heuristic = Class({'seed': 1})
+            sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+            self.assertEqual(heuristic.stopped, 'local_optimum')
+            self.check_trace(heuristic, sol)
+            for Neighborhood in NEIGHBORHOODS:
+                self.assertIs(Neighborhood(self.inst).best_neighbor(sol), sol)
+
+    def test_budgets(self):
+        for Class in (FirstNeighborLocalSearch, BestNeighborLocalSearch):
+            heuristic = Class({'seed': 1, 'max_evaluations': 100})
+            sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+            self.assertEqual(heuristic.stopped, 'max_evaluations')
+            self.check_trace(heuristic, sol)
+            # Au plus le voisin retenu est construit après la dernière évaluation
+            self.assertLessEqual(heuristic.trace[-1][1], 101)
+
+            heuristic = Class({'seed': 1})
+            start = time.perf_counter()
+            sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS, {'time_limit': 0.05})
+            self.assertEqual(heuristic.stopped, 'time_limit')
+            self.assertLess(time.perf_counter() - start, 0.05 + 0.1)
+            self.check_trace(heuristic, sol)
+
+    def test_budgets_in_turn(self):
+        # Deux recherches menées en alternance ont chacune leur nombre d'évaluations
+        searches = [Class({'seed': 1, 'max_evaluations': 100})
+                    for Class in (FirstNeighborLocalSearch, BestNeighborLocalSearch)]
+        iterators = [search.iterate(self.inst, NonDeterminist, NEIGHBORHOODS) for search in searches]
+        while iterators:
+            for iterator in list(iterators):
+                if next(iterator, None) is None:
+                    iterators.remove(iterator)
+        for search in searches:
+            self.assertEqual(search.stopped, 'max_evaluations')
+            alone = type(search)({'seed': 1, 'max_evaluations': 100})
+            alone.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+            self.assertEqual([(evaluations, value) for _, evaluations, value in search.trace],
+                             [(evaluations, value) for _, evaluations, value in alone.trace])
+
+    def test_callback(self):
+        progress = []
+
+        def cut(state):
+            progress.append(state)
+            return state.iterations == 2
+
+        heuristic = BestNeighborLocalSearch({'seed': 1, 'callback': cut})
+        sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'callback')
+        self.assertEqual([state.iterations for state in progress], [0, 1, 2])
+        self.assertIs(progress[-1].solution, sol)
+        self.assertEqual([(p.time, p.evaluations, p.value) for p in progress], heuristic.trace)
+
+        # Même recherche en itérant : les premières améliorations sont les mêmes
+        heuristic = BestNeighborLocalSearch({'seed': 1})
+        values = []
+        for state in heuristic.iterate(self.inst, NonDeterminist, NEIGHBORHOODS):
+            values.append(state.value)
+            if len(values) == 3:
+                break
+        self.assertEqual(values, [state.value for state in progress])
+        self.assertEqual(heuristic.incumbent.evaluate, values[-1])
+
+    def test_max_iterations(self):
+        heuristic = FirstNeighborLocalSearch({'seed': 1, 'max_iterations': 3})
+        sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'max_iterations')
+        self.assertEqual(len(heuristic.trace), 4)
+        self.check_trace(heuristic, sol)
+
+    def test_parallel_exploration(self):
+        serial = BestNeighborLocalSearch({'seed': 1, 'max_iterations': 5})
+        sol = serial.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        parallel = BestNeighborLocalSearch({'seed': 1, 'max_iterations': 5, 'workers': 2})
+        parallel_sol = parallel.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.check_trace(parallel, parallel_sol)
+        # Même trajectoire qu'avec un seul processus
+        self.assertEqual([value for _, _, value in parallel.trace], [value for _, _, value in serial.trace])
+        self.assertEqual(parallel_sol.encode().hash64, sol.encode().hash64)
+        self.assertIsNone(parallel._explorer)
+
+        heuristic = BestNeighborLocalSearch({'seed': 1, 'workers': 2, 'time_limit': 0.2})
+        start = time.perf_counter()
+        heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'time_limit')
+        self.assertLess(time.perf_counter() - start, 0.2 + 0.5)
+
+    def test_optimize_on_off(self):
+        # Les voisins sont évalués sans arrêts des machines : la solution initiale aussi
+        inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp55"), use_cache=False)
+        for Class in (FirstNeighborLocalSearch, BestNeighborLocalSearch, TabuSearch):
+            plain = Class({'seed': 0, 'max_iterations': 100}).run(inst, Greedy, MyNeighborhood1)
+            heuristic = Class({'seed': 0, 'max_iterations': 100, 'optimize_on_off': True})
+            sol = heuristic.run(inst, Greedy, MyNeighborhood1)
+            self.assertLessEqual(sol.evaluate, plain.evaluate)
+            self.assertTrue(sol.is_feasible)
+            self.assertEqual(heuristic.trace[-1][2], sol.evaluate)
+            expected = plain.clone()
+            expected.optimize_on_off()
+            self.assertEqual(sol.evaluate, min(plain.evaluate, expected.evaluate))
+
+
+class TestSimulatedAnnealing(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    def test_incremental_objective(self):
+        heuristic = SimulatedAnnealing({'seed': 2, 'max_moves': 5000, 'compact': False})
+        sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'max_moves')
+        self.assertEqual(heuristic.evaluated_moves, 5000)
+        self.assertGreater(heuristic.accepted_moves, 0)
+        self.assertGreater(heuristic.moves_per_second, 0)
+        # La valeur suivie incrémentalement est celle de la solution construite
+        values = [value for _, _, value in heuristic.trace]
+        self.assertEqual(values, sorted(values, reverse=True))
+        self.assertEqual(sol.evaluate, values[-1])
+        self.assertTrue(sol.is_feasible)
+        self.assertLess(sol.evaluate, values[0])
+        same = SimulatedAnnealing({'seed': 2, 'max_moves': 5000, 'compact': False})
+        self.assertEqual(same.run(self.inst, NonDeterminist, NEIGHBORHOODS).evaluate, sol.evaluate)
+
+    def test_schedules(self):
+        for params in ({'cooling': 'lundy_mees', 'beta': 10}, {'cooling': lambda t0, t: t - t0 / 100},
+                       {'alpha': 0.5, 'initial_temperature': 10}):
+            heuristic = SimulatedAnnealing({'seed': 1, 'reheat_after': None, 'max_moves': None, **params})
+            sol = heuristic.run(self.inst, NonDeterminist, MyNeighborhood1)
+            self.assertEqual(heuristic.stopped, 'frozen')
+            self.assertEqual(heuristic.reheats, 0)
+            self.assertLessEqual(sol.evaluate, heuristic.trace[0][2])
+        heuristic = SimulatedAnnealing({'seed': 1, 'reheat_after': 2, 'max_moves': 2000})
+        heuristic.run(self.inst, NonDeterminist, MyNeighborhood2)
+        self.assertGreater(heuristic.reheats, 0)
+        heuristic = SimulatedAnnealing({'seed': 1, 'max_moves': None, 'time_limit': 0.1})
+        heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'time_limit')
+
+    def test_compact(self):
+        heuristic = SimulatedAnnealing({'seed': 3, 'max_moves': 3000})
+        sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        fixed = SimulatedAnnealing({'seed': 3, 'max_moves': 3000, 'compact': False})
+        self.assertLessEqual(sol.evaluate, fixed.run(self.inst, NonDeterminist, NEIGHBORHOODS).evaluate)
+
+    def test_optimize_on_off(self):
+        # La solution initiale est construite sans arrêts : EnergyDelta demande une période par machine
+        heuristic = SimulatedAnnealing({'seed': 3, 'max_moves': 3000, 'optimize_on_off': True})
+        sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertTrue(sol.is_feasible)
+        plain = SimulatedAnnealing({'seed': 3, 'max_moves': 3000}).run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        expected = plain.clone()
+        expected.optimize_on_off()
+        self.assertEqual(sol.evaluate, min(plain.evaluate, expected.evaluate))
+        self.assertEqual(heuristic.trace[-1][2], sol.evaluate)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,31 @@
 import unittest
+import itertools
+import random
+from unittest import mock
+
 from src.scheduling.instance.machine import Machine
 from src.scheduling.instance.operation import Operation
+from src.scheduling.instance.catalog import InstanceCatalog
+from src.scheduling.solution import Solution
+from src.scheduling.optim.constructive import Greedy, NonDeterminist
+from src.scheduling.tests.test_utils import DATA_FOLDER
 
 
 class TestMachine(unittest.TestCase):
 
     def setUp(self):
+        # Coûts des opérations sans instance : {opération: {machine: (durée, énergie)}},
+        # les méthodes sont remplacées au niveau de la classe (Operation a des slots)
+        self.costs = {}
+        for name, position in (('get_duration_for_machine', 0), ('get_energy_for_machine', 1)):
+            patcher = mock.patch.object(Operation, name, self._cost_getter(position))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(Operation, 'can_be_executed_on_machine',
+                                    lambda op, machine_id: machine_id in self.costs.get(op, {}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         self.machine = Machine(
             machine_id=1,
             set_up_time=5,
@@ -18,14 +38,16 @@ class TestMachine(unittest.TestCase):
 
         # Création d'une opération valide
         self.op1 = Operation(job_id=1, operation_id=1)
-        self.op1.get_duration_for_machine = lambda machine_id: 10 if machine_id == 1 else None
-        self.op1.get_energy_for_machine = lambda machine_id: 20 if machine_id == 1 else None
-        self.op1.can_be_executed_on_machine = lambda machine_id: machine_id == 1
+        self.costs[self.op1] = {1: (10, 20)}
 
         self.op2 = Operation(job_id=1, operation_id=2)
-        self.op2.get_duration_for_machine = lambda machine_id: 15 if machine_id == 1 else None
-        self.op2.get_energy_for_machine = lambda machine_id: 30 if machine_id == 1 else None
-        self.op2.can_be_executed_on_machine = lambda machine_id: machine_id == 1
+        self.costs[self.op2] = {1: (15, 30)}
+
+    def _cost_getter(self, position):
+        def getter(operation, machine_id):
+            cost = self.costs.get(operation, {}).get(machine_id)
+            return None if cost is None else cost[position]
+        return getter
 
     def test_add_operation_and_energy_consumption(self):
         start_time1 = self.machine.add_operation(self.op1, 0)
@@ -61,9 +83,6 @@ class TestMachine(unittest.TestCase):
 
     def test_cannot_execute_on_machine(self):
         bad_op = Operation(job_id=1, operation_id=99)
-        bad_op.get_duration_for_machine = lambda machine_id: None
-        bad_op.get_energy_for_machine = lambda machine_id: None
-        bad_op.can_be_executed_on_machine = lambda machine_id: False
         with self.assertRaises(ValueError):
             self.machine.add_operation(bad_op, 0)
 
@@ -78,13 +97,116 @@ class TestMachine(unittest.TestCase):
             end_time=20
         )
         op = Operation(job_id=2, operation_id=1)
-        op.get_duration_for_machine = lambda machine_id: 5
-        op.get_energy_for_machine = lambda machine_id: 5
-        op.can_be_executed_on_machine = lambda machine_id: True
+        self.costs[op] = {2: (5, 5)}
         machine.add_operation(op, 0)
         with self.assertRaises(ValueError):
             machine.stop(15)  # Trop tard pour shutdown proprement
 
+    def test_optimal_intervals(self):
+        # set up 5 + tear down 3 = 8, set up + tear down energy 15, consommation à vide 2
+        operations = []
+        for operation_id, start in enumerate([5, 20, 45, 55, 67, 85]):
+            op = Operation(job_id=operation_id, operation_id=operation_id)
+            self.costs[op] = {1: (5, 1)}
+            self.machine.add_operation(op, start)
+            operations.append(op)
+        # Intervalles : 10 (30 > 15), 20, 5 (trop court), 7 (< 8), 13 (26 > 15)
+        self.assertEqual(self.machine.optimal_intervals(), [(0, 10), (15, 25), (40, 72), (80, 90)])
+        # Consommation à vide 1 : seul l'intervalle de 20 justifie un arrêt
+        self.machine._min_consumption = 1
+        self.assertEqual(self.machine.optimal_intervals(), [(0, 25), (40, 90)])
+
+
+def recompute_totals(machine: Machine):
+    '''
+    Recomputes (working time, idle time, energy) of a machine from its planning.
+    '''
+    stops = machine._stop_times
+    working_time = idle_time = 0
+    for i, start in enumerate(machine.start_times):
+        if i < len(stops):
+            end, off = stops[i], stops[i] + machine.tear_down_time
+        else:
+            end = off = machine.end_time
+        processing = sum(op.duration for op in machine.scheduled_operations
+                         if start <= op.start_time < end)
+        working_time += off - start
+        idle_time += end - start - machine.set_up_time - processing
+    energy = (len(machine.start_times) * machine.set_up_energy
+              + len(stops) * machine.tear_down_energy
+              + sum(op.energy for op in machine.scheduled_operations)
+              + idle_time * machine.min_consumption)
+    return working_time, idle_time, energy
+
+
+class TestMachineAccounting(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = InstanceCatalog(DATA_FOLDER, use_cache=False)
+
+    def _assert_totals(self, sol: Solution, context: str):
+        for machine in sol.inst.machines:
+            self.assertEqual((machine.working_time, machine._calculate_idle_time(),
+                              machine.total_energy_consumption),
+                             recompute_totals(machine), f"{context} {machine}")
+
+    def test_constructive_heuristics(self):
+        for inst in self.catalog:
+            for heuristic in (Greedy(), NonDeterminist({'seed': 0})):
+                sol = heuristic.run(inst)
+                self._assert_totals(sol, f"{inst} {type(heuristic).__name__}")
+
+    def test_random_start_stop(self):
+        # Plannings avec plusieurs périodes d'allumage par machine
+        rng = random.Random(0)
+        for inst in self.catalog:
+            sol = Solution(inst)
+            while sol.available_operations:
+                operation = rng.choice(sol.available_operations)
+                machine = inst.get_machine(rng.choice(operation.available_machines))
+                if machine.is_running and rng.random() < 0.3:
+                    machine.stop(machine.available_time)
+                try:
+                    sol.schedule(operation, machine)
+                except ValueError:
+                    break
+                self._assert_totals(sol, str(inst))
+            sol.stop_machines()
+            self._assert_totals(sol, str(inst))
+
+    def test_optimize_on_off(self):
+        for inst in self.catalog:
+            sol = NonDeterminist({'seed': 0}).run(inst)
+            starts = [(op.assigned_to, op.start_time) for op in inst.operations]
+            energy = sol.total_energy_consumption
+            feasible = sol.is_feasible
+            sol.optimize_on_off()
+            self.assertEqual([(op.assigned_to, op.start_time) for op in inst.operations], starts)
+            self.assertEqual(sol.is_feasible, feasible)
+            self.assertLessEqual(sol.total_energy_consumption, energy)
+            self._assert_totals(sol, str(inst))
+            for machine in inst.machines:
+                self.assertEqual(machine.total_energy_consumption, min_energy(machine), f"{inst} {machine}")
+
+
+def min_energy(machine: Machine):
+    '''
+    Minimum energy of the machine over all the sets of idle gaps where it is shut down.
+    '''
+    operations = machine.scheduled_operations
+    if not operations:
+        return 0
+    gaps = [b.start_time - a.end_time for a, b in zip(operations, operations[1:])]
+    possible = [i for i, gap in enumerate(gaps) if gap >= machine.set_up_time + machine.tear_down_time]
+    fixed = sum(op.energy for op in operations)
+    best = None
+    for subset in itertools.product((False, True), repeat=len(possible)):
+        off = {i for i, shut in zip(possible, subset) if shut}
+        energy = fixed + (len(off) + 1) * (machine.set_up_energy + machine.tear_down_energy) \
+            + machine.min_consumption * sum(gap for i, gap in enumerate(gaps) if i not in off)
+        best = energy if best is None else min(best, energy)
+    return best
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+'''
+Tests of the multi-start driver.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import os
+import time
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.optim.local_search import BestNeighborLocalSearch, FirstNeighborLocalSearch
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2
+from src.scheduling.optim.multi_start import MultiStart, multi_start, run_seed
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+class TestMultiStart(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    @staticmethod
+    def values(result):
+        return [(r.run, r.seed, r.evaluate, r.cmax, r.energy) for r in result.runs]
+
+    def test_run_seed(self):
+        seeds = [run_seed(7, run) for run in range(10)]
+        self.assertEqual(seeds, [run_seed(7, run) for run in range(10)])
+        self.assertEqual(len(set(seeds)), 10)
+        self.assertNotEqual(seeds, [run_seed(8, run) for run in range(10)])
+        result = multi_start(self.inst, NonDeterminist, params={'nb_runs': 3, 'seed': 7, 'workers': 1})
+        self.assertEqual([r.seed for r in result.runs], seeds[:3])
+
+    def test_serial_and_parallel(self):
+        serial = multi_start(self.inst, NonDeterminist, params={'nb_runs': 6, 'seed': 3, 'workers': 1})
+        parallel = multi_start(self.inst, NonDeterminist, params={'nb_runs': 6, 'seed': 3, 'workers': 2})
+        self.assertEqual(self.values(serial), self.values(parallel))
+        self.assertEqual(serial.stopped, 'runs')
+        best = min(r.evaluate for r in serial.runs)
+        self.assertEqual(serial.best.evaluate, best)
+        self.assertEqual(parallel.best.evaluate, best)
+        self.assertEqual(serial.best_run.evaluate, best)
+        # Chaque exécution est celle de NonDeterminist avec la graine du flux
+        run = serial.runs[2]
+        self.assertEqual(NonDeterminist({'seed': run.seed}).run(self.inst).evaluate, run.evaluate)
+
+    def test_stops(self):
+        for workers in (1, 2):
+            result = multi_start(self.inst, params={'nb_runs': 20, 'seed': 0, 'workers': workers,
+                                                    'target': float('inf')})
+            self.assertEqual(result.stopped, 'target')
+            self.assertLessEqual(len(result.runs), workers)
+            result = multi_start(self.inst, params={'nb_runs': 10 ** 6, 'seed': 0, 'workers': workers,
+                                                    'time_limit': 0.3})
+            self.assertEqual(result.stopped, 'time_limit')
+            self.assertLess(len(result.runs), 10 ** 6)
+            self.assertEqual(result.best.evaluate, result.best_run.evaluate)
+
+    def test_time_limit_of_the_runs(self):
+        # Chaque exécution reçoit le temps restant : les recherches en cours rendent leur solution
+        for workers in (1, 2):
+            start = time.perf_counter()
+            heur = MultiStart({'heuristic': BestNeighborLocalSearch,
+                               'run_args': (NonDeterminist, [MyNeighborhood1, MyNeighborhood2]),
+                               'seed': 0, 'workers': workers, 'time_limit': 0.5})
+            sol = heur.run(self.inst)
+            self.assertLess(time.perf_counter() - start, 0.5 + 1.5)
+            self.assertIsNotNone(sol)
+            self.assertEqual(heur.result.stopped, 'time_limit')
+            self.assertEqual(len(heur.result.runs), workers)
+            self.assertEqual(sol.evaluate, heur.result.best_run.evaluate)
+        self.assertRaises(ValueError, multi_start, self.inst, params={'nb_runs': 0})
+
+    def test_heuristic(self):
+        heur = MultiStart({'heuristic': FirstNeighborLocalSearch,
+                           'run_args': (NonDeterminist, MyNeighborhood1),
+                           'nb_runs': 3, 'seed': 1, 'workers': 1, 'max_iterations': 2})
+        sol = heur.run(self.inst)
+        self.assertEqual(len(heur.result.runs), 3)
+        self.assertEqual(sol.evaluate, min(r.evaluate for r in heur.result.runs))
+
+
+if __name__ == "__main__":
+    unittest.main()
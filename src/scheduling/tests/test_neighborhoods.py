@@ -0,0 +1,261 @@
+'''
+Tests of the neighborhoods and local searches.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import random
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.solution import Solution
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2, EnergyDelta, \
+    CriticalReassignment, CriticalBlockMoves, critical_blocks
+from src.scheduling.disjunctive_graph import DisjunctiveGraph
+from src.scheduling.optim.local_search import FirstNeighborLocalSearch, BestNeighborLocalSearch
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+def rebuild(instance, decisions):
+    '''
+    Builds a new solution by scheduling the decisions in order.
+    '''
+    sol = Solution(instance)
+    for operation, machine in decisions:
+        sol.schedule(operation, machine)
+    sol.stop_machines()
+    return sol
+
+
+class TestNeighborhoods(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+        self.sol = NonDeterminist({'seed': 1}).run(self.inst)
+
+    def check_moves(self, neighborhood):
+        dispatch = self.sol.dispatch
+        value = self.sol.evaluate
+        moves = list(neighborhood.moves(self.sol))
+        self.assertGreater(len(moves), 0)
+        for position, window in moves:
+            self.assertEqual(sorted(op.operation_id for op, _ in window),
+                             sorted(op.operation_id for op, _ in dispatch[position:position + len(window)]))
+            decisions = dispatch[:position] + window + dispatch[position + len(window):]
+            try:
+                rebuild(self.inst, decisions)
+            except ValueError:
+                pass
+        self.assertEqual(self.sol.evaluate, value)
+
+    def check_neighbor(self, neighborhood):
+        value = self.sol.evaluate
+        for neighbor in (neighborhood.first_better_neighbor(self.sol), neighborhood.best_neighbor(self.sol)):
+            if neighbor is self.sol:
+                continue
+            self.assertLess(neighbor.evaluate, value)
+            self.assertEqual(rebuild(self.inst, neighbor.dispatch).evaluate, neighbor.evaluate)
+            self.assertEqual(self.sol.evaluate, value)
+
+    def test_reassignment(self):
+        self.check_moves(MyNeighborhood1(self.inst))
+        self.check_neighbor(MyNeighborhood1(self.inst))
+
+    def test_resequencing(self):
+        self.check_moves(MyNeighborhood2(self.inst))
+        self.check_neighbor(MyNeighborhood2(self.inst))
+
+    def test_move_api(self):
+        dispatch = self.sol.dispatch
+        value = self.sol.evaluate
+        natural = list(MyNeighborhood1(self.inst).moves(self.sol))
+        for order in ('natural', 'random', 'promising'):
+            neighborhood = MyNeighborhood1(self.inst, {'order': order, 'seed': 2})
+            moves = list(neighborhood.iter_moves(self.sol))
+            key = lambda move: (move[0], move[1][0][1].machine_id)
+            self.assertEqual(sorted(moves, key=key), sorted(natural, key=key))
+            self.check_neighbor(neighborhood)
+        promises = [MyNeighborhood1(self.inst).promise(dispatch, move)
+                    for move in MyNeighborhood1(self.inst, {'order': 'promising'}).iter_moves(self.sol)]
+        self.assertEqual(promises, sorted(promises))
+        self.assertNotEqual(list(MyNeighborhood1(self.inst, {'order': 'random'}).iter_moves(self.sol)), natural)
+        with self.assertRaises(ValueError):
+            MyNeighborhood1(self.inst, {'order': 'best'})
+
+        neighborhood = MyNeighborhood2(self.inst)
+        for move in neighborhood.iter_moves(self.sol):
+            neighbor_value = neighborhood.evaluate_move(self.sol, move)
+            if neighbor_value is None:
+                continue
+            neighbor = neighborhood.apply_move(self.sol, move)
+            self.assertEqual(neighbor.evaluate, neighbor_value)
+            self.assertEqual(neighbor.dispatch, dispatch[:move[0]] + move[1] + dispatch[move[0] + len(move[1]):])
+            self.assertEqual(self.sol.evaluate, value)
+
+        # Le premier voisin améliorant arrête la génération des mouvements
+        class Counted(MyNeighborhood1):
+            generated = 0
+
+            def moves(self, sol):
+                for move in super().moves(sol):
+                    Counted.generated += 1
+                    yield move
+
+        neighbor = Counted(self.inst).first_better_neighbor(self.sol)
+        self.assertIsNot(neighbor, self.sol)
+        self.assertLess(Counted.generated, len(natural))
+
+    def test_critical_neighborhoods(self):
+        graph = DisjunctiveGraph.from_solution(self.sol)
+        dispatch = self.sol.dispatch
+        blocks = critical_blocks(self.sol)
+        self.assertEqual([dispatch[p][0] for block in blocks for p in block], graph.critical_path())
+        for block in blocks:
+            machines = {dispatch[p][1].machine_id for p in block}
+            self.assertEqual(len(machines), 1)
+            sequence = graph.sequence(dispatch[block[0]][1])
+            start = sequence.index(dispatch[block[0]][0])
+            self.assertEqual(sequence[start:start + len(block)], [dispatch[p][0] for p in block])
+        critical = {p for block in blocks for p in block}
+        for Neighborhood in (CriticalReassignment, CriticalBlockMoves):
+            self.check_moves(Neighborhood(self.inst))
+            self.check_neighbor(Neighborhood(self.inst))
+        # Les réaffectations critiques sont celles des opérations du chemin critique
+        full = list(MyNeighborhood1(self.inst).moves(self.sol))
+        moves = CriticalReassignment(self.inst).moves(self.sol)
+        self.assertEqual(sorted((p, w[0][1].machine_id) for p, w in moves),
+                         sorted((p, w[0][1].machine_id) for p, w in full if p in critical))
+        # Chaque déplacement change l'ordre d'une opération critique avec la première ou la dernière d'un bloc
+        ends = {block[0] for block in blocks if len(block) > 1} | {block[-1] for block in blocks if len(block) > 1}
+        for position, window in CriticalBlockMoves(self.inst).moves(self.sol):
+            self.assertTrue(position in ends or position + len(window) - 1 in ends)
+        # Pas de chemin critique pour une solution partielle
+        partial = Solution(self.inst)
+        partial.schedule(*dispatch[0])
+        self.assertEqual(critical_blocks(partial), [])
+
+    def test_local_search(self):
+        initial = self.sol.evaluate
+        for heuristic in (FirstNeighborLocalSearch(), BestNeighborLocalSearch()):
+            sol = heuristic.run(self.inst, NonDeterminist, [MyNeighborhood1, MyNeighborhood2], {'seed': 1})
+            self.assertLessEqual(sol.evaluate, initial)
+            self.assertIs(MyNeighborhood1(self.inst).best_neighbor(sol), sol)
+            self.assertIs(MyNeighborhood2(self.inst).best_neighbor(sol), sol)
+
+
+def timetable_energy(instance, timetable):
+    '''
+    Builds a solution from a timetable {machine_id: [(operation, start_time), ...]}
+    and returns its total energy consumption, None if the timetable cannot be
+    built or violates a constraint.
+    '''
+    sol = Solution(instance)
+    try:
+        for machine_id, operations in timetable.items():
+            machine = instance.get_machine(machine_id)
+            for operation, start_time in operations:
+                if machine.add_operation(operation, start_time) != start_time:
+                    return None
+                operation.schedule(machine_id, start_time,
+                                   operation.get_duration_for_machine(machine_id),
+                                   operation.get_energy_for_machine(machine_id), check_success=False)
+            if operations:
+                machine.stop(machine.available_time)
+    except ValueError:
+        return None
+    if sol.nb_violations:
+        return None
+    return sol.total_energy_consumption
+
+
+class TestEnergyDelta(unittest.TestCase):
+
+    def check_instance(self, name, seed):
+        instance = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+        sol = NonDeterminist({'seed': seed}).run(instance)
+        if not sol.is_feasible:
+            return
+        energy = sol.total_energy_consumption
+        delta = EnergyDelta(sol)
+        timetable = {m.machine_id: [(r.operation, r.start_time) for r in delta.timeline(m)]
+                     for m in instance.machines}
+        rng = random.Random(seed)
+        starts = {op.operation_id: op.start_time for op in instance.operations}
+
+        # Les deltas sont calculés avant de construire les autres plannings sur l'instance
+        reassignments = []
+        for operation in rng.sample(instance.operations, min(10, len(instance.operations))):
+            machine = instance.get_machine(rng.choice(operation.available_machines))
+            reassignments.append((operation, machine, delta.reassignment(operation, machine)))
+        swaps = [(machine, position, delta.swap(machine, position))
+                 for machine in instance.machines
+                 for position in range(len(timetable[machine.machine_id]) - 1)]
+
+        for operation, machine, value in reassignments:
+            moved = {machine_id: [(op, start) for op, start in operations if op is not operation]
+                     for machine_id, operations in timetable.items()}
+            moved[machine.machine_id] = sorted(
+                moved[machine.machine_id] + [(operation, starts[operation.operation_id])],
+                key=lambda item: item[1])
+            expected = timetable_energy(instance, moved)
+            self.assertEqual(value, None if expected is None else expected - energy,
+                             f"{name}: operation {operation.operation_id} to machine {machine.machine_id}")
+
+        for machine, position, value in swaps:
+            operations = timetable[machine.machine_id]
+            (first, start), (second, _) = operations[position:position + 2]
+            swapped = dict(timetable)
+            swapped[machine.machine_id] = operations[:position] + [
+                (second, start), (first, start + second.get_duration_for_machine(machine.machine_id))
+            ] + operations[position + 2:]
+            expected = None if first.job_id == second.job_id else timetable_energy(instance, swapped)
+            self.assertEqual(value, None if expected is None else expected - energy,
+                             f"{name}: swap {position} on machine {machine.machine_id}")
+
+    def test_random_moves(self):
+        rng = random.Random(0)
+        for name in rng.sample(sorted(os.listdir(DATA_FOLDER)), 10):
+            for seed in range(3):
+                self.check_instance(name, seed)
+
+    def test_apply_moves(self):
+        rng = random.Random(1)
+        for name in rng.sample(sorted(os.listdir(DATA_FOLDER)), 5):
+            instance = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+            sol = NonDeterminist({'seed': 0}).run(instance)
+            if not sol.is_feasible:
+                continue
+            energy = sol.total_energy_consumption
+            delta = EnergyDelta(sol)
+            applied = 0
+            for _ in range(200):
+                if rng.random() < 0.5:
+                    operation = rng.choice(instance.operations)
+                    machine = instance.get_machine(rng.choice(operation.available_machines))
+                    change = delta.reassignment(operation, machine)
+                    if change is not None:
+                        delta.apply_reassignment(operation, machine)
+                        self.assertEqual(delta.machine_id(operation), machine.machine_id)
+                else:
+                    machine = rng.choice(instance.machines)
+                    if len(delta.timeline(machine)) < 2:
+                        continue
+                    position = rng.randrange(len(delta.timeline(machine)) - 1)
+                    change = delta.swap(machine, position)
+                    if change is not None:
+                        delta.apply_swap(machine, position)
+                if change is not None:
+                    energy += change
+                    applied += 1
+            self.assertGreater(applied, 0, name)
+            moved = Solution.decode(instance, delta.encode())
+            self.assertTrue(moved.is_feasible, name)
+            self.assertEqual(moved.total_energy_consumption, energy, name)
+            for machine in instance.machines:
+                self.assertEqual([(r.operation_id, r.start_time) for r in delta.timeline(machine)],
+                                 [(r.operation_id, r.start_time) for r in machine.scheduled_operations], name)
+
+
+if __name__ == "__main__":
+    unittest.main()
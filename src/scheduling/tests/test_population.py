@@ -0,0 +1,102 @@
+'''
+Tests of the batch evaluation of encoded solutions.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import random
+import os
+
+import numpy as np
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.optim.population import PopulationEvaluator
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+class TestPopulationEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.names = rng.sample(sorted(os.listdir(DATA_FOLDER)), 6)
+
+    def random_population(self, instance, size, rng):
+        '''
+        Half random encodings (mostly infeasible), half perturbed constructive solutions.
+        '''
+        evaluator = PopulationEvaluator(instance)
+        eligible = [np.flatnonzero(row).tolist() for row in instance.arrays.eligible]
+        nb_operations = len(instance.operations)
+        assignments, sequences = [], []
+        for k in range(size):
+            sol = NonDeterminist({'seed': k}).run(instance)
+            if k % 2 and all(op.assigned for op in instance.operations):
+                assignment, sequence = evaluator.encode(sol)
+                for _ in range(2):
+                    i, j = rng.randrange(nb_operations), rng.randrange(nb_operations)
+                    sequence[i], sequence[j] = sequence[j], sequence[i]
+                    i = rng.randrange(nb_operations)
+                    assignment[i] = rng.choice(eligible[i])
+            else:
+                assignment = np.array([rng.choice(machines) for machines in eligible])
+                sequence = np.array(rng.sample(range(nb_operations), nb_operations))
+            assignments.append(assignment)
+            sequences.append(sequence)
+        return np.array(assignments), np.array(sequences)
+
+    def test_random_population(self):
+        rng = random.Random(1)
+        nb_feasible = 0
+        for name in self.names:
+            instance = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+            evaluator = PopulationEvaluator(instance)
+            assignments, sequences = self.random_population(instance, 20, rng)
+            scores = evaluator.evaluate(assignments, sequences)
+            self.assertEqual(len(scores), 20)
+            for k in range(20):
+                try:
+                    sol = evaluator.decode(assignments[k], sequences[k])
+                except ValueError:
+                    self.assertFalse(scores.feasible[k], name)
+                    continue
+                nb_feasible += 1
+                self.assertTrue(scores.feasible[k], name)
+                self.assertEqual(scores.cmax[k], sol.cmax, name)
+                self.assertEqual(scores.sum_ci[k], sol.sum_ci, name)
+                self.assertEqual(scores.energy[k], sol.total_energy_consumption, name)
+                self.assertEqual(scores.objective[k], sol.objective, name)
+        self.assertGreater(nb_feasible, 10)
+
+    def test_encoded_solutions(self):
+        for name in self.names:
+            instance = Instance.from_file(os.path.join(DATA_FOLDER, name), use_cache=False)
+            evaluator = PopulationEvaluator(instance)
+            encoded, values = [], []
+            for seed in range(5):
+                sol = NonDeterminist({'seed': seed}).run(instance)
+                if not sol.is_feasible:
+                    continue
+                encoded.append(evaluator.encode(sol))
+                values.append((sol.cmax, sol.sum_ci, sol.total_energy_consumption))
+            if not encoded:
+                continue
+            scores = evaluator.evaluate(np.array([a for a, _ in encoded]), np.array([s for _, s in encoded]))
+            self.assertTrue(scores.feasible.all())
+            self.assertEqual(list(zip(scores.cmax.tolist(), scores.sum_ci.tolist(), scores.energy.tolist())),
+                             values)
+
+    def test_repaired_order(self):
+        instance = Instance.from_file(os.path.join(DATA_FOLDER, self.names[0]), use_cache=False)
+        evaluator = PopulationEvaluator(instance)
+        # Ordre inverse : chaque opération doit suivre son prédécesseur
+        sequence = np.arange(len(instance.operations))[::-1]
+        order = evaluator.dispatch_order(sequence)[0].tolist()
+        position = {index: p for p, index in enumerate(order)}
+        for operation in instance.operations:
+            for pred in operation.predecessors:
+                self.assertLess(position[pred.index], position[operation.index])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+'''
+Tests of the ready set of the solutions.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import random
+import os
+from unittest import mock
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.solution import Solution
+from src.scheduling.ready_set import ReadySet
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.tests.test_utils import TEST_FOLDER_DATA, DATA_FOLDER
+
+
+class TestReadySet(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    def test_priority_queue(self):
+        ready = ReadySet(lambda op: -op.operation_id)
+        operations = self.inst.operations[:10]
+        for operation in operations:
+            ready.push(operation)
+        ready.push(operations[0])
+        self.assertEqual(len(ready), 10)
+        ready.remove(operations[-1])
+        self.assertNotIn(operations[-1], ready)
+        self.assertRaises(KeyError, ready.remove, operations[-1])
+        self.assertEqual(ready.ordered(), list(reversed(operations[:-1])))
+        self.assertEqual(set(ready), set(operations[:-1]))
+        self.assertIs(ready.pop(), operations[-2])
+        ready.push(operations[-1])
+        self.assertIs(ready.peek(), operations[-1])
+
+    def check_ready(self, sol):
+        expected = {job.next_operation.operation_id for job in self.inst.jobs if not job.planned}
+        available = sol.available_operations
+        self.assertEqual({op.operation_id for op in available}, expected)
+        keys = [sol.ready_time(op) for op in available]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_solution(self):
+        rng = random.Random(0)
+        sol = Solution(self.inst)
+        checkpoints = []
+        while sol.available_operations:
+            self.check_ready(sol)
+            operation = rng.choice(sol.available_operations)
+            machine = self.inst.get_machine(rng.choice(operation.available_machines))
+            checkpoints.append(sol.checkpoint())
+            try:
+                sol.schedule(operation, machine)
+            except ValueError:
+                break
+        for checkpoint in rng.sample(checkpoints, 5):
+            undone = sol.rollback(checkpoint)
+            self.check_ready(sol)
+            sol.replay(undone)
+            self.check_ready(sol)
+
+    def test_not_available(self):
+        inst = Instance.from_file(os.path.join(TEST_FOLDER_DATA, "jsp1"), use_cache=False)
+        sol = Solution(inst)
+        second = inst.jobs[0].operations[1]
+        self.assertNotIn(second, sol.ready_set)
+        with self.assertRaises(AssertionError):
+            sol.schedule(second, inst.machines[0])
+
+    def test_custom_key(self):
+        sol = Solution(self.inst, ready_key=lambda op: -op.min_duration())
+        durations = [op.min_duration() for op in sol.available_operations]
+        self.assertEqual(durations, sorted(durations, reverse=True))
+        self.assertEqual(sol.ready_set.peek().min_duration(), durations[0])
+
+    def test_draws_independent_of_iteration_order(self):
+        # La liste restreinte est tirée dans l'ordre des clés, pas dans celui du parcours
+        expected = NonDeterminist({'seed': 1}).run(self.inst).encode()
+        reverse = lambda ready: iter(list(ready.ordered())[::-1])
+        with mock.patch.object(ReadySet, '__iter__', reverse):
+            sol = NonDeterminist({'seed': 1}).run(self.inst)
+        self.assertEqual(sol.encode(), expected)
+        self.assertTrue(sol.is_feasible)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,17 +4,19 @@ Test of the Solution class.
 @author: Vassilissa Lehoux
 '''
 import unittest
+import random
 import os
 
 from src.scheduling.instance.instance import Instance
 from src.scheduling.solution import Solution
-from src.scheduling.tests.test_utils import TEST_FOLDER_DATA, TEST_FOLDER
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.tests.test_utils import TEST_FOLDER_DATA, TEST_FOLDER, DATA_FOLDER
 
 
 class TestSolution(unittest.TestCase):
 
     def setUp(self):
-        self.inst1 = Instance.from_file(TEST_FOLDER_DATA + os.path.sep + "jsp1")
+        self.inst1 = Instance.from_file(TEST_FOLDER_DATA + os.path.sep + "jsp1", use_cache=False)
 
     def tearDown(self):
         pass
@@ -101,4 +103,89 @@ class TestSolution(unittest.TestCase):
 
         # Calcule l'objectif
         obj = self.objective()
-        return obj
\ No newline at end of file
+        return obj
+
+
+class TestSolutionJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    @staticmethod
+    def state(sol):
+        return (sol.evaluate, sol.cmax, sol.sum_ci, sol.total_energy_consumption,
+                [(op.operation_id, op.assigned_to, op.start_time) for op in sol.all_operations],
+                [(m.start_times, m.stop_times, m.working_time, m.available_time, m.is_running)
+                 for m in sol.inst.machines],
+                [op.operation_id for op in sol.available_operations])
+
+    def test_rollback(self):
+        sol = NonDeterminist({'seed': 3}).run(self.inst)
+        dispatch = sol.dispatch
+        expected = self.state(sol)
+        rng = random.Random(0)
+        for _ in range(20):
+            position = rng.randrange(len(dispatch))
+            checkpoint = sol.checkpoint()
+            undone = sol.rollback(sol.checkpoint_before(position))
+            self.assertEqual(sol.dispatch, dispatch[:position])
+            sol.replay(undone)
+            self.assertEqual(sol.checkpoint(), checkpoint)
+            self.assertEqual(self.state(sol), expected)
+
+    def test_rollback_matches_fresh_solution(self):
+        sol = NonDeterminist({'seed': 5}).run(self.inst)
+        dispatch = sol.dispatch
+        checkpoint = sol.checkpoint_before(len(dispatch) // 2)
+        undone = sol.rollback(checkpoint)
+        partial = self.state(sol)
+        sol.replay(undone)
+        fresh = Solution(self.inst)
+        for operation, machine in dispatch[:len(dispatch) // 2]:
+            fresh.schedule(operation, machine)
+        self.assertEqual(self.state(fresh), partial)
+
+    def test_clone(self):
+        sol = NonDeterminist({'seed': 7}).run(self.inst)
+        expected = self.state(sol)
+        copy = sol.clone()
+        # La solution d'origine est modifiée, la copie n'est pas affectée
+        operation, machine = sol.dispatch[0]
+        other = next(self.inst.get_machine(m) for m in operation.available_machines
+                     if m != machine.machine_id)
+        sol.replan(0, [(operation, other)] + sol.dispatch[1:])
+        modified = self.state(sol)
+        self.assertNotEqual(modified, expected)
+        self.assertEqual(self.state(copy), expected)
+        self.assertEqual(self.state(sol), modified)
+        self.assertEqual(self.state(copy), expected)
+
+    def test_optimize_on_off(self):
+        sol = NonDeterminist({'seed': 1}).run(self.inst)
+        optimized = NonDeterminist({'seed': 1, 'optimize_on_off': True}).run(self.inst)
+        self.assertEqual(optimized.cmax, sol.cmax)
+        self.assertEqual(optimized.sum_ci, sol.sum_ci)
+        self.assertLessEqual(optimized.total_energy_consumption, sol.total_energy_consumption)
+        # Le post-traitement ne change que les arrêts des machines
+        self.assertEqual(optimized.encode().starts.tolist(), sol.encode().starts.tolist())
+        # Périodes remplacées en place et enregistrées dans le journal
+        value, checkpoint = sol.evaluate, sol.checkpoint()
+        dispatch = sol.dispatch
+        sol.optimize_on_off()
+        self.assertEqual(sol.dispatch, dispatch)
+        self.assertEqual(sol.evaluate, Solution.decode(self.inst, sol.encode()).evaluate)
+        self.assertEqual(sol.total_energy_consumption, optimized.total_energy_consumption)
+        sol.rollback(checkpoint)
+        self.assertEqual(sol.evaluate, value)
+
+    def test_actions(self):
+        sol = NonDeterminist({'seed': 1, 'optimize_on_off': True}).run(self.inst)
+        expected = self.state(sol)
+        dispatch = [(op.operation_id, m.machine_id) for op, m in sol.dispatch]
+        # Reconstruction sur une copie de l'instance, comme dans un autre processus
+        copy = Instance.from_arrays(self.inst.name, self.inst.arrays)
+        rebuilt = Solution(copy)
+        rebuilt.apply_actions(sol.actions())
+        self.assertEqual(self.state(rebuilt)[:4], expected[:4])
+        self.assertEqual([(op.operation_id, m.machine_id) for op, m in rebuilt.dispatch], dispatch)
+        self.assertEqual(rebuilt.actions(), sol.actions())
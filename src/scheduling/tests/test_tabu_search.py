@@ -0,0 +1,99 @@
+'''
+Tests of the tabu search.
+
+@author: Vassilissa Lehoux
+'''
+import unittest
+import os
+
+from src.scheduling.instance.instance import Instance
+from src.scheduling.optim.constructive import NonDeterminist
+from src.scheduling.optim.neighborhoods import MyNeighborhood1, MyNeighborhood2, evaluate_neighbor
+from src.scheduling.optim.tabu_search import TabuList, TabuSearch, move_attributes
+from src.scheduling.tests.test_utils import DATA_FOLDER
+
+
+NEIGHBORHOODS = [MyNeighborhood1, MyNeighborhood2]
+
+
+class TestTabuSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.inst = Instance.from_file(os.path.join(DATA_FOLDER, "jsp100"), use_cache=False)
+
+    def test_tabu_list(self):
+        tabu = TabuList(1000)
+        self.assertEqual(len(tabu._until), 1024)
+        tabu.add(5, 12)
+        self.assertTrue(tabu.is_tabu(5, 11))
+        self.assertFalse(tabu.is_tabu(5, 12))
+        self.assertFalse(tabu.is_tabu(6, 0))
+        # Même case : même statut
+        self.assertTrue(tabu.is_tabu(5 + 1024, 11))
+        tabu.add(5, 3)
+        self.assertTrue(tabu.is_tabu(5, 11))
+
+    def test_move_attributes(self):
+        sol = NonDeterminist({'seed': 0}).run(self.inst)
+        dispatch = sol.dispatch
+        nb_machines, nb_operations = len(self.inst.machines), len(self.inst.operations)
+        neighborhood = MyNeighborhood1(self.inst)
+        move = next(neighborhood.moves(sol))
+        added, removed = move_attributes(dispatch, move, nb_machines, nb_operations)
+        (operation, machine), = move[1]
+        self.assertEqual(added, [operation.index * nb_machines + machine.index])
+        self.assertEqual(removed, [operation.index * nb_machines + dispatch[move[0]][1].index])
+        # L'échange inverse ajoute l'attribut retiré par l'échange
+        move = next(move for move in MyNeighborhood2(self.inst).moves(sol)
+                    if evaluate_neighbor(sol, dispatch, move) is not None)
+        added, removed = move_attributes(dispatch, move, nb_machines, nb_operations)
+        self.assertEqual(len(added), 1)
+        neighbor = sol.clone()
+        position, window = move
+        neighbor.replan(position, window + dispatch[position + len(window):])
+        back = [(p, w) for p, w in MyNeighborhood2(self.inst).moves(neighbor) if p == position]
+        self.assertEqual(move_attributes(neighbor.dispatch, back[0], nb_machines, nb_operations),
+                         (removed, added))
+
+    def test_swap_attributes(self):
+        sol = NonDeterminist({'seed': 0}).run(self.inst)
+        dispatch = sol.dispatch
+        nb_machines, nb_operations = len(self.inst.machines), len(self.inst.operations)
+        assignments = nb_operations * nb_machines
+        moves = list(MyNeighborhood2(self.inst).moves(sol))
+        # Des opérations d'autres machines sont décalées dans la fenêtre
+        self.assertTrue(any(len(window) > 2 for _, window in moves))
+        for position, window in moves:
+            # Aucune affectation ne change : seul l'ordre des deux opérations échangées
+            moved, passed = window[0][0], dispatch[position][0]
+            added, removed = move_attributes(dispatch, (position, window), nb_machines, nb_operations)
+            self.assertEqual(added, [assignments + moved.index * nb_operations + passed.index])
+            self.assertEqual(removed, [assignments + passed.index * nb_operations + moved.index])
+
+    def test_run(self):
+        heuristic = TabuSearch({'seed': 1, 'max_iterations': 60})
+        sol = heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertIs(sol, heuristic.incumbent)
+        self.assertEqual(heuristic.stopped, 'max_iterations')
+        values = [value for _, _, value in heuristic.trace]
+        self.assertEqual(values[-1], sol.evaluate)
+        self.assertEqual(values, sorted(values, reverse=True))
+        # Des mouvements non améliorants sont acceptés
+        self.assertLess(len(values) - 1, 60)
+        same = TabuSearch({'seed': 1, 'max_iterations': 60}).run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(same.evaluate, sol.evaluate)
+
+    def test_budgets(self):
+        heuristic = TabuSearch({'seed': 1, 'max_iterations': None, 'max_evaluations': 200})
+        heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'max_evaluations')
+        heuristic = TabuSearch({'seed': 1, 'max_iterations': None, 'time_limit': 0.1})
+        heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'time_limit')
+        heuristic = TabuSearch({'seed': 1, 'max_iterations': None, 'max_no_improvement': 5})
+        heuristic.run(self.inst, NonDeterminist, NEIGHBORHOODS)
+        self.assertEqual(heuristic.stopped, 'max_no_improvement')
+
+
+if __name__ == "__main__":
+    unittest.main()
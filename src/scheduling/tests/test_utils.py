@@ -8,3 +8,4 @@ import os
 
 TEST_FOLDER = os.path.dirname(os.path.abspath(__file__))
 TEST_FOLDER_DATA = TEST_FOLDER + os.path.sep + "data"
+DATA_FOLDER = os.path.normpath(os.path.join(TEST_FOLDER, os.pardir, os.pardir, os.pardir, "data"))